@@ -0,0 +1,204 @@
+# app/admission.py - จำกัดงาน OCR ที่รับเข้ามา (rate limit, คิวจำกัดขนาด, ลำดับความสำคัญ)
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+
+# จำนวนงาน OCR ที่รันพร้อมกัน (ค่าเริ่มต้นเท่ากับจำนวน thread ของ webhook worker pool)
+ADMISSION_CONCURRENCY = int(os.getenv('ADMISSION_CONCURRENCY', os.getenv('WEBHOOK_WORKERS', 4)))
+# จำนวนงานที่รอคิวได้สูงสุด เกินนี้จะปฏิเสธ (0 = ไม่รอคิว)
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 32))
+# รูปต่อนาทีต่อผู้ใช้ และจำนวนที่ส่งติดกันได้ (0 = ไม่จำกัด ซึ่งเป็นค่าเริ่มต้น
+# เพราะร้านค้าหนึ่งบัญชีอาจส่งต่อสลิปของลูกค้าหลายใบติดกัน)
+ADMISSION_USER_RATE = float(os.getenv('ADMISSION_USER_RATE', 0))
+ADMISSION_USER_BURST = float(os.getenv('ADMISSION_USER_BURST', 5))
+# รูปต่อวินาทีรวมทุกผู้ใช้ (0 = ไม่จำกัด)
+ADMISSION_GLOBAL_RATE = float(os.getenv('ADMISSION_GLOBAL_RATE', 0))
+ADMISSION_GLOBAL_BURST = float(os.getenv('ADMISSION_GLOBAL_BURST', 20))
+
+# ความสำคัญของงาน (เลขน้อย = ได้คิวก่อน)
+PRIORITY_NEW = 0       # รูปที่ยังไม่เคยเห็น
+PRIORITY_REPEAT = 1    # รูปที่อยู่ในคิว/ใน cache แล้ว (เช่นผู้ใช้ส่งซ้ำเพราะรอนาน)
+
+SHED_REASONS = ["user_rate", "global_rate", "queue_full"]
+
+
+class Rejected(Exception):
+    """งานถูกปฏิเสธ reason เป็นหนึ่งใน SHED_REASONS"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class TokenBucket:
+    """
+    token bucket: เติม rate token ต่อวินาที เก็บได้ไม่เกิน burst
+
+    Args:
+        rate (float): token ต่อวินาที
+        burst (float): จำนวน token สูงสุด
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def refund(self):
+        """คืน token ที่ take() ไป (เมื่องานถูกปฏิเสธด้วยเหตุผลอื่น)"""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+class AdmissionController:
+    """
+    ควบคุมงาน OCR ที่รับเข้าระบบ
+
+    - admit() ตอนได้รับ event (ก่อนรอคิวของผู้ใช้และก่อนดาวน์โหลดรูป):
+      ตรวจ rate limit ต่อผู้ใช้/รวมทั้งระบบ และรับงานค้างในระบบไม่เกิน concurrency + max_queue งาน
+    - slot() ก่อนรัน OCR: รันพร้อมกันไม่เกิน concurrency งาน ที่เหลือรอตามความสำคัญ
+      (รูปใหม่ก่อนรูปที่ส่งซ้ำ)
+
+    งานที่รับไว้จึงรอไม่เกินประมาณ (max_queue / concurrency) × เวลาต่อรูป ส่วนงานที่เกินถูกปฏิเสธทันที
+    ใช้จาก event loop เท่านั้น (ไม่ thread-safe)
+
+    Args:
+        concurrency (int): จำนวนงานที่รันพร้อมกัน
+        max_queue (int): จำนวนงานที่รอคิวได้
+        user_rate (float): รูปต่อนาทีต่อผู้ใช้ (0 = ไม่จำกัด)
+        user_burst (float): จำนวนรูปที่ผู้ใช้ส่งติดกันได้
+        global_rate (float): รูปต่อวินาทีรวมทุกผู้ใช้ (0 = ไม่จำกัด)
+        global_burst (float): จำนวนรูปที่รับติดกันได้ทั้งระบบ
+    """
+
+    def __init__(self, concurrency: int = ADMISSION_CONCURRENCY, max_queue: int = ADMISSION_MAX_QUEUE,
+                 user_rate: float = ADMISSION_USER_RATE, user_burst: float = ADMISSION_USER_BURST,
+                 global_rate: float = ADMISSION_GLOBAL_RATE, global_burst: float = ADMISSION_GLOBAL_BURST):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.user_rate = user_rate / 60
+        self.user_burst = user_burst
+        self._user_buckets: Dict[str, TokenBucket] = {}
+        self._global_bucket = TokenBucket(global_rate, global_burst) if global_rate > 0 else None
+        self._admitted = 0          # งานที่รับแล้วและยังไม่เสร็จ (รอคิว + กำลังรัน)
+        self._active = 0            # งานที่ได้ slot แล้ว
+        self._waiting = []          # heap ของ (priority, ลำดับ, future)
+        self._seq = itertools.count()
+        self._keys: Dict[str, int] = {}   # key ของรูปที่อยู่ในคิว/กำลังรัน -> จำนวน
+        self._stats = {"admitted": 0, **{reason: 0 for reason in SHED_REASONS}}
+
+    def admit(self, user_id: Optional[str]):
+        """
+        รับงานเข้าระบบ ต้องเรียก done() เมื่องานเสร็จ
+
+        Raises:
+            Rejected: เกิน rate limit หรือมีงานค้างเต็มแล้ว
+        """
+        if self._admitted >= self.concurrency + self.max_queue:
+            self._reject("queue_full")
+        bucket = None
+        if self.user_rate > 0 and user_id:
+            bucket = self._user_buckets.get(user_id)
+            if bucket is None:
+                if len(self._user_buckets) >= 10000:
+                    # ลบ bucket ที่เติมเต็มแล้ว (ผู้ใช้ที่ไม่ได้ส่งมานาน) ไม่ให้ dict โตไม่จำกัด
+                    self._user_buckets = {u: b for u, b in self._user_buckets.items() if not b.full()}
+                bucket = self._user_buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+            if not bucket.take():
+                self._reject("user_rate")
+        if self._global_bucket is not None and not self._global_bucket.take():
+            # รูปนี้ไม่ได้ถูกรับ ไม่นับเป็นโควต้าของผู้ใช้
+            if bucket is not None:
+                bucket.refund()
+            self._reject("global_rate")
+        self._admitted += 1
+        self._stats["admitted"] += 1
+
+    def done(self):
+        """งานที่ admit() ไว้เสร็จแล้ว"""
+        self._admitted -= 1
+
+    def _reject(self, reason: str):
+        self._stats[reason] += 1
+        raise Rejected(reason)
+
+    def priority(self, key: Optional[str], seen: bool = False) -> int:
+        """ความสำคัญของรูป: รูปที่อยู่ในคิวอยู่แล้วหรือเคยอ่านแล้ว (seen) ได้คิวทีหลัง"""
+        return PRIORITY_REPEAT if seen or (key and key in self._keys) else PRIORITY_NEW
+
+    async def _acquire(self, priority: int):
+        if self._active < self.concurrency and not self._waiting:
+            self._active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._waiting, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # ได้ช่องแล้วแต่ถูกยกเลิก คืนช่องให้งานถัดไป
+                self._release()
+            elif entry in self._waiting:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+            raise
+
+    def _release(self):
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                # ส่งช่องต่อให้งานถัดไปโดยตรง (_active ไม่เปลี่ยน)
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_NEW, key: Optional[str] = None):
+        """รอช่องสำหรับรันงาน OCR ตามความสำคัญ"""
+        if key:
+            self._keys[key] = self._keys.get(key, 0) + 1
+        try:
+            await self._acquire(priority)
+            try:
+                yield
+            finally:
+                self._release()
+        finally:
+            if key:
+                self._keys[key] -= 1
+                if not self._keys[key]:
+                    del self._keys[key]
+
+    @property
+    def queue_depth(self) -> int:
+        """งานที่รับแล้วแต่ยังไม่ได้เริ่ม OCR"""
+        return self._admitted - self._active
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, active=self._active, queued=self.queue_depth,
+                    concurrency=self.concurrency, max_queue=self.max_queue)
+
+
+admission = AdmissionController()
@@ -0,0 +1,210 @@
+# app/line_client.py - LINE Messaging API client แบบ async ใช้ connection pool ร่วมกัน
+import os
+import uuid
+import random
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+from linebot.exceptions import LineBotApiError
+from linebot.models.error import Error
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# เปลี่ยน base URL ได้ เพื่อทดสอบกับ server จำลองในเครื่อง
+LINE_API_BASE_URL = os.getenv('LINE_API_BASE_URL', 'https://api.line.me')
+LINE_DATA_API_BASE_URL = os.getenv('LINE_DATA_API_BASE_URL', 'https://api-data.line.me')
+
+LINE_HTTP_TIMEOUT = float(os.getenv('LINE_HTTP_TIMEOUT', 10))           # วินาที ต่อ request
+LINE_HTTP_CONNECT_TIMEOUT = float(os.getenv('LINE_HTTP_CONNECT_TIMEOUT', 3))
+LINE_HTTP_MAX_CONNECTIONS = int(os.getenv('LINE_HTTP_MAX_CONNECTIONS', 50))
+LINE_HTTP_RETRIES = int(os.getenv('LINE_HTTP_RETRIES', 3))              # จำนวนครั้งที่ลองใหม่
+LINE_HTTP_BACKOFF = float(os.getenv('LINE_HTTP_BACKOFF', 0.3))          # วินาที (เพิ่มเป็นเท่าตัวทุกครั้ง)
+LINE_HTTP2 = os.getenv('LINE_HTTP2', '1') == '1'
+
+# status ที่ลองใหม่ได้
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# reply token ใช้ได้ครั้งเดียว ลองใหม่เฉพาะกรณีที่ request ยังไม่ถึง LINE แน่ๆ (เชื่อมต่อไม่ได้)
+# กรณีอื่น (5xx, timeout ระหว่างรอคำตอบ) LINE อาจรับไปแล้ว ลองซ้ำจะได้ 400 Invalid reply token
+REPLY_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _api_error(response: httpx.Response) -> LineBotApiError:
+    """แปลง response ที่ไม่สำเร็จเป็น LineBotApiError (response ต้องอ่าน body แล้ว)"""
+    try:
+        body = response.json()
+    except ValueError:
+        body = {"message": response.text or f"HTTP {response.status_code}"}
+    return LineBotApiError(
+        status_code=response.status_code,
+        headers=dict(response.headers.items()),
+        request_id=response.headers.get('X-Line-Request-Id'),
+        accepted_request_id=response.headers.get('X-Line-Accepted-Request-Id'),
+        error=Error.new_from_json_dict(body)
+    )
+
+
+class AsyncLineClient:
+    """
+    client ของ LINE Messaging API แบบ async
+
+    - ใช้ httpx.AsyncClient ตัวเดียว (keep-alive connection pool, HTTP/2 ถ้าติดตั้ง h2)
+    - ลองใหม่เมื่อเชื่อมต่อไม่ได้/timeout หรือได้ 429/5xx โดยรอแบบ exponential backoff
+      (reply ลองใหม่เฉพาะตอนเชื่อมต่อไม่ได้ ที่เหลือส่ง push แทนถ้าระบุผู้รับไว้)
+    - error จาก API จะถูกแปลงเป็น LineBotApiError เหมือน LineBotApi เดิม
+
+    Args:
+        channel_access_token (str): token ของ LINE channel
+        api_base_url (str): base URL ของ Messaging API
+        data_api_base_url (str): base URL สำหรับดาวน์โหลด content
+        timeout (float): timeout ต่อ request (วินาที)
+        retries (int): จำนวนครั้งที่ลองใหม่
+        backoff (float): เวลารอก่อนลองใหม่ครั้งแรก (วินาที)
+        transport: httpx transport สำหรับทดสอบ (ถ้ามี)
+    """
+
+    def __init__(self, channel_access_token: str, api_base_url: str = LINE_API_BASE_URL,
+                 data_api_base_url: str = LINE_DATA_API_BASE_URL, timeout: float = LINE_HTTP_TIMEOUT,
+                 retries: int = LINE_HTTP_RETRIES, backoff: float = LINE_HTTP_BACKOFF,
+                 max_connections: int = LINE_HTTP_MAX_CONNECTIONS, transport=None):
+        self.api_base_url = api_base_url.rstrip('/')
+        self.data_api_base_url = data_api_base_url.rstrip('/')
+        self.retries = retries
+        self.backoff = backoff
+        self._client = httpx.AsyncClient(
+            headers={'Authorization': f'Bearer {channel_access_token}'},
+            timeout=httpx.Timeout(timeout, connect=LINE_HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            http2=LINE_HTTP2 and transport is None and _http2_available(),
+            transport=transport
+        )
+
+    async def _request(self, method: str, url: str, retry_status=RETRY_STATUS,
+                       retry_errors=(httpx.TransportError,), **kwargs) -> httpx.Response:
+        """
+        ส่ง request พร้อมลองใหม่ตาม backoff คืน response ที่สำเร็จ (2xx)
+
+        Args:
+            retry_status: status ที่ลองใหม่
+            retry_errors: exception ของ httpx ที่ลองใหม่ (อย่างอื่น raise ทันที)
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self._client.request(method, url, **kwargs)
+                if response.status_code not in retry_status or attempt == self.retries:
+                    break
+                logger.warning(f"LINE API {response.status_code} ({method} {url}) ลองใหม่ครั้งที่ {attempt + 1}")
+            except retry_errors as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"LINE API error ({method} {url}): {str(e)} ลองใหม่ครั้งที่ {attempt + 1}")
+
+            await asyncio.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+        if not 200 <= response.status_code < 300:
+            raise _api_error(response)
+        return response
+
+    async def get_message_content(self, message_id: str) -> bytearray:
+        """
+        ดาวน์โหลด content ของข้อความ (เช่นรูปภาพ) เข้า memory
+
+        จองขนาด buffer ตาม Content-Length ไว้ก่อน แล้วเขียนทับทีละ chunk
+
+        Returns:
+            bytearray: ข้อมูลของไฟล์ทั้งหมด
+        """
+        url = f'{self.data_api_base_url}/v2/bot/message/{message_id}/content'
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._client.stream('GET', url) as response:
+                    if response.status_code in RETRY_STATUS and attempt < self.retries:
+                        logger.warning(f"LINE content {response.status_code} ลองใหม่ครั้งที่ {attempt + 1}")
+                    elif not 200 <= response.status_code < 300:
+                        await response.aread()
+                        raise _api_error(response)
+                    else:
+                        length = response.headers.get('content-length')
+                        buffer = bytearray(int(length) if length and length.isdigit() else 0)
+                        pos = 0
+                        async for chunk in response.aiter_bytes():
+                            end = pos + len(chunk)
+                            buffer[pos:end] = chunk
+                            pos = end
+                        del buffer[pos:]
+                        return buffer
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"LINE content error: {str(e)} ลองใหม่ครั้งที่ {attempt + 1}")
+
+            await asyncio.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    async def reply_message(self, reply_token: str, messages: List[Dict[str, Any]],
+                            fallback_to: Optional[str] = None):
+        """
+        ตอบกลับด้วย reply token
+
+        ลองใหม่เฉพาะเมื่อเชื่อมต่อไม่ได้ ถ้าได้ 429/5xx หรือ error ระหว่างรอคำตอบ
+        จะส่ง push ไปที่ fallback_to แทน (ถ้าไม่ระบุจะ raise)
+
+        Args:
+            reply_token (str): reply token ของ event
+            messages (List[Dict]): ข้อความที่ตอบ
+            fallback_to (str): user/group/room id สำหรับส่ง push แทน
+        """
+        try:
+            await self._request(
+                'POST', f'{self.api_base_url}/v2/bot/message/reply',
+                retry_status=(), retry_errors=REPLY_RETRY_ERRORS,
+                json={'replyToken': reply_token, 'messages': messages}
+            )
+        except (LineBotApiError, httpx.TransportError) as e:
+            if not fallback_to or (isinstance(e, LineBotApiError) and e.status_code not in RETRY_STATUS):
+                raise
+            logger.warning(f"reply ไม่สำเร็จ ({str(e)}) ส่งแบบ push แทน")
+            await self.push_message(fallback_to, messages)
+
+    async def push_message(self, to: str, messages: List[Dict[str, Any]]):
+        """ส่งข้อความแบบ push (ใช้ retry key เดียวกันทุกครั้งที่ลองใหม่ กันส่งซ้ำ)"""
+        await self._request(
+            'POST', f'{self.api_base_url}/v2/bot/message/push',
+            json={'to': to, 'messages': messages},
+            headers={'X-Line-Retry-Key': str(uuid.uuid4())}
+        )
+
+    async def reply_text(self, reply_token: str, text: str, fallback_to: Optional[str] = None):
+        await self.reply_message(reply_token, [{'type': 'text', 'text': text}], fallback_to)
+
+    async def push_text(self, to: str, text: str):
+        await self.push_message(to, [{'type': 'text', 'text': text}])
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+_line_client: Optional[AsyncLineClient] = None
+
+
+def get_line_client() -> AsyncLineClient:
+    """คืน client ที่ใช้ร่วมกันทั้ง process (สร้างครั้งแรกจาก LINE_CHANNEL_ACCESS_TOKEN)"""
+    global _line_client
+    if _line_client is None:
+        token = os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
+        if not token:
+            raise ValueError("LINE_CHANNEL_ACCESS_TOKEN is required")
+        _line_client = AsyncLineClient(token)
+    return _line_client
@@ -1,13 +1,15 @@
-from linebot import LineBotApi, WebhookHandler
+from linebot import WebhookHandler
 from linebot.exceptions import InvalidSignatureError, LineBotApiError
-from linebot.models import TextSendMessage
 import os
+import asyncio
 import hashlib
 import hmac
 import base64
 import requests
 from dotenv import load_dotenv
 import logging
+from .line_client import get_line_client
+from .slip_store import get_slip_store
 
 # โหลด environment variables
 load_dotenv()
@@ -24,7 +26,8 @@ class LineBot:
         if not self.channel_secret:
             raise ValueError("LINE_CHANNEL_SECRET is required")
             
-        self.line_bot_api = LineBotApi(self.channel_access_token)
+        # ใช้ client แบบ async ตัวเดียวกับ router (connection pool ร่วมกัน)
+        self.line_client = get_line_client()
         self.handler = WebhookHandler(self.channel_secret)
         
         # สร้างโฟลเดอร์สำหรับเก็บภาพ
@@ -51,34 +54,24 @@ class LineBot:
             logger.error(f"Signature verification error: {str(e)}")
             return False
     
-    async def download_image(self, message_id: str, user_id: str) -> str:
-        """ดาวน์โหลดภาพจาก LINE และบันทึกลงไฟล์"""
+    async def download_image_bytes(self, message_id: str) -> bytearray:
+        """ดาวน์โหลดภาพจาก LINE เข้า memory (ไม่เขียนไฟล์)"""
         try:
-            # ดาวน์โหลดภาพ
-            message_content = self.line_bot_api.get_message_content(message_id)
-            
-            # สร้างชื่อไฟล์
-            filename = f"slip_{user_id}_{message_id}.jpg"
-            
-            # เลือกโฟลเดอร์สำหรับเก็บไฟล์
-            try:
-                os.makedirs("static/slips", exist_ok=True)
-                filepath = os.path.join("static/slips", filename)
-            except PermissionError:
-                # ถ้าไม่สามารถสร้างโฟลเดอร์ได้ ให้เก็บในโฟลเดอร์ปัจจุบัน
-                filepath = filename
-            
-            # บันทึกไฟล์
-            with open(filepath, 'wb') as f:
-                for chunk in message_content.iter_content():
-                    f.write(chunk)
-            
-            logger.info(f"Image saved: {filepath}")
-            return filepath
+            return await self.line_client.get_message_content(message_id)
             
         except LineBotApiError as e:
             logger.error(f"Error downloading image: {str(e)}")
             raise
+    
+    async def download_image(self, message_id: str, user_id: str) -> str:
+        """ดาวน์โหลดภาพจาก LINE และบันทึกลงไฟล์"""
+        try:
+            image_data = await self.download_image_bytes(message_id)
+            # เขียนไฟล์และ index เป็นงานที่บล็อก ไม่รันบน event loop
+            return await asyncio.to_thread(save_slip_image, image_data, user_id, message_id)
+            
+        except LineBotApiError:
+            raise
         except Exception as e:
             logger.error(f"Unexpected error downloading image: {str(e)}")
             raise
@@ -86,8 +79,7 @@ class LineBot:
     async def reply_text(self, reply_token: str, text: str):
         """ตอบกลับข้อความ"""
         try:
-            message = TextSendMessage(text=text)
-            self.line_bot_api.reply_message(reply_token, message)
+            await self.line_client.reply_text(reply_token, text)
             logger.info(f"Reply sent: {text[:50]}...")
         except LineBotApiError as e:
             logger.error(f"Error sending reply: {str(e)}")
@@ -96,12 +88,25 @@ class LineBot:
     async def push_text(self, user_id: str, text: str):
         """ส่งข้อความแบบ push"""
         try:
-            message = TextSendMessage(text=text)
-            self.line_bot_api.push_message(user_id, message)
+            await self.line_client.push_text(user_id, text)
             logger.info(f"Push message sent to {user_id}: {text[:50]}...")
         except LineBotApiError as e:
             logger.error(f"Error sending push message: {str(e)}")
             raise
 
+def save_slip_image(image_data: bytes, user_id: str, message_id: str) -> str:
+    """
+    บันทึกรูปสลิปลงที่เก็บรูป (slip_store) ทันที (ขั้นตอนเสริม แยกจากการ OCR)
+    
+    Returns:
+        str: path ของไฟล์ที่บันทึก
+    """
+    slip_store = get_slip_store()
+    if slip_store is None:
+        raise OSError("ที่เก็บรูปสลิปถูกปิดไว้ (SLIP_STORE_DIR ว่าง)")
+    filepath = slip_store.save_now(image_data, user_id, message_id)
+    logger.info(f"Image saved: {filepath}")
+    return filepath
+
 def generate_help_message():
     return """🆘 วิธีใช้งsaddddddddddddddาน\n..."""
@@ -0,0 +1,98 @@
+# app/metrics.py - ตัวชี้วัดสำหรับ Prometheus (/metrics)
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, SummaryMetricFamily
+
+from .ocr_cache import ocr_cache
+from .admission import admission, SHED_REASONS
+from .ocr_tiers import tier_stats
+from .profiling import current_capture
+
+# ขั้นตอนของ handle_image_message
+STAGES = ["download", "queue_wait", "qr", "region_ocr", "ocr", "parse", "format", "ledger", "reply", "total"]
+
+# ผลลัพธ์ของการประมวลผลรูป
+OUTCOMES = ["slip", "text", "qr_only", "empty", "ocr_error", "error"]
+
+# bucket ครอบคลุมตั้งแต่ parse (ms) จนถึง OCR บน CPU (หลายวินาที)
+_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+_stage_seconds = Histogram(
+    'slip_stage_seconds', 'เวลาที่ใช้ในแต่ละขั้นตอนของการประมวลผลรูปสลิป', ['stage'], buckets=_BUCKETS
+)
+_images_total = Counter(
+    'slip_images_total', 'จำนวนรูปที่ประมวลผลแยกตามผลลัพธ์', ['outcome']
+)
+
+
+class _Stage:
+    """histogram ของขั้นตอนหนึ่ง บันทึกเวลาลงผล profiling ด้วยถ้า request นี้ถูกเลือก (profiling.py)"""
+    __slots__ = ('name', '_histogram')
+
+    def __init__(self, name: str):
+        self.name = name
+        # bind label ไว้ล่วงหน้า ไม่ต้อง lookup ทุกครั้งบน hot path
+        self._histogram = _stage_seconds.labels(name)
+
+    def observe(self, seconds: float):
+        self._histogram.observe(seconds)
+        capture = current_capture.get()
+        if capture is not None:
+            capture.record(self.name, seconds)
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+STAGE = {stage: _Stage(stage) for stage in STAGES}
+OUTCOME = {outcome: _images_total.labels(outcome) for outcome in OUTCOMES}
+
+INFLIGHT_JOBS = Gauge('slip_inflight_jobs', 'จำนวนงาน OCR ที่กำลังประมวลผลอยู่')
+DUPLICATE_SLIPS = Counter('slip_duplicates', 'จำนวนสลิปที่ตรงกับสลิปในประวัติ (อาจถูกใช้ซ้ำ)')
+QUEUE_DEPTH = Gauge('slip_queue_depth', 'จำนวนงานรูปที่รับแล้วแต่ยังไม่ได้เริ่ม OCR')
+QUEUE_DEPTH.set_function(lambda: admission.queue_depth)
+
+_shed_total = Counter('slip_shed', 'จำนวนรูปที่ถูกปฏิเสธเพราะเกินกำลัง แยกตามเหตุผล', ['reason'])
+SHED = {reason: _shed_total.labels(reason) for reason in SHED_REASONS}
+
+
+class _OCRCacheCollector:
+    """อ่านตัวนับของ OCR cache ตอน scrape (ไม่มีต้นทุนบน hot path)"""
+
+    def collect(self):
+        stats = ocr_cache.stats()
+        requests = CounterMetricFamily('slip_ocr_cache_requests', 'การค้น OCR cache แยกตามผล', labels=['result'])
+        requests.add_metric(['hit'], stats["hits"])
+        requests.add_metric(['disk_hit'], stats["disk_hits"])
+        requests.add_metric(['miss'], stats["misses"])
+        yield requests
+        yield CounterMetricFamily('slip_ocr_cache_evictions', 'จำนวนรายการที่ถูกลบออกจาก OCR cache',
+                                  value=stats["evictions"])
+        yield GaugeMetricFamily('slip_ocr_cache_entries', 'จำนวนรายการใน OCR cache (memory)', value=stats["size"])
+
+
+class _OCRTierCollector:
+    """เวลาและจำนวนครั้งที่แต่ละ OCR tier ได้ข้อมูลครบ (อ่านตอน scrape)"""
+
+    def collect(self):
+        stats = tier_stats.snapshot()
+        seconds = SummaryMetricFamily('slip_ocr_tier_seconds', 'เวลาที่ใช้ในแต่ละ OCR tier', labels=['tier'])
+        results = CounterMetricFamily('slip_ocr_tier_results', 'ผลของแต่ละ OCR tier (hit = ได้ field สำคัญครบ)',
+                                      labels=['tier', 'result'])
+        for tier, tier_stat in stats.items():
+            seconds.add_metric([tier], count_value=tier_stat["calls"], sum_value=tier_stat["seconds"])
+            results.add_metric([tier, 'hit'], tier_stat["hits"])
+            results.add_metric([tier, 'miss'], tier_stat["calls"] - tier_stat["hits"])
+        yield seconds
+        yield results
+
+
+REGISTRY.register(_OCRCacheCollector())
+REGISTRY.register(_OCRTierCollector())
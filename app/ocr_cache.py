@@ -0,0 +1,134 @@
+# app/ocr_cache.py - cache ผล OCR ตาม hash ของรูปภาพ
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# จำนวนรายการสูงสุดใน memory (0 = ปิด cache)
+OCR_CACHE_SIZE = int(os.getenv('OCR_CACHE_SIZE', 1024))
+# อายุของผลลัพธ์ใน cache (วินาที)
+OCR_CACHE_TTL = float(os.getenv('OCR_CACHE_TTL', 24 * 60 * 60))
+# โฟลเดอร์สำหรับ cache บนดิสก์ (ว่าง = ใช้แค่ memory)
+OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', '')
+
+
+def image_key(image_bytes: bytes) -> str:
+    """สร้าง key ของ cache จากเนื้อหารูปภาพ"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class OCRCache:
+    """
+    LRU cache ของข้อความ OCR และข้อมูลสลิปที่แยกแล้ว มี TTL และ tier บนดิสก์ (SQLite) แบบเลือกได้
+
+    Args:
+        max_entries (int): จำนวนรายการสูงสุดใน memory
+        ttl (float): อายุของรายการ (วินาที)
+        disk_dir (str): โฟลเดอร์สำหรับ cache บนดิสก์ หรือว่างถ้าไม่ใช้
+    """
+
+    def __init__(self, max_entries: int = OCR_CACHE_SIZE, ttl: float = OCR_CACHE_TTL,
+                 disk_dir: str = OCR_CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._db = None
+
+        if disk_dir and max_entries > 0:
+            try:
+                os.makedirs(disk_dir, exist_ok=True)
+                self._db = sqlite3.connect(os.path.join(disk_dir, 'ocr_cache.db'), check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                    "key TEXT PRIMARY KEY, text TEXT, parsed TEXT, created REAL)"
+                )
+                self._db.execute("DELETE FROM ocr_cache WHERE created < ?", (time.time() - ttl,))
+                self._db.commit()
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f"ไม่สามารถเปิด OCR cache บนดิสก์: {str(e)}")
+                self._db = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        หาผล OCR จาก cache
+
+        Returns:
+            Optional[Dict]: {"text": ..., "parsed": ...} หรือ None ถ้าไม่พบ/หมดอายุ
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT text, parsed, created FROM ocr_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[2] <= self.ttl:
+                    value = {"text": row[0], "parsed": json.loads(row[1]) if row[1] else None}
+                    self._put(key, value, row[2])
+                    self._stats["disk_hits"] += 1
+                    return value
+
+            self._stats["misses"] += 1
+            return None
+
+    def __contains__(self, key: str) -> bool:
+        """มี key นี้ใน memory หรือไม่ (ไม่นับเป็น hit/miss ไม่ค้นบนดิสก์)"""
+        return key in self._entries
+
+    def set(self, key: str, text: str, parsed: Optional[Dict[str, Any]]):
+        """บันทึกผล OCR ลง cache"""
+        if not self.enabled:
+            return
+
+        value = {"text": text, "parsed": parsed}
+        created = time.time()
+        with self._lock:
+            self._put(key, value, created)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO ocr_cache (key, text, parsed, created) VALUES (?, ?, ?, ?)",
+                        (key, text, json.dumps(parsed, ensure_ascii=False) if parsed else None, created)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"OCR cache write error: {str(e)}")
+
+    def _put(self, key: str, value: Dict[str, Any], created: float):
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """ตัวนับ hit/miss ของ cache"""
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), disk=self._db is not None)
+
+
+ocr_cache = OCRCache()
@@ -0,0 +1,321 @@
+# app/ocr_engine.py - OCR engine แบบ process pool
+import os
+import gc
+import sys
+import logging
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Optional, Dict, Any, List, Tuple
+
+from . import ocr_utils, ocr_tiers
+from .region_ocr import region_ocr
+
+logger = logging.getLogger(__name__)
+
+# จำนวน process สำหรับ OCR (0 = OCR ใน process หลักแบบเดิม)
+OCR_PROCESSES = int(os.getenv('OCR_PROCESSES', 0))
+# จำนวน torch thread ต่อ worker (0 = แบ่ง core เท่าๆ กันตามจำนวน process)
+OCR_TORCH_THREADS = int(os.getenv('OCR_TORCH_THREADS', 0))
+# fork = worker ใช้ model weights ร่วมกับ process หลักแบบ copy-on-write (Linux)
+# spawn = worker โหลด model เอง (Windows/macOS)
+OCR_START_METHOD = os.getenv('OCR_START_METHOD', 'fork' if sys.platform.startswith('linux') else 'spawn')
+# micro-batching: รอรวมรูปที่เข้ามาภายในช่วงเวลานี้ (ms) เป็น batch เดียว (0 = ไม่รวม batch)
+OCR_BATCH_WINDOW_MS = float(os.getenv('OCR_BATCH_WINDOW_MS', 0))
+# จำนวนรูปสูงสุดต่อ batch
+OCR_BATCH_SIZE = int(os.getenv('OCR_BATCH_SIZE', 8))
+
+
+def _init_worker(torch_threads: int):
+    """เตรียม worker process: จำกัด torch thread และโหลด reader ครั้งเดียว"""
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    # fork: reader ถูกโหลดไว้แล้วใน process หลัก / spawn: โหลดใหม่ใน worker
+    # แล้ว warm-up ใน worker เอง (process หลักไม่รัน inference ก่อน fork)
+    ocr_utils.warm_up()
+    logger.info(f"OCR worker {os.getpid()} พร้อมใช้งาน (torch threads={torch_threads})")
+
+
+def _worker_status() -> Dict[str, Any]:
+    return dict(ocr_utils.model_status, pid=os.getpid())
+
+
+def _run_ocr(image):
+    return ocr_tiers.ocr_cascade.read(image)
+
+
+def _run_ocr_batch(images: List[Any]) -> List[str]:
+    return ocr_utils.extract_text_batch(images)
+
+
+def _run_region_ocr(image, bank_hint: Optional[str]) -> Optional[Dict[str, Any]]:
+    try:
+        return region_ocr.read(image, bank_hint)
+    except Exception as e:
+        # อ่านแบบ template ไม่ได้ ให้ OCR ทั้งรูปแทน
+        logger.error(f"Region OCR error: {str(e)}")
+        return None
+
+
+def _record_tiers(result: Tuple[str, Optional[Dict[str, Any]], list]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """บันทึกสถิติของแต่ละ OCR tier (ใน process หลัก) แล้วคืน (ข้อความ, ข้อมูลสลิป)"""
+    text, parsed, attempts = result
+    ocr_tiers.tier_stats.record(attempts)
+    return text, parsed
+
+
+def _chain(future: Future, fn) -> Future:
+    """Future ใหม่ที่ได้ผลเป็น fn(ผลของ future)"""
+    result = Future()
+
+    def done(inner: Future):
+        try:
+            value = fn(inner.result())
+        except Exception as e:
+            result.set_exception(e)
+            return
+        result.set_result(value)
+
+    future.add_done_callback(done)
+    return result
+
+
+def _call_now(fn, *args) -> Future:
+    """เรียกฟังก์ชันใน thread ปัจจุบันแล้วคืนผลเป็น Future"""
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+class OCRBatcher:
+    """
+    รวมรูปที่ส่งเข้ามาใกล้ๆ กันเป็น batch แล้วอ่านด้วย readtext_batched ครั้งเดียว
+
+    batch จะถูกส่งเมื่อครบ max_batch รูป หรือครบ window_ms นับจากรูปแรกใน batch
+    จึงเพิ่ม latency ได้ไม่เกิน window_ms
+
+    Args:
+        engine (OCREngine): engine ที่ใช้อ่าน batch
+        window_ms (float): เวลารอรวม batch (ms)
+        max_batch (int): จำนวนรูปสูงสุดต่อ batch
+    """
+
+    def __init__(self, engine: "OCREngine", window_ms: float = OCR_BATCH_WINDOW_MS,
+                 max_batch: int = OCR_BATCH_SIZE):
+        self.engine = engine
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def submit(self, image) -> Future:
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, name='ocr-batcher', daemon=True)
+                self._thread.start()
+            self._pending.append((image, future))
+            self._cond.notify()
+        return future
+
+    def _collect(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped and not self._pending:
+                    return
+
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch and not self._stopped:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            batch_future = self.engine.submit_batch([image for image, _ in batch])
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        def fan_out(done: Future):
+            try:
+                texts = done.result()
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                return
+            for future, text in zip(futures, texts):
+                future.set_result(text)
+
+        batch_future.add_done_callback(fan_out)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+
+class OCREngine:
+    """
+    ส่งงาน OCR ไปยัง process pool ที่แต่ละ worker มี EasyOCR reader ของตัวเอง
+
+    Args:
+        processes (int): จำนวน worker process (0 = รันใน process ปัจจุบัน)
+        torch_threads (int): จำนวน torch thread ต่อ worker (0 = คำนวณอัตโนมัติ)
+        start_method (str): fork หรือ spawn
+        batch_window_ms (float): เวลารอรวม batch (0 = ส่งทีละรูป)
+    """
+
+    def __init__(self, processes: int = OCR_PROCESSES, torch_threads: int = OCR_TORCH_THREADS,
+                 start_method: str = OCR_START_METHOD, batch_window_ms: float = OCR_BATCH_WINDOW_MS):
+        self.processes = processes
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // max(processes, 1))
+        self.start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._status = {"state": "not_started", "warmup_seconds": None, "error": None}
+        self._batcher = OCRBatcher(self) if batch_window_ms > 0 else None
+
+    def start(self):
+        """สร้าง process pool และ pre-warm ทุก worker"""
+        with self._lock:
+            if self.processes <= 0 or self._executor is not None:
+                return
+            self._start_pool()
+
+    def _start_pool(self):
+        if self.start_method == 'fork':
+            # โหลด model ใน process หลักก่อน fork ให้ worker แชร์ weights แบบ copy-on-write
+            ocr_utils.get_reader()
+            # ย้าย object ที่มีอยู่ (รวม model) ออกจากการ scan ของ GC
+            # เพื่อไม่ให้ child เขียนทับ page ที่แชร์กันอยู่
+            gc.freeze()
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_init_worker,
+            initargs=(self.torch_threads,)
+        )
+        workers = [f.result() for f in [self._executor.submit(_worker_status) for _ in range(self.processes)]]
+        errors = [w["error"] for w in workers if w["state"] != "ready"]
+        if errors:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            raise RuntimeError(f"OCR worker warm-up ล้มเหลว: {errors[0]}")
+        logger.info(f"OCR process pool เริ่มทำงาน: {len({w['pid'] for w in workers})} workers ({self.start_method})")
+
+    def warm_up(self) -> Dict[str, Any]:
+        """โหลด model และรัน inference หลอก (ใน process หลักหรือในทุก worker)"""
+        self._status["state"] = "warming_up"
+        start = time.perf_counter()
+        try:
+            if self.processes <= 0:
+                result = ocr_utils.warm_up()
+                if result["state"] != "ready":
+                    raise RuntimeError(result["error"])
+            else:
+                self.start()
+            self._status["warmup_seconds"] = round(time.perf_counter() - start, 3)
+            self._status["state"] = "ready"
+        except Exception as e:
+            self._status["state"] = "error"
+            self._status["error"] = str(e)
+            logger.error(f"OCR engine warm-up error: {str(e)}")
+        return self.status()
+
+    @property
+    def ready(self) -> bool:
+        return self._status["state"] == "ready"
+
+    def tier_stats(self) -> Dict[str, Dict[str, Any]]:
+        """จำนวนครั้ง, hit rate และเวลาเฉลี่ยของแต่ละ OCR tier"""
+        return ocr_tiers.tier_stats.snapshot()
+
+    def status(self) -> Dict[str, Any]:
+        """สถานะของ engine สำหรับ readiness probe"""
+        return dict(
+            self._status,
+            processes=self.processes,
+            model_state=ocr_utils.model_status["state"],
+            model_load_seconds=ocr_utils.model_status["load_seconds"]
+        )
+
+    def submit_slip(self, image) -> Future:
+        """
+        ส่งงาน OCR แล้วคืน Future ของ (ข้อความ, ข้อมูลสลิปที่ OCR cascade แยกไว้แล้ว)
+
+        ข้อมูลสลิปเป็น None ถ้ายังไม่ได้แยก (โหมด micro-batching) หรือข้อความสั้นเกินไป
+
+        Args:
+            image: bytes ของไฟล์รูป (decode ใน worker), numpy array หรือ path
+        """
+        if self._batcher is not None:
+            return _chain(self._batcher.submit(image), lambda text: (text, None))
+        return _chain(self._submit(_run_ocr, image), _record_tiers)
+
+    def submit(self, image) -> Future:
+        """ส่งงาน OCR แล้วคืน Future ของข้อความที่อ่านได้"""
+        if self._batcher is not None:
+            return self._batcher.submit(image)
+        return _chain(self.submit_slip(image), lambda result: result[0])
+
+    def submit_batch(self, images: List[Any]) -> Future:
+        """ส่งหลายรูปเป็นงานเดียว คืน Future ของรายการข้อความตามลำดับรูป"""
+        return self._submit(_run_ocr_batch, images)
+
+    def read_regions(self, image, bank_hint: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        อ่านสลิปแบบ template (เฉพาะช่องข้อมูล) และรอผลลัพธ์ (เรียกจาก worker thread)
+
+        Returns:
+            Optional[Dict]: ผลจาก RegionOCR.read หรือ None ถ้าต้อง OCR ทั้งรูป
+        """
+        if not region_ocr.templates:
+            return None
+        return self._submit(_run_region_ocr, image, bank_hint).result()
+
+    def _submit(self, fn, *args) -> Future:
+        if self.processes <= 0:
+            return _call_now(fn, *args)
+
+        if self._executor is None:
+            self.start()
+        return self._executor.submit(fn, *args)
+
+    def extract_text(self, image) -> str:
+        """OCR รูปภาพและรอผลลัพธ์ (เรียกจาก worker thread)"""
+        return self.submit(image).result()
+
+    def read_slip(self, image) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """OCR รูปภาพและรอ (ข้อความ, ข้อมูลสลิปหรือ None) (เรียกจาก worker thread)"""
+        return self.submit_slip(image).result()
+
+    def shutdown(self):
+        if self._batcher is not None:
+            self._batcher.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+ocr_engine = OCREngine()
@@ -0,0 +1,189 @@
+# app/ocr_tiers.py - OCR หลายระดับ: engine ที่เร็วก่อน แล้วค่อยใช้ EasyOCR ถ้าข้อมูลยังไม่ครบ
+import os
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional, Tuple
+
+from . import ocr_utils
+
+logger = logging.getLogger(__name__)
+
+# ลำดับของ engine ที่ลอง (engine ที่ใช้ไม่ได้ เช่นไม่ได้ติดตั้ง tesseract จะถูกข้าม)
+# ค่าเริ่มต้นใช้ EasyOCR อย่างเดียว เปิด Tesseract ก่อนด้วย OCR_TIERS=tesseract,easyocr
+OCR_TIERS = [t.strip() for t in os.getenv('OCR_TIERS', 'easyocr').split(',') if t.strip()]
+# ใช้ผลของ tier ก่อนสุดท้ายเมื่อ parse_payment_slip ได้ field เหล่านี้ครบ
+OCR_TIER_FIELDS = [f.strip() for f in os.getenv('OCR_TIER_FIELDS', 'amount,time,reference').split(',') if f.strip()]
+
+# ตั้งค่า Tesseract
+OCR_TESSERACT_LANG = os.getenv('OCR_TESSERACT_LANG', 'tha+eng')
+OCR_TESSERACT_CONFIG = os.getenv('OCR_TESSERACT_CONFIG', '--oem 1 --psm 6')
+OCR_TESSERACT_CMD = os.getenv('OCR_TESSERACT_CMD', '')      # path ของ tesseract (ว่าง = หาใน PATH)
+
+
+class OCRTier(ABC):
+    """
+    engine OCR หนึ่งระดับ
+
+    subclass กำหนด name และ read() แล้วลงทะเบียนใน TIER_TYPES
+    """
+    name = ""
+
+    def available(self) -> bool:
+        """ใช้งานได้ในเครื่องนี้หรือไม่ (เช่นติดตั้ง dependency แล้ว)"""
+        return True
+
+    @abstractmethod
+    def read(self, image) -> str:
+        """อ่านข้อความจากรูป (numpy array แบบ BGR ที่ decode แล้ว)"""
+
+
+class TesseractTier(OCRTier):
+    """Tesseract (pytesseract) บนรูปที่เตรียมแล้ว เร็วกับ screenshot ที่ตัวอักษรคมชัด"""
+    name = "tesseract"
+
+    def __init__(self, lang: str = OCR_TESSERACT_LANG, config: str = OCR_TESSERACT_CONFIG,
+                 cmd: str = OCR_TESSERACT_CMD):
+        self.lang = lang
+        self.config = config
+        self.cmd = cmd
+        self._available: Optional[bool] = None
+
+    def available(self) -> bool:
+        if self._available is None:
+            try:
+                import pytesseract
+                if self.cmd:
+                    pytesseract.pytesseract.tesseract_cmd = self.cmd
+                languages = set(pytesseract.get_languages(config=''))
+                missing = [lang for lang in self.lang.split('+') if lang not in languages]
+                if missing:
+                    raise RuntimeError(f"ไม่มีข้อมูลภาษา {', '.join(missing)}")
+                self._available = True
+            except Exception as e:
+                logger.warning(f"ไม่ใช้ Tesseract: {str(e)}")
+                self._available = False
+        return self._available
+
+    def read(self, image) -> str:
+        import pytesseract
+
+        text = pytesseract.image_to_string(ocr_utils._prepare_image(image), lang=self.lang, config=self.config)
+        # Tesseract ให้บรรทัดว่างคั่นย่อหน้า
+        return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+class EasyOCRTier(OCRTier):
+    """EasyOCR (ocr_utils.extract_text_from_image) แม่นยำกว่าแต่ช้ากว่ามากบน CPU"""
+    name = "easyocr"
+
+    def read(self, image) -> str:
+        return ocr_utils.extract_text_from_image(image)
+
+
+TIER_TYPES = {tier.name: tier for tier in (TesseractTier, EasyOCRTier)}
+
+
+class OCRCascade:
+    """
+    ลอง OCR ทีละ tier ตามลำดับ หยุดเมื่อ parse_payment_slip ได้ field ที่กำหนดครบ
+
+    ถ้าทุก tier ไม่ครบจะใช้ผลของ tier สุดท้าย
+    ถ้า tier ก่อนหน้า error จะข้ามไป tier ถัดไป
+    ข้อมูลที่แยกได้ตอนตรวจถูกคืนไปพร้อมข้อความ ผู้เรียกไม่ต้อง parse ซ้ำ
+
+    Args:
+        tiers (List[str]): ชื่อ tier ตามลำดับ (ดู TIER_TYPES)
+        required_fields (List[str]): field ที่ต้องได้ครบจึงใช้ผลของ tier นั้น
+    """
+
+    def __init__(self, tiers: List[str] = OCR_TIERS, required_fields: List[str] = OCR_TIER_FIELDS):
+        unknown = [name for name in tiers if name not in TIER_TYPES]
+        if unknown:
+            raise ValueError(f"ไม่รู้จัก OCR tier: {', '.join(unknown)} (มี {', '.join(TIER_TYPES)})")
+        self.configured = [TIER_TYPES[name]() for name in tiers] or [EasyOCRTier()]
+        self.required_fields = required_fields
+        self._tiers: Optional[List[OCRTier]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tiers(self) -> List[OCRTier]:
+        """tier ที่ใช้งานได้ (ตรวจครั้งแรกที่เรียก)"""
+        if self._tiers is None:
+            with self._lock:
+                if self._tiers is None:
+                    self._tiers = [tier for tier in self.configured if tier.available()] or [EasyOCRTier()]
+                    logger.info(f"OCR tiers: {' -> '.join(tier.name for tier in self._tiers)}")
+        return self._tiers
+
+    @staticmethod
+    def parse(text: str) -> Optional[Dict[str, Any]]:
+        """แยกข้อมูลสลิปจากข้อความ (None ถ้าข้อความสั้นเกินกว่าจะเป็นสลิป)"""
+        if not text or len(text.strip()) < 3:
+            return None
+        return ocr_utils.parse_payment_slip(text)
+
+    def accepts(self, parsed: Optional[Dict[str, Any]]) -> bool:
+        """ผลของ tier นี้ใช้ได้หรือไม่ (แยกข้อมูลสลิปได้ครบ)"""
+        return parsed is not None and all(parsed.get(field) for field in self.required_fields)
+
+    def read(self, image) -> Tuple[str, Optional[Dict[str, Any]], List[Tuple[str, float, bool]]]:
+        """
+        OCR ด้วย tier ที่ถูกที่สุดที่ให้ข้อมูลครบ
+
+        Returns:
+            Tuple: (ข้อความ, ข้อมูลสลิปที่แยกได้หรือ None, รายการ (tier, วินาที, ได้ข้อมูลครบหรือไม่)
+            ของทุก tier ที่รัน)
+        """
+        # decode ครั้งเดียวใช้ร่วมกันทุก tier
+        image = ocr_utils._load_image(image)
+        tiers = self.tiers
+        attempts = []
+        for tier in tiers[:-1]:
+            start = time.perf_counter()
+            try:
+                text = tier.read(image)
+                parsed = self.parse(text)
+            except Exception as e:
+                logger.error(f"OCR tier {tier.name} error: {str(e)}")
+                text, parsed = "", None
+            accepted = self.accepts(parsed)
+            attempts.append((tier.name, time.perf_counter() - start, accepted))
+            if accepted:
+                return text, parsed, attempts
+
+        start = time.perf_counter()
+        text = tiers[-1].read(image)
+        parsed = self.parse(text)
+        attempts.append((tiers[-1].name, time.perf_counter() - start, self.accepts(parsed)))
+        return text, parsed, attempts
+
+
+class TierStats:
+    """ตัวนับของแต่ละ tier: จำนวนครั้งที่รัน, ครั้งที่ได้ข้อมูลครบ และเวลารวม (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, attempts: List[Tuple[str, float, bool]]):
+        with self._lock:
+            for name, seconds, accepted in attempts:
+                stats = self._stats.setdefault(name, {"calls": 0, "hits": 0, "seconds": 0.0})
+                stats["calls"] += 1
+                stats["hits"] += accepted
+                stats["seconds"] += seconds
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """สถิติของแต่ละ tier พร้อม hit rate และเวลาเฉลี่ย (ms)"""
+        with self._lock:
+            return {
+                name: dict(stats, hit_rate=round(stats["hits"] / stats["calls"], 4),
+                           avg_ms=round(stats["seconds"] / stats["calls"] * 1000, 1))
+                for name, stats in self._stats.items()
+            }
+
+
+ocr_cascade = OCRCascade()
+tier_stats = TierStats()
@@ -1,50 +1,397 @@
 # app/ocr_utils.py - EasyOCR Version (แก้ไขแล้ว)
-import easyocr
+import os
 import re
+import time
+import threading
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 
+from .slip_parser import slip_parser, parse_qr_payload
+
 # ตั้งค่า logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# สร้าง EasyOCR reader (รองรับภาษาไทยและอังกฤษ)
-reader = easyocr.Reader(['th', 'en'], gpu=False)
+# EasyOCR reader (รองรับภาษาไทยและอังกฤษ) - สร้างเมื่อเรียกใช้ครั้งแรกผ่าน get_reader()
+# เพื่อไม่ให้ import torch/EasyOCR ตอน import module
+_reader = None
+_reader_lock = threading.Lock()
+
+# ตั้งค่าการเตรียมรูปก่อน OCR (แต่ละขั้นตอนปิด/เปิดได้)
+# ขาวดำ/ตัดขอบ/แก้เอียงเปลี่ยนรูปที่ EasyOCR เห็น ปิดไว้จนกว่าจะวัดความแม่นยำด้วย bench.bench_pipeline แล้ว
+OCR_MAX_SIDE = int(os.getenv('OCR_MAX_SIDE', 1600))         # ย่อด้านยาวสุดไม่ให้เกินนี้ (0 = ไม่ย่อ)
+OCR_GRAYSCALE = os.getenv('OCR_GRAYSCALE', '0') == '1'      # แปลงเป็นภาพขาวดำ
+OCR_AUTO_CROP = os.getenv('OCR_AUTO_CROP', '0') == '1'      # ตัดขอบที่ไม่มีเนื้อหาออก
+OCR_DESKEW = os.getenv('OCR_DESKEW', '0') == '1'            # แก้รูปเอียง (สำหรับรูปถ่าย)
+
+# confidence ขั้นต่ำของข้อความที่นำไปใช้
+OCR_MIN_CONFIDENCE = float(os.getenv('OCR_MIN_CONFIDENCE', 0.5))
+
+# adaptive OCR: อ่านรูปความละเอียดต่ำก่อน ถ้าได้ข้อมูลสำคัญครบและมั่นใจพอก็จบ
+# ไม่อย่างนั้นอ่านซ้ำที่ความละเอียดเต็มเฉพาะบรรทัดที่ไม่มั่นใจ หรือทั้งรูปถ้ายังไม่ครบ
+OCR_ADAPTIVE = os.getenv('OCR_ADAPTIVE', '0') == '1'
+OCR_FAST_MAX_SIDE = int(os.getenv('OCR_FAST_MAX_SIDE', 800))           # ด้านยาวสุดของรอบแรก
+OCR_FAST_CONFIDENCE = float(os.getenv('OCR_FAST_CONFIDENCE', 0.7))     # confidence ที่ถือว่ามั่นใจ
+OCR_ADAPTIVE_FIELDS = [
+    f.strip() for f in os.getenv('OCR_ADAPTIVE_FIELDS', 'amount,time,reference').split(',') if f.strip()
+]
+
+# int8 dynamic quantization ของ recognizer (LSTM/Linear) บน CPU - เร็วขึ้นและใช้ memory น้อยลง
+# 1 = เปิด (ค่าเริ่มต้นเดิมของ EasyOCR), 0 = ใช้ float32 ทั้งหมด
+# detector (CRAFT) เป็น convolution ล้วน dynamic quantization จึงไม่มีผล
+OCR_QUANTIZE = os.getenv('OCR_QUANTIZE', '1') == '1'
+
+# ย่อรูปให้ด้านยาวสุดไม่เกินนี้ก่อนอ่าน QR (ถ้าไม่เจอจะลองกับรูปเต็มอีกครั้ง)
+QR_MAX_SIDE = int(os.getenv('QR_MAX_SIDE', 800))
+
+# สถานะของ model สำหรับ readiness probe
+model_status = {
+    "state": "not_loaded",  # not_loaded -> loading -> loaded -> ready / error
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "quantized": None,
+    "error": None
+}
+
+def _is_quantized(model) -> bool:
+    """model มี layer ที่ถูก quantize แล้วหรือไม่ (EasyOCR กลืน error ของ quantize_dynamic ไว้)"""
+    return any('quantized' in type(module).__module__ for module in model.modules())
+
+def create_reader(quantize: bool = OCR_QUANTIZE):
+    """
+    สร้าง EasyOCR reader ใหม่ (ไทย + อังกฤษ, CPU)
+    
+    Args:
+        quantize (bool): ใช้ recognizer แบบ int8 dynamic quantization
+        
+    Returns:
+        easyocr.Reader: reader ที่โหลด model แล้ว
+    """
+    import easyocr
+    return easyocr.Reader(['th', 'en'], gpu=False, quantize=quantize)
+
+def get_reader():
+    """
+    คืน EasyOCR reader โหลด model ครั้งแรกที่เรียก (thread-safe)
+    
+    Returns:
+        easyocr.Reader: reader ที่พร้อมใช้งาน
+    """
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                model_status["state"] = "loading"
+                start = time.perf_counter()
+                try:
+                    _reader = create_reader()
+                except Exception as e:
+                    model_status["state"] = "error"
+                    model_status["error"] = str(e)
+                    raise
+                model_status["load_seconds"] = round(time.perf_counter() - start, 3)
+                model_status["quantized"] = _is_quantized(_reader.recognizer)
+                model_status["state"] = "loaded"
+                if OCR_QUANTIZE and not model_status["quantized"]:
+                    logger.warning("OCR_QUANTIZE=1 แต่ quantize recognizer ไม่สำเร็จ ใช้ float32 แทน")
+                logger.info(f"โหลด EasyOCR model สำเร็จ ({model_status['load_seconds']}s, "
+                            f"quantized={model_status['quantized']})")
+    return _reader
+
+def warm_up() -> Dict[str, Any]:
+    """
+    โหลด model และรัน inference หลอก 1 ครั้ง ให้ request แรกไม่ต้องรอ
+    
+    Returns:
+        Dict: สถานะของ model หลัง warm-up
+    """
+    import numpy as np
+    
+    try:
+        reader = get_reader()
+        start = time.perf_counter()
+        reader.readtext(np.full((64, 256, 3), 255, dtype=np.uint8))
+        model_status["warmup_seconds"] = round(time.perf_counter() - start, 3)
+        model_status["state"] = "ready"
+        logger.info(f"Warm-up EasyOCR สำเร็จ ({model_status['warmup_seconds']}s)")
+    except Exception as e:
+        model_status["state"] = "error"
+        model_status["error"] = str(e)
+        logger.error(f"Warm-up error: {str(e)}")
+    return dict(model_status)
+
+def decode_image(image_data: bytes):
+    """
+    แปลง bytes ของไฟล์รูป (JPEG/PNG) เป็น numpy array แบบ BGR ใน memory
+    
+    Args:
+        image_data (bytes): เนื้อหาไฟล์รูปภาพ
+        
+    Returns:
+        numpy.ndarray: รูปภาพที่ decode แล้ว
+    """
+    import cv2
+    import numpy as np
+    
+    image = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("ไม่สามารถ decode รูปภาพได้")
+    return image
+
+def preprocess_image(image, max_side: int = OCR_MAX_SIDE, grayscale: bool = OCR_GRAYSCALE,
+                     auto_crop: bool = OCR_AUTO_CROP, deskew: bool = OCR_DESKEW) -> Tuple[Any, Dict[str, float]]:
+    """
+    เตรียมรูปก่อน OCR: ย่อขนาด, แปลงเป็นขาวดำ, ตัดเฉพาะส่วนที่มีเนื้อหา และแก้รูปเอียง
+    
+    Args:
+        image (numpy.ndarray): รูปภาพแบบ BGR หรือขาวดำ
+        max_side (int): ความยาวด้านยาวสุด (0 = ไม่ย่อ)
+        grayscale (bool): แปลงเป็นภาพขาวดำ
+        auto_crop (bool): ตัดขอบที่ไม่มีเนื้อหา
+        deskew (bool): หมุนแก้รูปเอียง
+        
+    Returns:
+        Tuple: (รูปที่เตรียมแล้ว, เวลาที่ใช้แต่ละขั้นตอน หน่วย ms)
+    """
+    import cv2
+    import numpy as np
+    
+    timings = {}
+    
+    # ย่อรูป - เวลาที่ใช้ตรวจหาข้อความของ EasyOCR โตตามจำนวน pixel
+    start = time.perf_counter()
+    height, width = image.shape[:2]
+    if max_side and max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    timings["resize"] = (time.perf_counter() - start) * 1000
+    
+    if not (grayscale or auto_crop or deskew):
+        return image, timings
+    
+    start = time.perf_counter()
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    if grayscale:
+        image = gray
+    timings["grayscale"] = (time.perf_counter() - start) * 1000
+    
+    # ตัดเฉพาะกรอบที่มีขอบ/ตัวอักษร เผื่อขอบไว้เล็กน้อย
+    if auto_crop:
+        start = time.perf_counter()
+        edges = cv2.dilate(cv2.Canny(gray, 50, 150), np.ones((5, 5), np.uint8))
+        points = cv2.findNonZero(edges)
+        if points is not None:
+            x, y, w, h = cv2.boundingRect(points)
+            height, width = gray.shape[:2]
+            # ไม่ตัดถ้ากรอบเล็กผิดปกติ (น่าจะจับผิด)
+            if w * h >= 0.2 * width * height:
+                margin = 10
+                x0, y0 = max(x - margin, 0), max(y - margin, 0)
+                x1, y1 = min(x + w + margin, width), min(y + h + margin, height)
+                image = image[y0:y1, x0:x1]
+                gray = gray[y0:y1, x0:x1]
+        timings["crop"] = (time.perf_counter() - start) * 1000
+    
+    # หามุมเอียงจากกรอบที่ล้อมตัวอักษร แล้วหมุนกลับ
+    if deskew:
+        start = time.perf_counter()
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        points = cv2.findNonZero(binary)
+        if points is not None:
+            angle = cv2.minAreaRect(points)[-1]
+            if angle > 45:
+                angle -= 90
+            elif angle < -45:
+                angle += 90
+            if 0.5 <= abs(angle) <= 15:
+                height, width = image.shape[:2]
+                matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+                image = cv2.warpAffine(image, matrix, (width, height),
+                                       flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        timings["deskew"] = (time.perf_counter() - start) * 1000
+    
+    return image, timings
+
+def _load_image(image):
+    """อ่าน/decode รูปเป็น numpy array"""
+    if isinstance(image, str):
+        logger.info(f"กำลังอ่านรูปภาพ: {image}")
+        with open(image, 'rb') as f:
+            image = f.read()
+    
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = decode_image(image)
+    return image
+
+def _prepare_image(image):
+    """อ่าน/decode รูปเป็น numpy array แล้วเตรียมรูปก่อน OCR"""
+    image, timings = preprocess_image(_load_image(image))
+    logger.info(
+        f"กำลังอ่านรูปภาพ: {image.shape[1]}x{image.shape[0]} "
+        f"(preprocess: {', '.join(f'{k}={v:.1f}ms' for k, v in timings.items())})"
+    )
+    return image
+
+def _results_to_text(results) -> str:
+    """รวมข้อความจากผลของ EasyOCR"""
+    extracted_text = ""
+    for (bbox, text, confidence) in results:
+        # กรองข้อความที่มี confidence ต่ำกว่า OCR_MIN_CONFIDENCE
+        if confidence > OCR_MIN_CONFIDENCE:
+            extracted_text += text + "\n"
+    
+    logger.info(f"อ่านข้อความสำเร็จ: {len(extracted_text)} ตัวอักษร")
+    return extracted_text.strip()
+
+def _pad_to_same_size(images: List[Any]) -> List[Any]:
+    """เติมขอบขาวด้านขวา/ล่างให้ทุกรูปขนาดเท่ากัน (readtext_batched ต้องการรูปขนาดเดียวกัน)"""
+    import cv2
+    
+    height = max(image.shape[0] for image in images)
+    width = max(image.shape[1] for image in images)
+    color = any(image.ndim == 3 for image in images)
+    
+    padded = []
+    for image in images:
+        if color and image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        padded.append(cv2.copyMakeBorder(
+            image, 0, height - image.shape[0], 0, width - image.shape[1],
+            cv2.BORDER_CONSTANT, value=(255, 255, 255) if color else 255
+        ))
+    return padded
 
-def extract_text_from_image(image_path: str) -> str:
+def extract_text_from_image(image, reader=None) -> str:
     """
     แยกข้อความจากรูปภาพด้วย EasyOCR
     
     Args:
-        image_path (str): path ของไฟล์รูปภาพ
+        image: path ของไฟล์รูปภาพ, bytes ของไฟล์รูป หรือ numpy array ที่ decode แล้ว
+        reader: EasyOCR reader ที่จะใช้ (ค่าเริ่มต้น = reader ที่ใช้ร่วมกันจาก get_reader())
         
     Returns:
         str: ข้อความที่อ่านได้
     """
     try:
-        logger.info(f"กำลังอ่านรูปภาพ: {image_path}")
+        if OCR_ADAPTIVE:
+            return _extract_text_adaptive(image, reader or get_reader())
+        
+        image = _prepare_image(image)
         
         # อ่านข้อความจากรูป
-        results = reader.readtext(image_path)
+        results = (reader or get_reader()).readtext(image)
+        return _results_to_text(results)
         
-        # รวมข้อความทั้งหมด
-        extracted_text = ""
-        for (bbox, text, confidence) in results:
-            # กรองข้อความที่มี confidence สูงกว่า 0.5
-            if confidence > 0.5:
-                extracted_text += text + "\n"
+    except Exception as e:
+        logger.error(f"Error extracting text: {str(e)}")
+        raise Exception(f"ไม่สามารถอ่านข้อความจากรูปได้: {str(e)}")
+
+def _normalize(text: str) -> str:
+    return re.sub(r'[\s,]', '', text)
+
+def _field_confidence(results, value: str) -> float:
+    """confidence สูงสุดของบรรทัดที่มีค่านี้ (0 ถ้าไม่เจอ)"""
+    value = _normalize(value)
+    return max((confidence for _, text, confidence in results if value in _normalize(text)), default=0.0)
+
+def _unresolved_fields(results, parsed_data: Dict[str, Any]) -> List[str]:
+    """field สำคัญที่ยังไม่ได้ค่า หรือได้จากบรรทัดที่ confidence ต่ำกว่า OCR_FAST_CONFIDENCE"""
+    return [
+        field for field in OCR_ADAPTIVE_FIELDS
+        if not parsed_data.get(field) or _field_confidence(results, parsed_data[field]) < OCR_FAST_CONFIDENCE
+    ]
+
+def _reread_regions(reader, image, results, scale: float):
+    """
+    อ่านบรรทัดที่ confidence ต่ำอีกครั้งจากรูปความละเอียดเต็ม (recognize เฉพาะกรอบ ไม่ detect ใหม่)
+    
+    Returns:
+        List: ผลลัพธ์ในรูปแบบเดียวกับ readtext (ใช้ค่าที่มั่นใจกว่าของแต่ละบรรทัด)
+    """
+    height, width = image.shape[:2]
+    pad = 4
+    low = []
+    for index, (bbox, _, confidence) in enumerate(results):
+        if confidence >= OCR_FAST_CONFIDENCE:
+            continue
+        xs = [point[0] / scale for point in bbox]
+        ys = [point[1] / scale for point in bbox]
+        box = [max(0, int(min(xs)) - pad), min(width, int(max(xs)) + pad),
+               max(0, int(min(ys)) - pad), min(height, int(max(ys)) + pad)]
+        if box[1] > box[0] and box[3] > box[2]:
+            low.append((index, box))
+    if not low:
+        return results
+    
+    reread = reader.recognize(image, horizontal_list=[box for _, box in low], free_list=[],
+                              detail=1, batch_size=len(low))
+    by_corner = {(int(bbox[0][0]), int(bbox[0][1])): (text, confidence) for bbox, text, confidence in reread}
+    
+    merged = list(results)
+    for index, box in low:
+        text, confidence = by_corner.get((box[0], box[2]), ("", 0.0))
+        if confidence > merged[index][2]:
+            merged[index] = (merged[index][0], text, confidence)
+    return merged
+
+def _extract_text_adaptive(image, reader) -> str:
+    """
+    OCR สองรอบ: รอบแรกที่ OCR_FAST_MAX_SIDE ถ้าได้ OCR_ADAPTIVE_FIELDS ครบและมั่นใจก็จบ
+    ไม่อย่างนั้นอ่านบรรทัดที่ไม่มั่นใจซ้ำที่ความละเอียดเต็ม แล้วค่อย OCR ทั้งรูปถ้ายังไม่ครบ
+    """
+    import cv2
+    
+    image, _ = preprocess_image(_load_image(image))
+    height, width = image.shape[:2]
+    scale = min(1.0, OCR_FAST_MAX_SIDE / max(height, width)) if OCR_FAST_MAX_SIDE else 1.0
+    
+    # รอบแรก: ย่อจากรูปที่เตรียมแล้ว พิกัดจึงแปลงกลับได้ด้วย scale อย่างเดียว
+    fast = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else image
+    results = reader.readtext(fast)
+    unresolved = _unresolved_fields(results, parse_payment_slip(_results_to_text(results)))
+    if not unresolved:
+        logger.info(f"adaptive OCR: จบที่รอบแรก ({fast.shape[1]}x{fast.shape[0]})")
+        return _results_to_text(results)
+    if scale >= 1:
+        return _results_to_text(results)
+    
+    # รอบสอง: อ่านเฉพาะบรรทัดที่ไม่มั่นใจที่ความละเอียดเต็ม
+    results = _reread_regions(reader, image, results, scale)
+    unresolved = _unresolved_fields(results, parse_payment_slip(_results_to_text(results)))
+    if not unresolved:
+        logger.info("adaptive OCR: จบหลังอ่านบรรทัดที่ไม่มั่นใจซ้ำ")
+        return _results_to_text(results)
+    
+    logger.info(f"adaptive OCR: ยังขาด {', '.join(unresolved)} อ่านทั้งรูปที่ความละเอียดเต็ม")
+    return _results_to_text(reader.readtext(image))
+
+def extract_text_batch(images: List[Any]) -> List[str]:
+    """
+    แยกข้อความจากหลายรูปใน forward pass เดียวด้วย readtext_batched
+    
+    Args:
+        images (List): รูปภาพแต่ละรูป (path, bytes หรือ numpy array)
         
-        logger.info(f"อ่านข้อความสำเร็จ: {len(extracted_text)} ตัวอักษร")
-        return extracted_text.strip()
+    Returns:
+        List[str]: ข้อความที่อ่านได้ ตามลำดับของรูป
+    """
+    try:
+        prepared = [_prepare_image(image) for image in images]
+        
+        if len(prepared) == 1:
+            batch_results = [get_reader().readtext(prepared[0])]
+        else:
+            batch_results = get_reader().readtext_batched(_pad_to_same_size(prepared))
+        return [_results_to_text(results) for results in batch_results]
         
     except Exception as e:
-        logger.error(f"Error extracting text: {str(e)}")
+        logger.error(f"Error extracting text (batch of {len(images)}): {str(e)}")
         raise Exception(f"ไม่สามารถอ่านข้อความจากรูปได้: {str(e)}")
 
 def parse_payment_slip(text: str) -> Dict[str, Any]:
     """
-    แยกข้อมูลสลิปเงินจากข้อความ
+    แยกข้อมูลสลิปเงินจากข้อความ (ดู SlipParser ใน slip_parser.py)
     
     Args:
         text (str): ข้อความที่อ่านได้จากรูป
@@ -53,203 +400,7 @@ def parse_payment_slip(text: str) -> Dict[str, Any]:
         Dict: ข้อมูลที่แยกได้
     """
     try:
-        parsed_data = {
-            "amount": None,
-            "date": None,
-            "time": None,
-            "bank": None,
-            "reference": None,
-            "account_number": None,
-            "recipient": None,
-            "sender": None,
-            "raw_text": text
-        }
-        
-        # แยกจำนวนเงิน - ปรับปรุงให้จับได้ดีขึ้น
-        amount_patterns = [
-            r'([0-9,]+\.?[0-9]*)\s*บาท',
-            r'([0-9,]+\.?[0-9]*)\s*THB',
-            r'จำนวนเงิน[:\s]*([0-9,]+\.?[0-9]*)',
-            r'Amount[:\s]*([0-9,]+\.?[0-9]*)',
-            r'฿([0-9,]+\.?[0-9]*)',
-            r'^\s*([0-9,]+\.?[0-9]*)\s*$'  # เลขที่อยู่คนเดียวในบรรทัด
-        ]
-        
-        # หาจำนวนเงินจากทุกบรรทัด
-        lines = text.split('\n')
-        for line in lines:
-            line = line.strip()
-            for pattern in amount_patterns:
-                match = re.search(pattern, line, re.IGNORECASE)
-                if match:
-                    amount_candidate = match.group(1).replace(',', '')
-                    # ตรวจสอบว่าเป็นตัวเลขที่สมเหตุสมผล (มากกว่า 0)
-                    try:
-                        amount_num = float(amount_candidate)
-                        if amount_num > 0:
-                            parsed_data["amount"] = amount_candidate
-                            break
-                    except:
-                        continue
-            if parsed_data["amount"]:
-                break
-        
-        # แยกวันที่ - ปรับปรุงให้จับภาษาไทยได้ดีขึ้น
-        date_patterns = [
-            r'(\d{1,2}\s+(?:ม\.ค\.|ก\.พ\.|มี\.ค\.|เม\.ย\.|พ\.ค\.|มิ\.ย\.|ก\.ค\.|ส\.ค\.|ก\.ย\.|ต\.ค\.|พ\.ย\.|ธ\.ค\.)\s+\d{4})',
-            r'(\d{1,2}\s+(?:มกราคม|กุมภาพันธ์|มีนาคม|เมษายน|พฤษภาคม|มิถุนายน|กรกฎาคม|สิงหาคม|กันยายน|ตุลาคม|พฤศจิกายน|ธันวาคม)\s+\d{4})',
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'(\d{4}-\d{2}-\d{2})',
-            r'(\d{2}/\d{2}/\d{4})'
-        ]
-        
-        for pattern in date_patterns:
-            match = re.search(pattern, text)
-            if match:
-                parsed_data["date"] = match.group(1)
-                break
-        
-        # แยกเวลา
-        time_patterns = [
-            r'(\d{1,2}:\d{2}:\d{2})',
-            r'(\d{1,2}:\d{2})'
-        ]
-        
-        for pattern in time_patterns:
-            match = re.search(pattern, text)
-            if match:
-                parsed_data["time"] = match.group(1)
-                break
-        
-        # แยกชื่อธนาคาร - เพิ่ม SCB เป็นพิเศษ
-        bank_keywords = {
-            'SCB': ['scb', 'uscb', 'ไทยพาณิชย์', 'siam commercial'],
-            'กสิกรไทย': ['กสิกรไทย', 'kbank', 'kasikorn'],
-            'กรุงเทพ': ['กรุงเทพ', 'bbl', 'bangkok bank'],
-            'กรุงไทย': ['กรุงไทย', 'ktb', 'krung thai'],
-            'ทีเอ็มบี': ['ทีเอ็มบี', 'tmb', 'tmbthanachart'],
-            'ธนชาต': ['ธนชาต', 'thanachart'],
-            'ยูโอบี': ['ยูโอบี', 'uob'],
-            'ซีไอเอ็มบี': ['ซีไอเอ็มบี', 'cimb'],
-            'ไอซีบีซี': ['ไอซีบีซี', 'icbc'],
-            'ก.ส.ห.': ['ก.ส.ห.', 'baac', 'bank for agriculture']
-        }
-        
-        text_lower = text.lower()
-        for bank_name, keywords in bank_keywords.items():
-            for keyword in keywords:
-                if keyword.lower() in text_lower:
-                    parsed_data["bank"] = bank_name
-                    break
-            if parsed_data["bank"]:
-                break
-        
-        # รองรับสลิปกรุงไทย
-        ktb_pattern = (
-            r'(?:นาย|นาง|น\.ส\.|ด\.ช\.|ด\.ญ\.)\s*([^\n]+)\s*\n'
-            r'(?:กรุงไทย|krungthai)\s*\n'
-            r'xxx-x-[x\d]+-\d\s*\n'
-            r'รหัสร้านค้า\s*\n'
-            r'(\d+)\s*\n'
-            r'(?:รหัสธุรกรรม|เลขที่อ้างอิง)\s*\n'
-            r'[a-zA-Z0-9]+\s*\n'
-            r'จำนวนเงิน\s*\n'
-            r'(\d+(?:\.\d{2})?)\s*บาท'
-        )
-        match = re.search(ktb_pattern, text, re.IGNORECASE | re.MULTILINE)
-        if match:
-            sender_name = match.group(1).strip()
-            parsed_data["sender"] = sender_name
-            parsed_data["amount"] = match.group(3)
-            store_id = match.group(2)
-            return parsed_data
-
-        # รองรับสลิปกสิกรไทย - แก้ไขใหม่
-        kbank_pattern = r'นาย\s+([^\n]+)\s*\nธ\.กสิกรไทย[\s\S]*?นาง\s+([^\n]+)\s*\nธ\.กสิกรไทย'
-        match = re.search(kbank_pattern, text)
-        if match:
-            parsed_data["sender"] = f"นาย {match.group(1)}".strip()  # เพิ่ม "นาย" ในผู้โอน
-            parsed_data["recipient"] = f"นาง {match.group(2)}".strip()
-            return parsed_data
-
-        # แยกผู้โอน - ปรับปรุงให้จับได้ดีขึ้น
-        sender_patterns = [
-            r'จาก\s*\n\s*(นาย\s+[^\n]+)',  # แก้ไขให้เก็บคำนำหน้า "นาย" ด้วย
-            r'จาก\s*\n\s*(นาง\s+[^\n]+)', 
-            r'จาก\s*\n\s*(นางสาว\s+[^\n]+)',
-            r'จาก\s*\n\s*([^\n]+?)(?=\s*xxx|\s*x-|\n|$)',
-            r'(นาย\s+[^\n]+?)(?=\s*xxx|\s*x-|\n|$)',  # แก้ไขให้เก็บคำนำหน้า "นาย" ด้วย
-            r'(นาง\s+[^\n]+?)(?=\s*xxx|\s*x-|\n|$)',
-            r'(นางสาว\s+[^\n]+?)(?=\s*xxx|\s*x-|\n|$)',
-            r'ผู้โอน[:\s]*([^\n]+)',
-            r'from[:\s]*([^\n]+)'
-        ]
-        
-        for pattern in sender_patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
-            if match:
-                sender = match.group(1).strip()
-                # ทำความสะอาดชื่อ
-                sender = re.sub(r'\s*xxx.*', '', sender).strip()
-                sender = re.sub(r'\s*x-.*', '', sender).strip()
-                if sender and len(sender) > 1:  # ตรวจสอบว่าไม่ใช่ข้อความว่าง
-                    parsed_data["sender"] = sender  # ไม่ต้องเพิ่ม f"นาย {sender}" แล้ว
-                    break
-
-        # แยกผู้รับ - ปรับปรุงให้จับได้ดีขึ้น
-        recipient_patterns = [
-            r'ไปยัง\s*\n\s*บจก\.\s*\n\s*([^\n]+?)(?=\s*x-|\n|$)',
-            r'ไปยัง\s*\n\s*([^\n]+?)(?=\s*x-|\n|$)',
-            r'บจก\.\s*\n\s*([^\n]+?)(?=\s*x-|\n|$)',
-            r'บจก\.\s*([^\n]+?)(?=\s*x-|\n|$)',
-            r'ผู้รับ[:\s]*([^\n]+)',
-            r'to[:\s]*([^\n]+)',
-            r'นาย\s+([^\n]+?)(?=\s*xxx|\s*x-|\n|$)',
-            r'นาง\s+([^\n]+?)(?=\s*xxx|\s*x-|\n|$)',
-        ]
-        
-        for pattern in recipient_patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
-            if match:
-                recipient = match.group(1).strip()
-                # ทำความสะอาดชื่อ
-                recipient = re.sub(r'\s*x-.*', '', recipient).strip()
-                recipient = re.sub(r'\s*xxx.*', '', recipient).strip()
-                if recipient and len(recipient) > 1:  # ตรวจสอบว่าไม่ใช่ข้อความว่าง
-                    parsed_data["recipient"] = recipient
-                    break
-        
-        # แยกหมายเลขอ้างอิง - ปรับปรุงให้จับได้ดีขึ้น
-        ref_patterns = [
-            r'รหัสอ้างอิง[:\s]*([A-Za-z0-9]+)',
-            r'อ้างอิง[:\s]*([A-Za-z0-9]+)',
-            r'reference[:\s]*([A-Za-z0-9]+)',
-            r'ref[:\s]*([A-Za-z0-9]+)',
-            r'เลขที่[:\s]*([A-Za-z0-9]+)'
-        ]
-        
-        for pattern in ref_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                parsed_data["reference"] = match.group(1)
-                break
-        
-        # แยกเลขบัญชี
-        account_patterns = [
-            r'(xxx-xxx\d+-\d+)',
-            r'(x-\d+)',
-            r'บัญชี[:\s]*([0-9x-]+)',
-            r'account[:\s]*([0-9x-]+)',
-            r'a/c[:\s]*([0-9x-]+)'
-        ]
-        
-        for pattern in account_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                parsed_data["account_number"] = match.group(1)
-                break
-        
-        return parsed_data
+        return slip_parser.parse(text)
         
     except Exception as e:
         logger.error(f"Error parsing slip: {str(e)}")
@@ -315,8 +466,10 @@ def format_slip_summary(data) -> str:
         if parsed_data.get("account_number"):
             summary += f"💳 **เลขบัญชี**: {parsed_data['account_number']}\n"
         
-        # ข้อความเต็ม
+        # ข้อความเต็ม (ไม่แสดงถ้าไม่ได้ OCR เช่นข้อมูลจาก QR อย่างเดียว)
         raw_text = parsed_data.get('raw_text', text if isinstance(data, str) else 'ไม่มีข้อมูล')
+        if not raw_text:
+            return summary.rstrip('\n')
         summary += f"📝 **ข้อความเต็ม**:\n```\n{raw_text}\n```\n"
         
         # สถิติ
@@ -331,22 +484,101 @@ def format_slip_summary(data) -> str:
         logger.error(f"Error formatting summary: {str(e)}")
         return f"❌ เกิดข้อผิดพลาดในการจัดรูปแบบ: {str(e)}"
 
-def extract_qr_code(image_path: str) -> Optional[str]:
+def extract_qr_code(image, max_side: int = QR_MAX_SIDE) -> Optional[str]:
     """
-    แยก QR Code จากรูปภาพ (EasyOCR ไม่รองรับ QR Code โดยตรง)
-    ใช้สำหรับอนาคต หรือเพิ่มเติมด้วย library อื่น
+    อ่าน QR Code จากรูปภาพด้วย OpenCV QRCodeDetector
+    
+    ลองกับรูปที่ย่อแล้วก่อน (เร็วกว่ามาก) ถ้าไม่เจอค่อยลองกับรูปขนาดเต็ม
     
     Args:
-        image_path (str): path ของไฟล์รูปภาพ
+        image: path ของไฟล์รูปภาพ, bytes ของไฟล์รูป หรือ numpy array ที่ decode แล้ว
+        max_side (int): ความยาวด้านยาวสุดของรูปที่ใช้ลองครั้งแรก
         
     Returns:
         Optional[str]: ข้อมูลใน QR Code หรือ None
     """
     try:
-        # TODO: เพิ่มการอ่าน QR Code ด้วย pyzbar หรือ library อื่น
-        logger.info("QR Code extraction ยังไม่รองรับ")
+        import cv2
+        
+        if isinstance(image, str):
+            with open(image, 'rb') as f:
+                image = f.read()
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            image = decode_image(image)
+        
+        detector = cv2.QRCodeDetector()
+        attempts = [image]
+        height, width = image.shape[:2]
+        if max_side and max(height, width) > max_side:
+            scale = max_side / max(height, width)
+            attempts.insert(0, cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+        
+        for attempt in attempts:
+            data, points, _ = detector.detectAndDecode(attempt)
+            if data:
+                return data
         return None
         
     except Exception as e:
         logger.error(f"Error extracting QR code: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+def read_slip_qr(image) -> Optional[Dict[str, Any]]:
+    """
+    อ่าน QR ของสลิปและแยกข้อมูล (เลขอ้างอิง, ธนาคาร, จำนวนเงิน)
+    
+    Returns:
+        Optional[Dict]: ข้อมูลจาก QR หรือ None ถ้าไม่มี QR ที่รู้จัก
+    """
+    payload = extract_qr_code(image)
+    if not payload:
+        return None
+    
+    qr_data = parse_qr_payload(payload)
+    logger.info(f"อ่าน QR สำเร็จ: type={qr_data['type']}")
+    return qr_data if qr_data["type"] else None
+
+def is_slip_qr(qr_data: Optional[Dict[str, Any]]) -> bool:
+    """
+    QR ตรวจสอบสลิปของธนาคารหรือไม่ (ออกให้หลังโอนสำเร็จ)
+    
+    QR PromptPay เป็นแค่คำขอให้จ่ายเงิน (มีจำนวนเงินและเลขอ้างอิงของร้าน) ไม่ใช่หลักฐานการโอน
+    """
+    return bool(qr_data) and qr_data.get("type") == "slip"
+
+def merge_qr_data(parsed_data: Dict[str, Any], qr_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    ใส่ข้อมูลจาก QR ลงในข้อมูลสลิป (ค่าจาก QR แม่นกว่า OCR จึงใช้แทน)
+    
+    ใช้เฉพาะ QR ตรวจสอบสลิป QR แบบอื่น (เช่น PromptPay) ไม่ถูกนำมาใส่
+    
+    Args:
+        parsed_data (Dict): ผลจาก parse_payment_slip
+        qr_data (Dict): ผลจาก read_slip_qr
+        
+    Returns:
+        Dict: ข้อมูลสลิปที่รวมแล้ว
+    """
+    if not is_slip_qr(qr_data):
+        return parsed_data
+    
+    for field in ("reference", "bank", "amount"):
+        if qr_data.get(field):
+            parsed_data[field] = qr_data[field]
+    parsed_data["qr"] = qr_data
+    return parsed_data
+
+def qr_only_slip(qr_data: Dict[str, Any]) -> Dict[str, Any]:
+    """สร้างข้อมูลสลิปจาก QR ตรวจสอบสลิปอย่างเดียว (ใช้เมื่อข้าม OCR)"""
+    parsed_data = {
+        "amount": None,
+        "date": None,
+        "time": None,
+        "bank": None,
+        "reference": None,
+        "account_number": None,
+        "recipient": None,
+        "sender": None,
+        "raw_text": ""
+    }
+    return merge_qr_data(parsed_data, qr_data)
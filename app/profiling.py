@@ -0,0 +1,304 @@
+# app/profiling.py - profile การประมวลผลรูปสลิปเฉพาะ request ที่เลือก (เปิด/ปิดผ่าน admin endpoint)
+"""
+เปิดด้วย PUT /admin/profiling (ต้องตั้ง PROFILING_ADMIN_TOKEN) แล้วเลือก request ได้สองแบบ
+สุ่มตามเปอร์เซ็นต์ (sample_percent) หรือเลือกเฉพาะผู้ใช้ (user_ids)
+
+request ที่ถูกเลือกจะเก็บ
+- เวลาของแต่ละขั้นตอน (download, queue_wait, qr, ocr, parse, reply, ...) จาก metrics.STAGE
+- profile ของงานใน worker thread (process_slip_image) แบบ cProfile (ดาวน์โหลดเป็น .pstats)
+  หรือแบบ sampling (ดาวน์โหลดเป็น folded stacks สำหรับ flamegraph.pl / speedscope)
+
+ถ้า OCR รันใน process pool (OCR_PROCESSES > 0) เวลา OCR จะเห็นเป็นการรอ Future ใน profile
+ต้องใช้เวลาของขั้นตอน ocr ประกอบ
+
+ตอนปิด (ค่าเริ่มต้น) ต้นทุนต่อ request คือเช็ค flag หนึ่งครั้ง และ ContextVar.get() หนึ่งครั้งต่อขั้นตอน
+"""
+import os
+import sys
+import hmac
+import time
+import uuid
+import random
+import marshal
+import logging
+import threading
+import contextvars
+from collections import Counter, OrderedDict
+from typing import Dict, Any, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# token สำหรับ /admin/profiling (ว่าง = ปิด endpoint)
+PROFILING_ADMIN_TOKEN = os.getenv('PROFILING_ADMIN_TOKEN', '')
+# จำนวน profile ที่เก็บไว้ใน memory (เก่าสุดถูกลบก่อน)
+PROFILING_KEEP = int(os.getenv('PROFILING_KEEP', 50))
+
+MODES = ("cprofile", "sample")
+
+# profile ของ request ที่กำลังประมวลผลใน context นี้ (None = ไม่ได้ถูกเลือก)
+current_capture: "contextvars.ContextVar[Optional[Capture]]" = contextvars.ContextVar('current_capture', default=None)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler:
+    """เก็บ stack ของ thread หนึ่งทุก interval วินาที (sampling profiler แบบไม่ต้องติดตั้งเพิ่ม)"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+class Capture:
+    """
+    ผล profiling ของรูปหนึ่งรูป
+
+    Args:
+        user_id (str): ผู้ส่ง
+        message_id (str): message id ของรูป
+        mode (str): cprofile หรือ sample
+        interval_ms (float): ช่วงเวลาระหว่าง sample (โหมด sample)
+    """
+
+    def __init__(self, user_id: Optional[str], message_id: Optional[str], mode: str, interval_ms: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.user_id = user_id
+        self.message_id = message_id
+        self.mode = mode
+        self.interval = interval_ms / 1000
+        self.created = time.time()
+        self.timings: Dict[str, float] = {}      # ขั้นตอน -> ms
+        self.error: Optional[str] = None
+        self.data: Optional[bytes] = None        # .pstats (marshal) หรือ folded stacks
+        self.top: List[Dict[str, Any]] = []
+
+    def record(self, stage: str, seconds: float):
+        self.timings[stage] = round(self.timings.get(stage, 0.0) + seconds * 1000, 2)
+
+    def bind(self, fn):
+        """คืนฟังก์ชันที่รัน fn ภายใต้ profiler (สำหรับส่งเข้า executor)"""
+        def run(*args):
+            # context ใหม่ทุกครั้ง ไม่ให้ current_capture ค้างใน thread ของ pool
+            return contextvars.copy_context().run(self._run, fn, *args)
+        return run
+
+    def _run(self, fn, *args):
+        current_capture.set(self)
+        if self.mode == "sample":
+            sampler = _Sampler(threading.get_ident(), self.interval)
+            try:
+                return fn(*args)
+            finally:
+                self._store_samples(sampler.stop())
+
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # มี profiler อื่นทำงานอยู่ (Python 3.12+ เปิด cProfile ได้ทีละตัว) เก็บแค่เวลาของขั้นตอน
+            self.error = f"cProfile: {str(e)}"
+            return fn(*args)
+        try:
+            return fn(*args)
+        finally:
+            profile.disable()
+            self._store_profile(profile)
+
+    def _store_profile(self, profile):
+        import pstats
+
+        stats = pstats.Stats(profile)
+        self.data = marshal.dumps(stats.stats)
+        ranked = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:20]
+        self.top = [
+            {"function": f"{name} ({os.path.basename(filename)}:{line})", "calls": nc,
+             "own_ms": round(tt * 1000, 2), "cumulative_ms": round(ct * 1000, 2)}
+            for (filename, line, name), (_, nc, tt, ct, _) in ranked
+        ]
+
+    def _store_samples(self, stacks: Counter):
+        self.data = "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()).encode('utf-8')
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(stacks.values()) or 1
+        self.top = [
+            {"function": name, "samples": count, "share": round(count / total, 4)}
+            for name, count in leaves.most_common(20)
+        ]
+
+    def summary(self, detail: bool = False) -> Dict[str, Any]:
+        result = {
+            "id": self.id, "user_id": self.user_id, "message_id": self.message_id, "mode": self.mode,
+            "created": self.created, "timings_ms": self.timings, "error": self.error,
+        }
+        if detail:
+            result["top"] = self.top
+        return result
+
+
+class Profiler:
+    """
+    เลือก request ที่จะ profile และเก็บผลล่าสุดไว้ PROFILING_KEEP รายการ
+
+    Args:
+        keep (int): จำนวนผลที่เก็บไว้
+    """
+
+    def __init__(self, keep: int = PROFILING_KEEP):
+        self.keep = max(1, keep)
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.user_ids: set = set()
+        self.mode = "cprofile"
+        self.interval_ms = 5.0
+        self._captures: "OrderedDict[str, Capture]" = OrderedDict()
+
+    def select(self, user_id: Optional[str], message_id: Optional[str]) -> Optional[Capture]:
+        """Capture ใหม่ถ้า request นี้ถูกเลือก ไม่อย่างนั้น None"""
+        if not self.enabled:
+            return None
+        if user_id in self.user_ids or (self.sample_rate and random.random() < self.sample_rate):
+            return Capture(user_id, message_id, self.mode, self.interval_ms)
+        return None
+
+    def finish(self, capture: Capture):
+        self._captures[capture.id] = capture
+        while len(self._captures) > self.keep:
+            self._captures.popitem(last=False)
+        logger.info(f"profile {capture.id} (message {capture.message_id}): "
+                    f"{capture.timings.get('total', 0):.0f} ms")
+
+    def get(self, capture_id: str) -> Optional[Capture]:
+        return self._captures.get(capture_id)
+
+    def captures(self) -> List[Capture]:
+        """ผลทั้งหมด ใหม่สุดก่อน"""
+        return list(reversed(self._captures.values()))
+
+    def clear(self):
+        self._captures.clear()
+
+    def config(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled, "sample_percent": self.sample_rate * 100, "user_ids": sorted(self.user_ids),
+            "mode": self.mode, "interval_ms": self.interval_ms, "stored": len(self._captures), "keep": self.keep,
+        }
+
+
+profiler = Profiler()
+
+
+# ---------- admin endpoint ----------
+
+class ProfilingConfig(BaseModel):
+    """ค่าที่จะเปลี่ยน (field ที่ไม่ส่งมาคงค่าเดิม)"""
+    enabled: Optional[bool] = None
+    sample_percent: Optional[float] = None
+    user_ids: Optional[List[str]] = None
+    mode: Optional[str] = None
+    interval_ms: Optional[float] = None
+
+
+def require_admin(request: Request):
+    """ตรวจ Authorization: Bearer <PROFILING_ADMIN_TOKEN> (ไม่ตั้ง token = ไม่มี endpoint นี้)"""
+    if not PROFILING_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), PROFILING_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+
+profiling_router = APIRouter(prefix="/admin/profiling", dependencies=[Depends(require_admin)])
+
+
+@profiling_router.get("")
+async def list_profiles():
+    """การตั้งค่าปัจจุบันและรายการ profile ที่เก็บไว้ (ใหม่สุดก่อน)"""
+    return {"config": profiler.config(), "captures": [c.summary() for c in profiler.captures()]}
+
+
+@profiling_router.put("")
+async def configure_profiling(config: ProfilingConfig):
+    """เปิด/ปิด และเลือก request ที่จะ profile"""
+    if config.mode is not None and config.mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"mode ต้องเป็น {' หรือ '.join(MODES)}")
+    if config.sample_percent is not None and not 0 <= config.sample_percent <= 100:
+        raise HTTPException(status_code=400, detail="sample_percent ต้องอยู่ระหว่าง 0-100")
+    if config.interval_ms is not None and config.interval_ms < 1:
+        raise HTTPException(status_code=400, detail="interval_ms ต้องไม่น้อยกว่า 1")
+
+    if config.sample_percent is not None:
+        profiler.sample_rate = config.sample_percent / 100
+    if config.user_ids is not None:
+        profiler.user_ids = set(config.user_ids)
+    if config.mode is not None:
+        profiler.mode = config.mode
+    if config.interval_ms is not None:
+        profiler.interval_ms = config.interval_ms
+    if config.enabled is not None:
+        profiler.enabled = config.enabled
+    logger.info(f"profiling config: {profiler.config()}")
+    return profiler.config()
+
+
+@profiling_router.delete("")
+async def clear_profiles():
+    profiler.clear()
+    return profiler.config()
+
+
+def _get_capture(capture_id: str) -> Capture:
+    capture = profiler.get(capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail="ไม่พบ profile")
+    return capture
+
+
+@profiling_router.get("/{capture_id}")
+async def get_profile(capture_id: str):
+    """เวลาของแต่ละขั้นตอนและฟังก์ชันที่ใช้เวลามากที่สุด"""
+    return _get_capture(capture_id).summary(detail=True)
+
+
+@profiling_router.get("/{capture_id}/download")
+async def download_profile(capture_id: str):
+    """
+    ดาวน์โหลด profile: cprofile = ไฟล์ .pstats (python -m pstats, snakeviz)
+    sample = folded stacks (flamegraph.pl, speedscope)
+    """
+    capture = _get_capture(capture_id)
+    if capture.data is None:
+        raise HTTPException(status_code=404, detail="profile นี้มีแค่เวลาของขั้นตอน")
+    extension = "pstats" if capture.mode == "cprofile" else "folded"
+    return Response(
+        capture.data,
+        media_type="application/octet-stream" if capture.mode == "cprofile" else "text/plain; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="slip-{capture.id}.{extension}"'}
+    )
@@ -0,0 +1,219 @@
+# app/region_ocr.py - OCR เฉพาะช่องข้อมูลของสลิปที่รู้ layout (template mode)
+"""
+สลิปของแต่ละธนาคารมี layout ตายตัว เมื่อรู้ว่าเป็นธนาคารไหนแล้วจึงอ่านเฉพาะช่องที่ต้องการ
+ด้วย EasyOCR recognize() โดยส่งกรอบไปตรงๆ ไม่ต้องรัน text detection ทั้งรูป
+
+template เก็บเป็นไฟล์ JSON ใน app/slip_templates/ (เพิ่มธนาคารใหม่ได้โดยเพิ่มไฟล์):
+
+    {
+        "name": "kbank_kplus",
+        "bank": "กสิกรไทย",                  # ชื่อธนาคารตาม BANK_KEYWORDS
+        "aspect": [0.8, 0.95],               # ช่วงอัตราส่วน กว้าง/สูง ของรูปที่ใช้ template นี้ได้
+        "identify": {                        # ช่องที่ใช้ยืนยันว่าเป็นสลิปของธนาคารนี้
+            "region": [x0, y0, x1, y1],
+            "keywords": ["กสิกร", "kbank"]
+        },
+        "fields": {                          # datetime, date, time, amount, reference, sender, recipient, account
+            "amount": [x0, y0, x1, y1],
+            ...
+        }
+    }
+
+พิกัดเป็นสัดส่วนของความกว้าง/สูงของรูป (0-1) จึงใช้ได้กับรูปทุกความละเอียด
+"""
+import os
+import json
+import glob
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from .ocr_utils import get_reader, decode_image, OCR_MAX_SIDE
+from .slip_parser import slip_parser
+
+logger = logging.getLogger(__name__)
+
+# ใช้ template mode ก่อน OCR ทั้งรูป (ปิดไว้ก่อน เปิดเมื่อ bench_pipeline --compare-templates
+# แสดงว่าแม่นยำไม่ต่ำกว่า OCR ทั้งรูปกับสลิปจริง)
+OCR_TEMPLATES = os.getenv('OCR_TEMPLATES', '0') == '1'
+# โฟลเดอร์ของไฟล์ template
+OCR_TEMPLATE_DIR = os.getenv('OCR_TEMPLATE_DIR', os.path.join(os.path.dirname(__file__), 'slip_templates'))
+# ช่องที่ต้องอ่านได้ ไม่อย่างนั้นจะกลับไป OCR ทั้งรูป
+OCR_TEMPLATE_REQUIRED = [
+    f.strip() for f in os.getenv('OCR_TEMPLATE_REQUIRED', 'amount,reference').split(',') if f.strip()
+]
+# confidence ขั้นต่ำของข้อความในแต่ละช่อง
+OCR_TEMPLATE_MIN_CONFIDENCE = float(os.getenv('OCR_TEMPLATE_MIN_CONFIDENCE', 0.5))
+
+
+class SlipTemplate:
+    """
+    layout ของสลิปธนาคารหนึ่งแบบ (โหลดจากไฟล์ JSON)
+
+    Args:
+        name (str): ชื่อ template
+        bank (str): ชื่อธนาคาร
+        fields (Dict): ชื่อช่อง -> กรอบ [x0, y0, x1, y1] แบบสัดส่วน
+        identify_region (List[float]): กรอบที่ใช้ยืนยันธนาคาร
+        identify_keywords (List[str]): keyword ที่ต้องเจอในกรอบยืนยัน
+        aspect (Tuple[float, float]): ช่วงอัตราส่วน กว้าง/สูง ที่รับได้
+    """
+
+    def __init__(self, name: str, bank: str, fields: Dict[str, List[float]],
+                 identify_region: Optional[List[float]] = None, identify_keywords: Optional[List[str]] = None,
+                 aspect: Optional[Tuple[float, float]] = None):
+        self.name = name
+        self.bank = bank
+        self.fields = fields
+        self.identify_region = identify_region
+        self.identify_keywords = [k.lower() for k in identify_keywords or []]
+        self.aspect = aspect
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SlipTemplate":
+        identify = data.get("identify") or {}
+        return cls(
+            name=data["name"],
+            bank=data["bank"],
+            fields=data["fields"],
+            identify_region=identify.get("region"),
+            identify_keywords=identify.get("keywords"),
+            aspect=tuple(data["aspect"]) if data.get("aspect") else None
+        )
+
+    def fits(self, width: int, height: int) -> bool:
+        """รูปขนาดนี้ใช้ template นี้ได้หรือไม่"""
+        if not self.aspect:
+            return True
+        return self.aspect[0] <= width / height <= self.aspect[1]
+
+    def matches(self, text: str) -> bool:
+        """ข้อความในกรอบยืนยันมี keyword ของธนาคารนี้หรือไม่"""
+        text = text.lower()
+        return any(keyword in text for keyword in self.identify_keywords)
+
+
+def load_templates(directory: str = OCR_TEMPLATE_DIR) -> List[SlipTemplate]:
+    """โหลด template ทุกไฟล์ *.json ในโฟลเดอร์ (ไฟล์ที่ผิดรูปแบบจะถูกข้ามพร้อม log)"""
+    templates = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        try:
+            with open(path, encoding='utf-8') as f:
+                templates.append(SlipTemplate.from_dict(json.load(f)))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"ไม่สามารถโหลด slip template {path}: {str(e)}")
+    return templates
+
+
+def _box(region: List[float], width: int, height: int) -> List[int]:
+    """แปลงกรอบแบบสัดส่วน [x0, y0, x1, y1] เป็น [x_min, x_max, y_min, y_max] ของ EasyOCR"""
+    x0, y0, x1, y1 = region
+    return [
+        max(0, int(x0 * width)), min(width, int(x1 * width)),
+        max(0, int(y0 * height)), min(height, int(y1 * height))
+    ]
+
+
+class RegionOCR:
+    """
+    อ่านสลิปแบบ template: ระบุธนาคาร แล้ว recognize เฉพาะช่องข้อมูลของ template นั้น
+
+    Args:
+        templates (List[SlipTemplate]): template ที่รองรับ
+        required (List[str]): ช่องที่ต้องอ่านได้ถึงจะถือว่าสำเร็จ
+        min_confidence (float): confidence ขั้นต่ำของข้อความ
+        max_side (int): ย่อรูปให้ด้านยาวสุดไม่เกินนี้ก่อนอ่าน
+    """
+
+    def __init__(self, templates: List[SlipTemplate], required: List[str] = OCR_TEMPLATE_REQUIRED,
+                 min_confidence: float = OCR_TEMPLATE_MIN_CONFIDENCE, max_side: int = OCR_MAX_SIDE):
+        self.templates = templates
+        self.required = required
+        self.min_confidence = min_confidence
+        self.max_side = max_side
+
+    def _load_gray(self, image):
+        """decode, ย่อ และแปลงเป็นขาวดำ (ไม่ crop เพื่อให้พิกัดของ template ตรงกับรูปเดิม)"""
+        import cv2
+
+        if isinstance(image, str):
+            with open(image, 'rb') as f:
+                image = f.read()
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            image = decode_image(image)
+
+        height, width = image.shape[:2]
+        if self.max_side and max(height, width) > self.max_side:
+            scale = self.max_side / max(height, width)
+            image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+    def _recognize(self, gray, boxes: List[List[int]]) -> Dict[Tuple[int, int], Tuple[str, float]]:
+        """
+        อ่านข้อความในทุกกรอบ คืน (x_min, y_min) -> (ข้อความ, confidence)
+
+        ส่งทุกกรอบในการเรียกครั้งเดียว แต่ EasyOCR recognize() วนรัน recognizer ทีละกรอบ
+        เวลาจึงโตตามจำนวนกรอบ ที่ประหยัดได้คือไม่ต้องรัน text detection ทั้งรูป
+        """
+        results = get_reader().recognize(gray, horizontal_list=boxes, free_list=[], detail=1)
+        # ผลลัพธ์ถูกเรียงตามตำแหน่ง จึงจับคู่กลับด้วยมุมซ้ายบนของกรอบ
+        return {(int(box[0][0]), int(box[0][1])): (text, confidence) for box, text, confidence in results}
+
+    def identify(self, gray, candidates: List[SlipTemplate]) -> Optional[SlipTemplate]:
+        """อ่านกรอบยืนยันของ template ที่เป็นไปได้ทั้งหมดพร้อมกัน แล้วคืน template แรกที่ keyword ตรง"""
+        height, width = gray.shape[:2]
+        checks = [(t, _box(t.identify_region, width, height)) for t in candidates if t.identify_region]
+        if not checks:
+            return None
+
+        texts = self._recognize(gray, [box for _, box in checks])
+        for template, box in checks:
+            text, _ = texts.get((box[0], box[2]), ("", 0.0))
+            if template.matches(text):
+                return template
+        return None
+
+    def read(self, image, bank_hint: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        อ่านสลิปด้วย template
+
+        Args:
+            image: path, bytes ของไฟล์รูป หรือ numpy array
+            bank_hint (str): ธนาคารที่รู้อยู่แล้ว (เช่นจาก QR) ข้ามขั้นตอนระบุธนาคาร
+
+        Returns:
+            Optional[Dict]: {"template", "text", "parsed"} หรือ None ถ้าไม่มี template ที่ใช้ได้
+            หรืออ่านช่องที่จำเป็นไม่ได้ (ให้ OCR ทั้งรูปแทน)
+        """
+        gray = self._load_gray(image)
+        height, width = gray.shape[:2]
+
+        candidates = [t for t in self.templates if t.fits(width, height)]
+        if bank_hint:
+            candidates = [t for t in candidates if t.bank == bank_hint]
+        if not candidates:
+            return None
+
+        # มีธนาคารจาก QR และเหลือ layout เดียว ไม่ต้องอ่านกรอบยืนยัน
+        template = candidates[0] if bank_hint and len(candidates) == 1 else self.identify(gray, candidates)
+        if template is None:
+            return None
+
+        boxes = {field: _box(region, width, height) for field, region in template.fields.items()}
+        texts = self._recognize(gray, list(boxes.values()))
+        fields = {}
+        for field, box in boxes.items():
+            text, confidence = texts.get((box[0], box[2]), ("", 0.0))
+            if confidence >= self.min_confidence:
+                fields[field] = text.strip()
+
+        parsed_data = slip_parser.parse_fields(fields, template.bank)
+        missing = [field for field in self.required if not parsed_data.get(field)]
+        if missing:
+            logger.info(f"template {template.name}: อ่านช่อง {', '.join(missing)} ไม่ได้ ใช้ OCR ทั้งรูปแทน")
+            return None
+
+        logger.info(f"อ่านสลิปด้วย template {template.name} สำเร็จ ({len(fields)}/{len(boxes)} ช่อง)")
+        return {"template": template.name, "text": parsed_data["raw_text"], "parsed": parsed_data}
+
+
+region_ocr = RegionOCR(load_templates() if OCR_TEMPLATES else [])
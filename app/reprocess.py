@@ -0,0 +1,273 @@
+# app/reprocess.py - อ่านสลิปที่เก็บไว้ใหม่ทั้งหมดแบบขนาน แล้วเขียนผลเป็น JSONL
+"""
+ใช้หลังแก้กฎการแยกข้อมูล/การเตรียมรูป เพื่ออ่านสลิปเก่าใหม่โดยไม่ต้องส่งผ่าน bot
+
+วิธีใช้:
+    python -m app.reprocess static/slips -o slips.jsonl                 # OCR ใหม่ทุกรูปในโฟลเดอร์
+    python -m app.reprocess slips-2025-05.tar.gz -o may.jsonl -w 4      # อ่านจาก tar/zip
+    python -m app.reprocess static/slips -o slips.jsonl --resume        # ทำต่อจากที่ค้างไว้
+    python -m app.reprocess slips.jsonl -o reparsed.jsonl --text-only   # แยกข้อมูลใหม่จากข้อความเดิม
+    python -m app.reprocess static/slips -o out.jsonl --text-only       # ใช้ข้อความจาก OCR cache บนดิสก์
+
+แต่ละบรรทัดของ output: {"source", "key", "text", "parsed", "error"}
+ไฟล์ output เป็น checkpoint ในตัว: --resume จะข้ามรูปที่มีผลอยู่แล้วและเขียนต่อท้าย
+"""
+import os
+import sys
+import json
+import time
+import tarfile
+import zipfile
+import logging
+import argparse
+from collections import deque
+from typing import Dict, Any, Iterator, Optional, Set, Tuple
+
+from .ocr_cache import OCRCache, OCR_CACHE_DIR, image_key
+from .ocr_engine import OCREngine
+from .ocr_utils import parse_payment_slip
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def iter_images(path: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    อ่านรูปจากโฟลเดอร์ (รวมโฟลเดอร์ย่อย) หรือไฟล์ tar/zip ทีละรูป
+
+    Yields:
+        Tuple[str, bytes]: (ชื่อรูป, เนื้อหาไฟล์)
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    file_path = os.path.join(root, name)
+                    with open(file_path, 'rb') as f:
+                        yield os.path.relpath(file_path, path), f.read()
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    yield info.filename, archive.read(info)
+    elif tarfile.is_tarfile(path):
+        # อ่านแบบ stream ตามลำดับใน archive ไม่ต้องแตกไฟล์ลงดิสก์
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield member.name, archive.extractfile(member).read()
+    else:
+        raise ValueError(f"ไม่รู้จักรูปแบบของ {path} (ต้องเป็นโฟลเดอร์, .tar หรือ .zip)")
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """อ่านผลเดิมจากไฟล์ JSONL (ข้ามบรรทัดที่เสีย เช่นบรรทัดสุดท้ายที่เขียนไม่จบ)"""
+    # อ่านเป็น bytes: บรรทัดที่ถูกตัดกลางตัวอักษรไทยจะ decode ไม่ได้ (UnicodeDecodeError เป็น ValueError)
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                yield record
+
+
+def truncate_partial_line(path: str) -> int:
+    """
+    ตัดบรรทัดสุดท้ายที่เขียนไม่จบ (ไม่มี newline ปิดท้าย) ออกจากไฟล์ output ของรอบที่ถูกหยุดกลางคัน
+    ไม่ให้ผลแรกที่เขียนต่อท้ายไปต่อกับบรรทัดที่เสีย
+
+    Returns:
+        int: จำนวน byte ที่ตัดออก
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return 0
+        # ถอยหา newline สุดท้ายทีละช่วง ไม่ต้องอ่านทั้งไฟล์
+        end = size
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                keep = start + newline + 1
+                break
+            end = start
+        else:
+            keep = 0
+        f.truncate(keep)
+        return size - keep
+
+
+def count_inputs(path: str) -> Optional[int]:
+    """นับจำนวนรายการสำหรับแสดงความคืบหน้า (tar ไม่นับ เพราะต้องอ่านทั้งไฟล์)"""
+    if path.endswith('.jsonl'):
+        with open(path, 'rb') as f:
+            return sum(1 for _ in f)
+    if os.path.isdir(path):
+        return sum(1 for _, _, files in os.walk(path) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return sum(1 for name in archive.namelist() if name.lower().endswith(IMAGE_EXTENSIONS))
+    return None
+
+
+def load_checkpoint(output: str) -> Set[str]:
+    """รายชื่อรูปที่มีผลอยู่แล้วในไฟล์ output"""
+    if not os.path.exists(output):
+        return set()
+    return {record["source"] for record in iter_jsonl(output) if "source" in record}
+
+
+def make_record(source: str, key: Optional[str], text: Optional[str], error: Optional[str] = None,
+                parsed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """สร้างผลของรูปหนึ่งรูป (แยกข้อมูลสลิปจากข้อความถ้ายังไม่มี parsed)"""
+    if parsed is None and text and len(text.strip()) >= 3:
+        parsed = parse_payment_slip(text)
+    return {"source": source, "key": key, "text": text, "parsed": parsed, "error": error}
+
+
+class Progress:
+    """แสดงความคืบหน้าทาง stderr (ไม่เกินวินาทีละครั้ง)"""
+
+    def __init__(self, total: Optional[int], skipped: int = 0):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.errors = 0
+        self.start = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, record: Dict[str, Any]):
+        self.done += 1
+        if record.get("error"):
+            self.errors += 1
+        self.report()
+
+    def report(self, force: bool = False):
+        now = time.perf_counter()
+        if not force and now - self._last < 1:
+            return
+        self._last = now
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        line = f"\r{self.done + self.skipped}"
+        if self.total:
+            remaining = self.total - self.done - self.skipped
+            eta = remaining / rate if rate else 0
+            line += f"/{self.total} ({(self.done + self.skipped) / self.total:.0%}) ETA {eta:.0f}s"
+        line += f"  {rate:.1f} รูป/s  error {self.errors}"
+        sys.stderr.write(line)
+        sys.stderr.flush()
+
+
+def run_ocr(inputs: Iterator[Tuple[str, bytes]], engine: OCREngine, max_pending: int) -> Iterator[Dict[str, Any]]:
+    """
+    ส่งรูปเข้า process pool แล้วคืนผลตามลำดับที่ส่ง
+
+    จำกัดจำนวนงานที่ค้างไม่เกิน max_pending รูป ไม่ให้อ่านรูปทั้ง archive เข้า memory
+    ใช้ข้อมูลสลิปที่ OCR cascade แยกไว้แล้ว ไม่แยกข้อความซ้ำ
+    """
+    pending = deque()
+
+    def collect(source, key, future):
+        try:
+            text, parsed = future.result()
+            return make_record(source, key, text, parsed=parsed)
+        except Exception as e:
+            return make_record(source, key, None, str(e))
+
+    for source, data in inputs:
+        key = image_key(data)
+        pending.append((source, key, engine.submit_slip(data)))
+        if len(pending) >= max_pending:
+            yield collect(*pending.popleft())
+    while pending:
+        yield collect(*pending.popleft())
+
+
+def reparse_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """แยกข้อมูลใหม่จากข้อความในไฟล์ JSONL ที่เคยรันไว้ โดยไม่ OCR ซ้ำ"""
+    for record in iter_jsonl(path):
+        yield make_record(record.get("source"), record.get("key"), record.get("text"), record.get("error"))
+
+
+def reparse_cached(inputs: Iterator[Tuple[str, bytes]], cache: OCRCache) -> Iterator[Dict[str, Any]]:
+    """แยกข้อมูลใหม่จากข้อความใน OCR cache บนดิสก์ (ค้นตาม hash ของรูป) โดยไม่ OCR ซ้ำ"""
+    for source, data in inputs:
+        key = image_key(data)
+        cached = cache.get(key)
+        if cached is None:
+            yield make_record(source, key, None, "ไม่มีข้อความใน OCR cache")
+        else:
+            yield make_record(source, key, cached["text"])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="อ่านสลิปที่เก็บไว้ใหม่แบบขนาน แล้วเขียนผลเป็น JSONL")
+    parser.add_argument("input", help="โฟลเดอร์รูป, ไฟล์ .tar/.tar.gz/.zip หรือ .jsonl (กับ --text-only)")
+    parser.add_argument("-o", "--output", required=True, help="ไฟล์ JSONL ของผลลัพธ์")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="จำนวน OCR process (0 = OCR ใน process นี้)")
+    parser.add_argument("--resume", action="store_true", help="ข้ามรูปที่มีผลใน output แล้วเขียนต่อท้าย")
+    parser.add_argument("--text-only", action="store_true", help="ไม่ OCR ใหม่ แยกข้อมูลจากข้อความเดิม")
+    args = parser.parse_args(argv)
+    # log ของ OCR ทีละรูปจะทับแถบความคืบหน้า
+    logging.getLogger().setLevel(logging.WARNING)
+
+    done = set()
+    if args.resume:
+        if truncate_partial_line(args.output):
+            sys.stderr.write("ตัดบรรทัดสุดท้ายที่เขียนไม่จบของรอบก่อนออกแล้ว\n")
+        done = load_checkpoint(args.output)
+    from_jsonl = args.input.endswith('.jsonl')
+    if from_jsonl and not args.text_only:
+        parser.error("input แบบ .jsonl ใช้ได้กับ --text-only เท่านั้น")
+
+    inputs = None if from_jsonl else (
+        (source, data) for source, data in iter_images(args.input) if source not in done
+    )
+
+    engine = None
+    if args.text_only and from_jsonl:
+        records = (record for record in reparse_jsonl(args.input) if record["source"] not in done)
+    elif args.text_only:
+        # ไม่ตัดรายการที่หมดอายุ ใช้ข้อความเก่าเท่าไรก็ได้
+        cache = OCRCache(max_entries=1, ttl=float('inf'), disk_dir=OCR_CACHE_DIR)
+        if not cache.stats()["disk"]:
+            parser.error("--text-only กับรูปภาพต้องตั้งค่า OCR_CACHE_DIR ให้ชี้ไปที่ OCR cache บนดิสก์")
+        records = reparse_cached(inputs, cache)
+    else:
+        engine = OCREngine(processes=args.workers, batch_window_ms=0)
+        engine.start()
+        records = run_ocr(inputs, engine, max_pending=max(args.workers, 1) * 2)
+
+    progress = Progress(count_inputs(args.input), skipped=len(done))
+    try:
+        with open(args.output, 'a' if args.resume else 'w', encoding='utf-8') as out:
+            for record in records:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                # flush ทุกบรรทัด ให้ไฟล์ใช้เป็น checkpoint ได้แม้ถูกหยุดกลางคัน
+                out.flush()
+                progress.update(record)
+    except KeyboardInterrupt:
+        sys.stderr.write("\nหยุดแล้ว ใช้ --resume เพื่อทำต่อ\n")
+        return 130
+    finally:
+        if engine is not None:
+            engine.shutdown()
+
+    progress.report(force=True)
+    sys.stderr.write(f"\nเสร็จแล้ว: {progress.done} รูป (ข้าม {progress.skipped}, error {progress.errors}) -> {args.output}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,39 @@
 # app/router.py
 from fastapi import APIRouter, Request, HTTPException
-from linebot import LineBotApi, WebhookHandler
+from linebot import WebhookParser
 from linebot.exceptions import InvalidSignatureError
-from linebot.models import MessageEvent, TextMessage, ImageMessage, TextSendMessage
+from linebot.models import MessageEvent, TextMessage, ImageMessage
 import os
 from dotenv import load_dotenv
-import requests
-from PIL import Image
-import io
-import tempfile
+import time
+import logging
+import random
+from datetime import datetime
+import asyncio
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from .line_utils import LineBot, generate_help_message
+from .line_client import get_line_client
+from .webhook_events import WebhookEvent, parse_events
 
 # เปลี่ยนจาก SlipReader เป็น functions
-from .ocr_utils import extract_text_from_image, parse_payment_slip, format_slip_summary
+from .ocr_utils import (
+    extract_text_from_image, parse_payment_slip, format_slip_summary,
+    read_slip_qr, merge_qr_data, qr_only_slip, is_slip_qr
+)
+from .ocr_engine import ocr_engine
+from .ocr_cache import ocr_cache, image_key
+from .slip_ledger import get_slip_ledger, close_slip_ledger
+from .slip_store import get_slip_store, close_slip_store
+from .admission import admission, Rejected
+from .profiling import profiler, current_capture
+from . import metrics
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # ตั้งค่า LINE Bot
 LINE_CHANNEL_ACCESS_TOKEN = os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
 LINE_CHANNEL_SECRET = os.getenv('LINE_CHANNEL_SECRET')
@@ -23,11 +41,187 @@ LINE_CHANNEL_SECRET = os.getenv('LINE_CHANNEL_SECRET')
 if not LINE_CHANNEL_ACCESS_TOKEN or not LINE_CHANNEL_SECRET:
     raise ValueError("กรุณาตั้งค่า LINE_CHANNEL_ACCESS_TOKEN และ LINE_CHANNEL_SECRET ใน .env file")
 
-line_bot_api = LineBotApi(LINE_CHANNEL_ACCESS_TOKEN)
-handler = WebhookHandler(LINE_CHANNEL_SECRET)
+# โหมดประมวลผล webhook
+# "async" = ตรวจ signature แล้วตอบ 200 ทันที ประมวลผล event เบื้องหลัง
+# "sync"  = รอให้ประมวลผลเสร็จก่อนตอบ (งาน OCR ยังรันใน worker pool ไม่บล็อก event loop)
+WEBHOOK_MODE = os.getenv('WEBHOOK_MODE', 'async').lower()
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 4))
+
+# อ่าน QR ของสลิปก่อน OCR
+QR_FAST_PATH = os.getenv('QR_FAST_PATH', '1') == '1'
+# ข้าม OCR เมื่อ QR ตรวจสอบสลิปให้ข้อมูลเหล่านี้ครบ (ว่าง = OCR ทุกรูปแล้วรวมข้อมูลจาก QR เข้าไป)
+# QR ตรวจสอบสลิปมีแค่ธนาคารกับเลขอ้างอิง ไม่มีจำนวนเงิน ผู้โอน หรือเวลา
+# ตั้งเป็น "reference" ถ้ายอมตอบแค่ธนาคารกับเลขอ้างอิงเพื่อให้เร็วขึ้น
+QR_SKIP_OCR_FIELDS = [f.strip() for f in os.getenv('QR_SKIP_OCR_FIELDS', '').split(',') if f.strip()]
+
+# บันทึกรูปสลิปลงที่เก็บรูป (slip_store.py) หลังตอบกลับ (ปิดไว้เป็นค่าเริ่มต้น)
+SAVE_SLIP_IMAGES = os.getenv('SAVE_SLIP_IMAGES', '0') == '1'
+
+# reply token ของ LINE ใช้ได้ประมาณ 1 นาที ถ้า event เก่ากว่านี้ให้ส่งแบบ push แทน
+REPLY_TOKEN_MAX_AGE = float(os.getenv('REPLY_TOKEN_MAX_AGE', 50))
+
+# โหลด model และ warm-up ตอน startup (ปิดได้ตอนพัฒนาด้วย uvicorn --reload)
+OCR_WARMUP_ON_STARTUP = os.getenv('OCR_WARMUP_ON_STARTUP', '1') == '1'
+
+# แปลง webhook body เป็น event แบบเบา (webhook_events.py) แทน model ของ line-bot-sdk
+WEBHOOK_FAST_DECODE = os.getenv('WEBHOOK_FAST_DECODE', '1') == '1'
+
+parser = WebhookParser(LINE_CHANNEL_SECRET)
+line_bot = LineBot() if WEBHOOK_FAST_DECODE else None
+line_client = get_line_client()
+
+# worker pool สำหรับงานที่บล็อกของแต่ละ event (OCR, แยกข้อมูลสลิป)
+# การดาวน์โหลดรูปและตอบกลับเป็น async บน event loop
+webhook_executor = ThreadPoolExecutor(max_workers=WEBHOOK_WORKERS, thread_name_prefix='webhook')
+
+# งานรูปที่เกินกำลัง: รอแล้วลองรับใหม่กี่วินาที (0 = ตอบว่าระบบไม่ว่างทันที) และลองกี่ครั้ง
+ADMISSION_DEFER_SECONDS = float(os.getenv('ADMISSION_DEFER_SECONDS', 0))
+ADMISSION_DEFER_ATTEMPTS = int(os.getenv('ADMISSION_DEFER_ATTEMPTS', 3))
+
+BUSY_REPLY = "⏳ ขณะนี้มีผู้ส่งสลิปเข้ามาจำนวนมาก กรุณาส่งรูปใหม่อีกครั้งในอีกสักครู่ครับ"
+USER_RATE_REPLY = "⏳ คุณส่งรูปถี่เกินไป กรุณารอสักครู่แล้วส่งใหม่อีกครั้งครับ"
+DEFERRED_REPLY = "⏳ ได้รับรูปแล้ว ขณะนี้ระบบมีงานจำนวนมาก จะส่งผลการอ่านสลิปให้ภายหลังครับ"
+
+# จำนวน event ที่ประมวลผลพร้อมกันได้สูงสุด (ทุก webhook รวมกัน)
+WEBHOOK_EVENT_CONCURRENCY = int(os.getenv('WEBHOOK_EVENT_CONCURRENCY', 8))
+_event_slots = asyncio.Semaphore(WEBHOOK_EVENT_CONCURRENCY)
+# key ของผู้ใช้ -> [lock, จำนวน event ที่ใช้ lock อยู่/รออยู่]
+_source_locks = {}
+
+# เก็บ reference ของ task เบื้องหลังไว้ ไม่ให้ถูก garbage collect ก่อนทำเสร็จ
+_background_tasks = set()
 
 router = APIRouter()
 
+@router.on_event("startup")
+def start_ocr_engine():
+    """โหลด model และ warm-up OCR engine เบื้องหลัง ไม่ให้บล็อกการเริ่ม server"""
+    if OCR_WARMUP_ON_STARTUP:
+        threading.Thread(target=ocr_engine.warm_up, name='ocr-warmup', daemon=True).start()
+
+@router.on_event("shutdown")
+async def stop_workers():
+    webhook_executor.shutdown(wait=False)
+    ocr_engine.shutdown()
+    close_slip_ledger()
+    close_slip_store()
+    await line_client.aclose()
+
+def _source_key(event) -> str:
+    """key สำหรับเรียงลำดับ event: ผู้ใช้ (หรือกลุ่ม/ห้อง ถ้าไม่มี user id)"""
+    source = event.source
+    return (getattr(source, 'user_id', None) or getattr(source, 'group_id', None)
+            or getattr(source, 'room_id', None) or '')
+
+@contextlib.asynccontextmanager
+async def _source_turn(key: str):
+    """
+    รอจนถึงคิวของ event นี้ในบรรดา event ของผู้ใช้เดียวกัน (key)
+    
+    lock ของผู้ใช้ถูกลบออกจาก _source_locks ทันทีที่ไม่มี event ของผู้ใช้นั้นรันหรือรออยู่
+    (รวมถึงตอน handler error หรือถูก cancel) map จึงมีแค่ผู้ใช้ที่กำลังมีงานค้าง
+    """
+    entry = _source_locks.get(key)
+    if entry is None:
+        entry = _source_locks[key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _source_locks[key]
+
+async def _handle_event(event, event_handler, admitted: bool = False):
+    """
+    รัน handler ของ event หนึ่งตัว ตามลำดับของผู้ใช้คนเดียวกัน และไม่เกิน WEBHOOK_EVENT_CONCURRENCY งานพร้อมกัน
+    
+    งานรูปที่ผ่าน admission แล้ว (admitted) ไม่ใช้ช่องของ WEBHOOK_EVENT_CONCURRENCY เพราะ admission คุมจำนวนไว้แล้ว
+    """
+    try:
+        # รอคิวของผู้ใช้ก่อน แล้วค่อยจองช่อง ไม่ให้ event ที่รอคิวกินช่องของผู้ใช้อื่น
+        async with _source_turn(_source_key(event)):
+            if admitted:
+                await event_handler(event)
+            else:
+                async with _event_slots:
+                    await event_handler(event)
+    except Exception as e:
+        logger.error(f"Webhook worker error: {str(e)}")
+    finally:
+        if admitted:
+            admission.done()
+
+async def _shed_image(event, reason: str):
+    """ปฏิเสธรูปที่เกินกำลัง: ตอบว่าระบบไม่ว่างทันที หรือรับไว้แล้วลองใหม่ภายหลัง (ADMISSION_DEFER_SECONDS)"""
+    metrics.SHED[reason].inc()
+    try:
+        if ADMISSION_DEFER_SECONDS > 0 and reason != "user_rate":
+            await send_reply(event, DEFERRED_REPLY)
+            # reply token ใช้ได้ครั้งเดียว ผลที่ได้ภายหลังต้องส่งแบบ push
+            event.reply_token = None
+            task = asyncio.create_task(_retry_deferred(event))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        else:
+            await send_reply(event, USER_RATE_REPLY if reason == "user_rate" else BUSY_REPLY)
+    except Exception as e:
+        logger.error(f"Error sending busy reply: {str(e)}")
+
+async def _retry_deferred(event):
+    """ลองรับรูปที่ถูกเลื่อนไว้อีกครั้ง ผลลัพธ์จะถูกส่งแบบ push (reply token ถูกใช้ตอบ DEFERRED_REPLY ไปแล้ว)"""
+    for _ in range(ADMISSION_DEFER_ATTEMPTS):
+        # สุ่มเวลารอ ไม่ให้งานที่ถูกเลื่อนพร้อมกันกลับมาแย่งคิวพร้อมกัน
+        await asyncio.sleep(ADMISSION_DEFER_SECONDS * (0.5 + random.random()))
+        try:
+            admission.admit(None)
+        except Rejected as e:
+            metrics.SHED[e.reason].inc()
+            continue
+        await _handle_event(event, handle_image_message, admitted=True)
+        return
+    try:
+        await send_reply(event, BUSY_REPLY)
+    except Exception as e:
+        logger.error(f"Error sending busy reply: {str(e)}")
+
+async def _handle_events(events):
+    """
+    ส่ง event แต่ละตัวไปยัง handler ตามชนิดของข้อความ
+    
+    event ของผู้ใช้ต่างกันรันพร้อมกัน ส่วน event ของผู้ใช้คนเดียวกันรันตามลำดับที่ได้รับ
+    (รวมถึงข้าม webhook หลายครั้ง) เวลารวมจึงเท่ากับ event ที่ช้าที่สุด ไม่ใช่ผลรวม
+    """
+    jobs = []
+    for event in events:
+        if isinstance(event, WebhookEvent):
+            if event.message is None:
+                continue
+            event_handler = FAST_MESSAGE_HANDLERS.get(event.message.type)
+        elif isinstance(event, MessageEvent):
+            event_handler = MESSAGE_HANDLERS.get(type(event.message))
+        else:
+            continue
+        if event_handler is None:
+            continue
+        if event_handler is handle_image_message:
+            # ตรวจก่อนเข้าคิวของผู้ใช้และก่อนดาวน์โหลด งานที่เกินกำลังจะได้คำตอบทันที
+            try:
+                admission.admit(event.source.user_id)
+            except Rejected as e:
+                jobs.append(_shed_image(event, e.reason))
+                continue
+            jobs.append(_handle_event(event, event_handler, admitted=True))
+            continue
+        jobs.append(_handle_event(event, event_handler))
+    
+    if len(jobs) == 1:
+        await jobs[0]
+    elif jobs:
+        # gather สร้าง task ตามลำดับ event จึงได้ lock ของผู้ใช้ตามลำดับเดิม
+        await asyncio.gather(*jobs)
+
 @router.post("/webhook")
 async def webhook(request: Request):
     """รับ webhook จาก LINE"""
@@ -35,18 +229,43 @@ async def webhook(request: Request):
         signature = request.headers['X-Line-Signature']
         body = await request.body()
         
-        handler.handle(body.decode('utf-8'), signature)
+        # ตรวจ signature และแปลง event ก่อนรับงาน เพื่อให้ตอบ 400 ได้ทันที
+        if WEBHOOK_FAST_DECODE:
+            if not line_bot.verify_signature(body, signature):
+                raise InvalidSignatureError("Invalid signature")
+            events = parse_events(body)
+        else:
+            events = parser.parse(body.decode('utf-8'), signature)
+        
+        task = asyncio.create_task(_handle_events(events))
+        if WEBHOOK_MODE == 'sync':
+            await task
+        else:
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
         return {"status": "success"}
         
     except InvalidSignatureError:
         raise HTTPException(status_code=400, detail="Invalid signature")
     except Exception as e:
-        print(f"Webhook error: {str(e)}")
+        logger.error(f"Webhook error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@handler.add(MessageEvent, message=TextMessage)
+async def send_reply(event, text: str):
+    """
+    ตอบกลับ event ด้วย reply token หรือ push ถ้า token น่าจะหมดอายุแล้ว
+    หรือถูกใช้ไปแล้ว (reply_token เป็น None เช่น event ที่ถูกเลื่อนไว้)
+    """
+    age = time.time() - event.timestamp / 1000
+    source = event.source
+    to = getattr(source, 'group_id', None) or getattr(source, 'room_id', None) or getattr(source, 'user_id', None)
+    
+    if (not event.reply_token or age > REPLY_TOKEN_MAX_AGE) and to:
+        await line_client.push_text(to, text)
+    else:
+        await line_client.reply_text(event.reply_token, text, fallback_to=to)
 
-def handle_text_message(event):
+async def handle_text_message(event):
     """จัดการข้อความ"""
     try:
         user_message = event.message.text.lower()
@@ -94,36 +313,77 @@ def handle_text_message(event):
 
 📷 ลองส่งรูปมาดูครับ!"""
         
-        line_bot_api.reply_message(
-            event.reply_token,
-            TextSendMessage(text=reply_text)
-        )
+        await send_reply(event, reply_text)
         
     except Exception as e:
-        print(f"Error handling text message: {str(e)}")
-        line_bot_api.reply_message(
-            event.reply_token,
-            TextSendMessage(text="เกิดข้อผิดพลาด กรุณาลองใหม่อีกครั้ง")
-        )
-
-@handler.add(MessageEvent, message=ImageMessage)
-def handle_image_message(event):
-    """จัดการรูปภาพ"""
-    try:
-        # ดาวน์โหลดรูปภาพจาก LINE
-        message_content = line_bot_api.get_message_content(event.message.id)
-        
-        # สร้างไฟล์ชั่วคราว
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            for chunk in message_content.iter_content():
-                temp_file.write(chunk)
-            temp_file_path = temp_file.name
+        logger.error(f"Error handling text message: {str(e)}")
+        await send_reply(event, "เกิดข้อผิดพลาด กรุณาลองใหม่อีกครั้ง")
+
+DUPLICATE_MATCH_TEXT = {
+    "image": "รูปเดียวกัน",
+    "reference": "เลขอ้างอิงเดียวกัน",
+    "amount_datetime": "จำนวนเงิน วันที่ และเวลาเดียวกัน"
+}
+
+def _duplicate_warning(duplicate: dict) -> str:
+    """ข้อความเตือนเมื่อสลิปตรงกับสลิปที่เคยส่งมาแล้ว"""
+    sent_at = datetime.fromtimestamp(duplicate["created"]).strftime('%d/%m/%Y %H:%M')
+    return (f"⚠️ **สลิปนี้เคยถูกส่งมาแล้ว** ({DUPLICATE_MATCH_TEXT[duplicate['match']]}, "
+            f"ส่งเมื่อ {sent_at})\nกรุณาตรวจสอบก่อนยืนยันการชำระเงิน\n\n")
+
+def process_slip_image(image_data: bytes, queued_at: float = None, user_id: str = None,
+                       message_id: str = None) -> str:
+    """OCR และแยกข้อมูลสลิปจากรูป แล้วสร้างข้อความตอบกลับ (งานที่บล็อก รันใน worker pool)"""
+    if queued_at is not None:
+        metrics.STAGE["queue_wait"].observe(time.perf_counter() - queued_at)
+    
+    with metrics.INFLIGHT_JOBS.track_inprogress():
+        cache_key = image_key(image_data)
         
-        # อ่านข้อความจากรูป
+        # อ่านข้อความจากรูป (ใช้ผลเดิมถ้าเคยอ่านรูปนี้แล้ว)
         try:
-            extracted_text = extract_text_from_image(temp_file_path)
+            cached = ocr_cache.get(cache_key)
+            if cached:
+                extracted_text, parsed_data = cached["text"], cached["parsed"]
+            else:
+                # อ่าน QR ก่อน (ใช้เวลาไม่กี่ ms) แล้วรวมกับผล OCR - ข้าม OCR เฉพาะเมื่อตั้ง QR_SKIP_OCR_FIELDS
+                # QR แบบอื่น (เช่น PromptPay ที่ร้านให้สแกนจ่าย) ไม่ใช่หลักฐานการโอน
+                qr_data = None
+                if QR_FAST_PATH:
+                    with metrics.STAGE["qr"].time():
+                        qr_data = read_slip_qr(image_data)
+                    if qr_data and not is_slip_qr(qr_data):
+                        qr_data = None
+                if qr_data and QR_SKIP_OCR_FIELDS and all(qr_data.get(field) for field in QR_SKIP_OCR_FIELDS):
+                    extracted_text = ""
+                    parsed_data = qr_only_slip(qr_data)
+                else:
+                    # สลิปของธนาคารที่มี template: อ่านเฉพาะช่องข้อมูล ไม่ต้อง OCR ทั้งรูป
+                    with metrics.STAGE["region_ocr"].time():
+                        region_result = ocr_engine.read_regions(image_data, qr_data and qr_data.get("bank"))
+                    if region_result:
+                        extracted_text = region_result["text"]
+                        parsed_data = merge_qr_data(region_result["parsed"], qr_data)
+                    else:
+                        # OCR cascade แยกข้อมูลไว้แล้วตอนตรวจผลของแต่ละ tier (ยกเว้นโหมด micro-batching)
+                        with metrics.STAGE["ocr"].time():
+                            extracted_text, parsed_data = ocr_engine.read_slip(image_data)
+                        if parsed_data is None and extracted_text and len(extracted_text.strip()) >= 3:
+                            with metrics.STAGE["parse"].time():
+                                parsed_data = parse_payment_slip(extracted_text)
+                        if parsed_data is not None:
+                            parsed_data = merge_qr_data(parsed_data, qr_data)
+                        elif qr_data:
+                            parsed_data = qr_only_slip(qr_data)
+                ocr_cache.set(cache_key, extracted_text, parsed_data)
             
-            if not extracted_text or len(extracted_text.strip()) < 3:
+            format_start = time.perf_counter()
+            if parsed_data and parsed_data.get("qr") and not parsed_data.get("raw_text"):
+                # ได้ข้อมูลจาก QR อย่างเดียว
+                outcome = "qr_only"
+                reply_text = format_slip_summary(parsed_data)
+            elif not extracted_text or len(extracted_text.strip()) < 3:
+                outcome = "empty"
                 reply_text = """😅 **ไม่สามารถอ่านข้อความได้**
 
 🔍 **เคล็ดลับ:**
@@ -134,20 +394,19 @@ def handle_image_message(event):
 
 📷 ลองส่งรูปใหม่ดูครับ!"""
             else:
-                # แยกข้อมูลสลิป
-                parsed_data = parse_payment_slip(extracted_text)
-                
                 # ตรวจสอบว่าเป็นสลิปเงินหรือไม่
-                if parsed_data["amount"] or any([
+                if parsed_data.get("amount") or any([
                     "จำนวนเงิน" in extracted_text,
                     "บาท" in extracted_text,
                     "THB" in extracted_text,
                     "Amount" in extracted_text
                 ]):
                     # เป็นสลิปเงิน
+                    outcome = "slip"
                     reply_text = format_slip_summary(parsed_data)
                 else:
                     # เป็นข้อความทั่วไป
+                    outcome = "text"
                     reply_text = f"""📄 **ข้อความที่อ่านได้:**
 
 ```
@@ -156,23 +415,78 @@ def handle_image_message(event):
 
 📝 **จำนวนตัวอักษร:** {len(extracted_text)} ตัว
 🔤 **จำนวนบรรทัด:** {len(extracted_text.split())} บรรทัด"""
+            metrics.STAGE["format"].observe(time.perf_counter() - format_start)
+            
+            # ตรวจกับประวัติสลิปก่อนตอบ แล้วบันทึกลง ledger (เขียนลงดิสก์เบื้องหลัง)
+            slip_ledger = get_slip_ledger() if outcome in ("slip", "qr_only") else None
+            if slip_ledger is not None:
+                with metrics.STAGE["ledger"].time():
+                    duplicates = slip_ledger.check_and_record(parsed_data, user_id, message_id, cache_key)
+                if duplicates:
+                    metrics.DUPLICATE_SLIPS.inc()
+                    reply_text = _duplicate_warning(duplicates[0]) + reply_text
             
         except Exception as ocr_error:
-            print(f"OCR Error: {str(ocr_error)}")
+            logger.error(f"OCR Error: {str(ocr_error)}")
+            outcome = "ocr_error"
             reply_text = f"❌ เกิดข้อผิดพลาดในการอ่านรูป: {str(ocr_error)}"
         
-        # ลบไฟล์ชั่วคราว
-        os.unlink(temp_file_path)
+        metrics.OUTCOME[outcome].inc()
+        return reply_text
+
+async def handle_image_message(event):
+    """จัดการรูปภาพ"""
+    start = time.perf_counter()
+    # เก็บ profile ถ้า request นี้ถูกเลือก (ปิดไว้เป็นค่าเริ่มต้น ดู profiling.py)
+    capture = profiler.select(event.source.user_id, event.message.id)
+    capture_token = current_capture.set(capture) if capture is not None else None
+    try:
+        # ดาวน์โหลดรูปภาพจาก LINE เข้า memory ทั้งหมด ไม่เขียนไฟล์ชั่วคราว
+        with metrics.STAGE["download"].time():
+            image_data = await line_client.get_message_content(event.message.id)
         
-        line_bot_api.reply_message(
-            event.reply_token,
-            TextSendMessage(text=reply_text)
-        )
+        # รูปที่อยู่ในคิวอยู่แล้วหรือเคยอ่านแล้ว (ผู้ใช้ส่งซ้ำ) ได้คิวหลังรูปใหม่
+        cache_key = image_key(image_data)
+        priority = admission.priority(cache_key, seen=cache_key in ocr_cache)
+        
+        loop = asyncio.get_running_loop()
+        queued_at = time.perf_counter()
+        async with admission.slot(priority, cache_key):
+            reply_text = await loop.run_in_executor(
+                webhook_executor, process_slip_image if capture is None else capture.bind(process_slip_image),
+                image_data, queued_at, event.source.user_id, event.message.id
+            )
+        
+        with metrics.STAGE["reply"].time():
+            await send_reply(event, reply_text)
+        metrics.STAGE["total"].observe(time.perf_counter() - start)
+        
+        # บันทึกรูปหลังตอบกลับแล้ว (ถ้าเปิดไว้) เขียนลงดิสก์ใน thread ของ slip_store
+        slip_store = get_slip_store() if SAVE_SLIP_IMAGES else None
+        if slip_store is not None:
+            slip_store.save(image_data, event.source.user_id, event.message.id)
         
     except Exception as e:
-        print(f"Error handling image: {str(e)}")
-        line_bot_api.reply_message(
-            event.reply_token,
-            TextSendMessage(text="เกิดข้อผิดพลาดในการประมวลผลรูปภาพ กรุณาลองใหม่อีกครั้ง")
-        )
+        logger.error(f"Error handling image: {str(e)}")
+        metrics.OUTCOME["error"].inc()
+        if capture is not None:
+            capture.error = str(e)
+        await send_reply(event, "เกิดข้อผิดพลาดในการประมวลผลรูปภาพ กรุณาลองใหม่อีกครั้ง")
+    finally:
+        if capture is not None:
+            current_capture.reset(capture_token)
+            profiler.finish(capture)
+
+# ชนิดข้อความ -> handler
+MESSAGE_HANDLERS = {
+    TextMessage: handle_text_message,
+    ImageMessage: handle_image_message,
+}
+
+# ชนิดข้อความใน JSON -> handler (สำหรับ event จาก parse_events)
+FAST_MESSAGE_HANDLERS = {
+    'text': handle_text_message,
+    'image': handle_image_message,
+}
+
 webhook_router = router
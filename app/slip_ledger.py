@@ -0,0 +1,273 @@
+# app/slip_ledger.py - บันทึกประวัติสลิปลง SQLite และตรวจสลิปที่ถูกใช้ซ้ำ
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ไฟล์ฐานข้อมูลของ ledger (ว่าง = ปิด เช่น SLIP_LEDGER_PATH=data/slip_ledger.db เพื่อเปิด)
+SLIP_LEDGER_PATH = os.getenv('SLIP_LEDGER_PATH', '')
+# จำนวนรายการสูงสุดต่อ transaction
+SLIP_LEDGER_BATCH_SIZE = int(os.getenv('SLIP_LEDGER_BATCH_SIZE', 500))
+# รอรวมรายการก่อนเขียนไม่เกินนี้ (ms)
+SLIP_LEDGER_FLUSH_MS = float(os.getenv('SLIP_LEDGER_FLUSH_MS', 200))
+
+_COLUMNS = ("reference", "amount", "date", "time", "bank", "sender", "recipient",
+            "user_id", "message_id", "image_key", "created")
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS slips ("
+    "id INTEGER PRIMARY KEY, reference TEXT, amount TEXT, date TEXT, time TEXT, bank TEXT, "
+    "sender TEXT, recipient TEXT, user_id TEXT, message_id TEXT, image_key TEXT, created REAL)",
+    "CREATE INDEX IF NOT EXISTS idx_slips_reference ON slips (reference)",
+    "CREATE INDEX IF NOT EXISTS idx_slips_amount_datetime ON slips (amount, date, time, bank, created)",
+    "CREATE INDEX IF NOT EXISTS idx_slips_bank ON slips (bank)",
+    "CREATE INDEX IF NOT EXISTS idx_slips_user ON slips (user_id, created)",
+    "CREATE INDEX IF NOT EXISTS idx_slips_image ON slips (image_key)",
+]
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    # WAL: อ่านได้พร้อมกับที่ writer เขียน / NORMAL: ไม่ fsync ทุก commit
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class SlipLedger:
+    """
+    ประวัติสลิปทั้งหมดใน SQLite (WAL) พร้อม index สำหรับตรวจสลิปซ้ำ
+
+    - record() แค่ใส่คิว thread เบื้องหลังรวมหลายรายการเขียนใน transaction เดียว
+    - find_duplicates() ค้นผ่าน index (O(log n)) และรวมรายการที่ยังอยู่ในคิวด้วย
+    - check_and_record() ตรวจและบันทึกใน lock เดียวกัน สลิปเดียวกันที่ส่งมาพร้อมกันจึงถูกจับได้เสมอ
+    - แต่ละ thread ที่อ่านมี connection ของตัวเอง
+
+    Args:
+        path (str): ไฟล์ฐานข้อมูล
+        batch_size (int): จำนวนรายการสูงสุดต่อ transaction
+        flush_ms (float): เวลารอรวมรายการก่อนเขียน (ms)
+    """
+
+    def __init__(self, path: str = SLIP_LEDGER_PATH, batch_size: int = SLIP_LEDGER_BATCH_SIZE,
+                 flush_ms: float = SLIP_LEDGER_FLUSH_MS):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_ms / 1000
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._pending: List[Dict[str, Any]] = []
+        # RLock: check_and_record ถือ lock ไว้ระหว่างเรียก find_duplicates และ record
+        self._pending_lock = threading.RLock()
+        self._local = threading.local()
+        self._writer: Optional[threading.Thread] = None
+        self._stats = {"written": 0, "duplicates": 0, "errors": 0}
+
+        if not path:
+            return
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = _connect(path)
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            conn.close()
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"ไม่สามารถเปิด slip ledger: {str(e)}")
+            self.path = ''
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def record(self, parsed_data: Dict[str, Any], user_id: Optional[str] = None,
+               message_id: Optional[str] = None, image_key: Optional[str] = None):
+        """บันทึกสลิปลง ledger (ไม่รอเขียนลงดิสก์)"""
+        if not self.enabled:
+            return
+
+        row = {column: parsed_data.get(column) for column in _COLUMNS[:7]}
+        row.update(user_id=user_id, message_id=message_id, image_key=image_key, created=time.time())
+        with self._pending_lock:
+            # ใส่คิวภายใต้ lock ให้ลำดับในคิวตรงกับ _pending
+            self._pending.append(row)
+            self._queue.put(tuple(row[column] for column in _COLUMNS))
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='slip-ledger', daemon=True)
+                self._writer.start()
+
+    def find_duplicates(self, parsed_data: Dict[str, Any], image_key: Optional[str] = None,
+                        message_id: Optional[str] = None, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        หาสลิปในประวัติที่น่าจะเป็นใบเดียวกัน
+
+        ถือว่าซ้ำเมื่อรูปเหมือนกันทุก byte, เลขอ้างอิงตรงกัน หรือจำนวนเงิน+วันที่+เวลา+ธนาคารตรงกันทั้งหมด
+        ไม่นับรายการของ message เดียวกัน (LINE ส่ง webhook ซ้ำได้)
+
+        Returns:
+            List[Dict]: รายการที่ซ้ำ (ใหม่สุดก่อน) พร้อม "match" = image, reference หรือ amount_datetime
+        """
+        if not self.enabled:
+            return []
+
+        checks = []
+        if image_key:
+            checks.append(("image", {"image_key": image_key}))
+        if parsed_data.get("reference"):
+            checks.append(("reference", {"reference": parsed_data["reference"]}))
+        slip_time = {k: parsed_data.get(k) for k in ("amount", "date", "time", "bank")}
+        if all(slip_time.values()):
+            checks.append(("amount_datetime", slip_time))
+        if not checks:
+            return []
+
+        def other_message(row) -> bool:
+            return message_id is None or row["message_id"] != message_id
+
+        # key เดียวกันทั้งรายการในคิวและในฐานข้อมูล (รายการอาจถูกเขียนระหว่างค้น)
+        def row_key(row) -> tuple:
+            return row["message_id"], row["image_key"], row["created"]
+
+        found: Dict[tuple, Dict[str, Any]] = {}
+        with self._pending_lock:
+            pending = list(self._pending)
+        for match, values in checks:
+            for row in pending:
+                if other_message(row) and all(row[k] == v for k, v in values.items()):
+                    found.setdefault(row_key(row), dict(row, match=match))
+
+        try:
+            conn = self._reader()
+            for match, values in checks:
+                where = " AND ".join(f"{k} = ?" for k in values)
+                rows = conn.execute(
+                    f"SELECT * FROM slips WHERE {where} ORDER BY created DESC LIMIT ?", (*values.values(), limit)
+                ).fetchall()
+                for row in rows:
+                    if other_message(row):
+                        found.setdefault(row_key(row), dict(row, match=match))
+        except sqlite3.Error as e:
+            logger.error(f"Slip ledger lookup error: {str(e)}")
+
+        duplicates = sorted(found.values(), key=lambda row: row["created"], reverse=True)[:limit]
+        if duplicates:
+            self._stats["duplicates"] += 1
+        return duplicates
+
+    def check_and_record(self, parsed_data: Dict[str, Any], user_id: Optional[str] = None,
+                         message_id: Optional[str] = None, image_key: Optional[str] = None,
+                         limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        หาสลิปที่ซ้ำแล้วบันทึกสลิปนี้ลง ledger ในขั้นตอนเดียว
+
+        ถือ _pending_lock ตลอดทั้งการค้นและการใส่คิว ถ้าสลิปเดียวกันถูกส่งมาพร้อมกันหลาย request
+        (WEBHOOK_WORKERS > 1 หรือผู้ใช้หลายคน) request หลังจะเห็นรายการของ request แรกในคิวเสมอ
+
+        Returns:
+            List[Dict]: เหมือน find_duplicates()
+        """
+        if not self.enabled:
+            return []
+        with self._pending_lock:
+            duplicates = self.find_duplicates(parsed_data, image_key, message_id, limit)
+            self.record(parsed_data, user_id, message_id, image_key)
+        return duplicates
+
+    def history(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """สลิปล่าสุดของผู้ใช้ (ใหม่สุดก่อน)"""
+        if not self.enabled:
+            return []
+        rows = self._reader().execute(
+            "SELECT * FROM slips WHERE user_id = ? ORDER BY created DESC LIMIT ?", (user_id, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _write_loop(self):
+        conn = _connect(self.path)
+        insert = f"INSERT INTO slips ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+        stopped = False
+        while not stopped:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopped = True
+                    break
+                batch.append(item)
+
+            try:
+                with conn:
+                    conn.executemany(insert, batch)
+                self._stats["written"] += len(batch)
+            except sqlite3.Error as e:
+                self._stats["errors"] += len(batch)
+                logger.error(f"Slip ledger write error ({len(batch)} รายการ): {str(e)}")
+            with self._pending_lock:
+                del self._pending[:len(batch)]
+        conn.close()
+
+    def close(self):
+        """เขียนรายการที่ค้างในคิวให้หมดแล้วหยุด writer"""
+        with self._pending_lock:
+            writer = self._writer
+            self._writer = None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._pending_lock:
+            pending = len(self._pending)
+        return dict(self._stats, pending=pending, enabled=self.enabled)
+
+
+# ledger ที่ใช้ร่วมกันทั้ง process - สร้างเมื่อเรียก get_slip_ledger() ครั้งแรก
+# เพื่อไม่ให้สร้างไฟล์ฐานข้อมูลตอน import module
+_slip_ledger: Optional[SlipLedger] = None
+_slip_ledger_lock = threading.Lock()
+
+
+def get_slip_ledger() -> Optional[SlipLedger]:
+    """คืน ledger ที่ใช้ร่วมกันทั้ง process หรือ None ถ้าไม่ได้ตั้ง SLIP_LEDGER_PATH (thread-safe)"""
+    global _slip_ledger
+    if not SLIP_LEDGER_PATH:
+        return None
+    if _slip_ledger is None:
+        with _slip_ledger_lock:
+            if _slip_ledger is None:
+                _slip_ledger = SlipLedger(SLIP_LEDGER_PATH)
+    return _slip_ledger if _slip_ledger.enabled else None
+
+
+def close_slip_ledger():
+    """เขียนรายการที่ค้างแล้วหยุด writer (ถ้าเคยสร้าง ledger)"""
+    if _slip_ledger is not None:
+        _slip_ledger.close()
+
+
+def slip_ledger_stats() -> Dict[str, Any]:
+    """สถิติของ ledger โดยไม่สร้าง ledger ขึ้นมาใหม่"""
+    if _slip_ledger is None:
+        return {"enabled": False}
+    return _slip_ledger.stats()
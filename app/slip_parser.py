@@ -0,0 +1,516 @@
+# app/slip_parser.py - แยกข้อมูลสลิปด้วย pattern ที่ compile ไว้ล่วงหน้า
+"""
+pattern ทุกตัวเขียนให้ใช้เวลาแบบเส้นตรงตามความยาวบรรทัด ไม่ backtrack ซ้อนกันบนข้อความ OCR ยาวๆ
+(quantifier ที่อยู่ติดกันต้องกินตัวอักษรคนละชุด และ template ที่หาสองจุดห่างกันใช้ SequencePattern)
+
+จำกัดขนาดข้อความ (SLIP_PARSE_MAX_CHARS, SLIP_PARSE_MAX_LINE) และเวลาต่อสลิป (SLIP_PARSE_BUDGET_MS)
+ถ้าเกินเวลาจะคืนข้อมูลเท่าที่แยกได้พร้อม partial = True
+ทดสอบกับข้อความที่จงใจให้ช้าด้วย python -m bench.parse_fuzz
+"""
+import os
+import re
+import time
+import logging
+from typing import Dict, Any, List, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+# ความยาวข้อความสูงสุดที่ parse (ส่วนที่เกินถูกตัดทิ้ง, 0 = ไม่จำกัด)
+SLIP_PARSE_MAX_CHARS = int(os.getenv('SLIP_PARSE_MAX_CHARS', 4000))
+# ความยาวสูงสุดของแต่ละบรรทัด (0 = ไม่จำกัด)
+SLIP_PARSE_MAX_LINE = int(os.getenv('SLIP_PARSE_MAX_LINE', 200))
+# เวลาสูงสุดต่อสลิป (ms) เกินแล้วคืนผลเท่าที่ได้ (0 = ไม่จำกัด)
+SLIP_PARSE_BUDGET_MS = float(os.getenv('SLIP_PARSE_BUDGET_MS', 100))
+
+# ตัวเลขจำนวนเงิน: เริ่มที่ต้นกลุ่มตัวเลขเท่านั้น และทศนิยมต้องมีจุดนำ (ไม่ให้ [0-9]* แย่งตัวเลขกับ [0-9,]+)
+_NUMBER = r'(?<![0-9,])([0-9,]+(?:\.[0-9]*)?)'
+# ช่องว่างจนถึงขึ้นบรรทัดใหม่ (ข้ามบรรทัดว่างได้) เทียบเท่า \s*\n แต่แบ่งตัวอักษรได้แบบเดียว
+_EOL = r'(?:[^\S\n]*\n)+'
+# ชื่อในบรรทัด: ขึ้นต้นและลงท้ายด้วยตัวที่ไม่ใช่ช่องว่าง
+_LINE_TEXT = r'(\S(?:[^\n]*\S)?)'
+# บรรทัดชื่อที่มีแต่ช่องว่าง (group ของชื่อเป็น None)
+_BLANK_LINE = r'\n*[^\S\n]+(?=\n)'
+# จุดสิ้นสุดชื่อ: ก่อน xxx / x- หรือท้ายบรรทัด (ใช้กับ re.MULTILINE)
+# ตรวจ xxx เฉพาะหลังตัวที่ไม่ใช่ช่องว่าง ไม่ให้สแกนช่องว่างเดิมซ้ำทุกตำแหน่ง (ได้ผลเหมือนกันเพราะ group ขยายแบบ lazy)
+_NAME_END = r'(?:(?<=\S)(?=[^\S\n]*(?:xxx|x-))|$)'
+_NAME_END_X = r'(?:(?<=\S)(?=[^\S\n]*x-)|$)'
+# คำนำหน้าชื่อที่ตามด้วยช่องว่างจนจบข้อความ (อย่างน้อยสองตัว และตัวหลังๆ ไม่ใช่ขึ้นบรรทัดใหม่ทั้งหมด)
+# parser เดิมคืนแค่คำนำหน้าเป็นชื่อผู้โอนในกรณีนี้ จึงคงผลเดิมไว้ (\n* กับ [^\S\n] ไม่ทับกัน)
+_TITLE_ONLY = r'(?=\s\n*[^\S\n]\s*\Z)'
+
+# จำนวนเงิน - ลองตามลำดับในแต่ละบรรทัด
+AMOUNT_PATTERNS = [
+    _NUMBER + r'\s*บาท',
+    _NUMBER + r'\s*THB',
+    r'จำนวนเงิน[:\s]*' + _NUMBER,
+    r'Amount[:\s]*' + _NUMBER,
+    r'฿' + _NUMBER,
+    r'^\s*' + _NUMBER + r'\s*$'  # เลขที่อยู่คนเดียวในบรรทัด
+]
+
+DATE_PATTERNS = [
+    r'(\d{1,2}\s+(?:ม\.ค\.|ก\.พ\.|มี\.ค\.|เม\.ย\.|พ\.ค\.|มิ\.ย\.|ก\.ค\.|ส\.ค\.|ก\.ย\.|ต\.ค\.|พ\.ย\.|ธ\.ค\.)\s+\d{4})',
+    r'(\d{1,2}\s+(?:มกราคม|กุมภาพันธ์|มีนาคม|เมษายน|พฤษภาคม|มิถุนายน|กรกฎาคม|สิงหาคม|กันยายน|ตุลาคม|พฤศจิกายน|ธันวาคม)\s+\d{4})',
+    r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
+    r'(\d{4}-\d{2}-\d{2})',
+    r'(\d{2}/\d{2}/\d{4})'
+]
+
+TIME_PATTERNS = [
+    r'(\d{1,2}:\d{2}:\d{2})',
+    r'(\d{1,2}:\d{2})'
+]
+
+# ชื่อธนาคาร - ลำดับใน dict คือลำดับความสำคัญเมื่อเจอหลายธนาคาร
+BANK_KEYWORDS = {
+    'SCB': ['scb', 'uscb', 'ไทยพาณิชย์', 'siam commercial'],
+    'กสิกรไทย': ['กสิกรไทย', 'kbank', 'kasikorn'],
+    'กรุงเทพ': ['กรุงเทพ', 'bbl', 'bangkok bank'],
+    'กรุงไทย': ['กรุงไทย', 'ktb', 'krung thai'],
+    'ทีเอ็มบี': ['ทีเอ็มบี', 'tmb', 'tmbthanachart'],
+    'ธนชาต': ['ธนชาต', 'thanachart'],
+    'ยูโอบี': ['ยูโอบี', 'uob'],
+    'ซีไอเอ็มบี': ['ซีไอเอ็มบี', 'cimb'],
+    'ไอซีบีซี': ['ไอซีบีซี', 'icbc'],
+    'ก.ส.ห.': ['ก.ส.ห.', 'baac', 'bank for agriculture']
+}
+
+SENDER_PATTERNS = [
+    r'จาก[^\S\n]*\n\s*(นาย\s+[^\n]+)',  # เก็บคำนำหน้า "นาย" ด้วย
+    r'จาก[^\S\n]*\n\s*(นาง\s+[^\n]+)',
+    r'จาก[^\S\n]*\n\s*(นางสาว\s+[^\n]+)',
+    r'จาก[^\S\n]*\n\s*(\S[^\n]*?)' + _NAME_END,
+    r'(นาย(?:\s+\S[^\n]*?' + _NAME_END + '|' + _TITLE_ONLY + '))',
+    r'(นาง(?:\s+\S[^\n]*?' + _NAME_END + '|' + _TITLE_ONLY + '))',
+    r'(นางสาว(?:\s+\S[^\n]*?' + _NAME_END + '|' + _TITLE_ONLY + '))',
+    r'ผู้โอน[:\s]*([^\n]+)',
+    r'from[:\s]*([^\n]+)'
+]
+
+RECIPIENT_PATTERNS = [
+    r'ไปยัง[^\S\n]*\n\s*บจก\.[^\S\n]*\n\s*(\S[^\n]*?)' + _NAME_END_X,
+    r'ไปยัง[^\S\n]*\n\s*(\S[^\n]*?)' + _NAME_END_X,
+    r'บจก\.[^\S\n]*\n\s*(\S[^\n]*?)' + _NAME_END_X,
+    r'บจก\.\s*(\S[^\n]*?)' + _NAME_END_X,
+    r'ผู้รับ[:\s]*([^\n]+)',
+    r'to[:\s]*([^\n]+)',
+    r'นาย\s+(\S[^\n]*?)' + _NAME_END,
+    r'นาง\s+(\S[^\n]*?)' + _NAME_END,
+]
+
+REF_PATTERNS = [
+    r'รหัสอ้างอิง[:\s]*([A-Za-z0-9]+)',
+    r'อ้างอิง[:\s]*([A-Za-z0-9]+)',
+    r'reference[:\s]*([A-Za-z0-9]+)',
+    r'ref[:\s]*([A-Za-z0-9]+)',
+    r'เลขที่[:\s]*([A-Za-z0-9]+)'
+]
+
+ACCOUNT_PATTERNS = [
+    r'(xxx-xxx\d+-\d+)',
+    r'(x-\d+)',
+    r'บัญชี[:\s]*([0-9x-]+)',
+    r'account[:\s]*([0-9x-]+)',
+    r'a/c[:\s]*([0-9x-]+)'
+]
+
+# สลิปกรุงไทย
+KTB_PATTERN = (
+    r'(?:นาย|นาง|น\.ส\.|ด\.ช\.|ด\.ญ\.)(?:\s*' + _LINE_TEXT + '|' + _BLANK_LINE + ')' + _EOL +
+    r'(?:กรุงไทย|krungthai)' + _EOL +
+    r'xxx-x-[x\d]+-\d' + _EOL +
+    r'รหัสร้านค้า' + _EOL +
+    r'(\d+)' + _EOL +
+    r'(?:รหัสธุรกรรม|เลขที่อ้างอิง)' + _EOL +
+    r'[a-zA-Z0-9]+' + _EOL +
+    r'จำนวนเงิน' + _EOL +
+    r'(\d+(?:\.\d{2})?)\s*บาท'
+)
+
+# สลิปกสิกรไทย: ผู้โอน (นาย) แล้วตามด้วยผู้รับ (นาง) ที่ไหนก็ได้หลังจากนั้น
+KBANK_PATTERNS = [
+    r'นาย(?:\s+' + _LINE_TEXT + r'|\s' + _BLANK_LINE + ')' + _EOL + r'ธ\.กสิกรไทย',
+    r'นาง(?:\s+' + _LINE_TEXT + r'|\s' + _BLANK_LINE + ')' + _EOL + r'ธ\.กสิกรไทย',
+]
+
+# รหัสธนาคารใน QR ของสลิป -> ชื่อธนาคารตาม BANK_KEYWORDS
+BANK_CODES = {
+    '002': 'กรุงเทพ',
+    '004': 'กสิกรไทย',
+    '006': 'กรุงไทย',
+    '011': 'ทีเอ็มบี',
+    '014': 'SCB',
+    '022': 'ซีไอเอ็มบี',
+    '024': 'ยูโอบี',
+    '034': 'ก.ส.ห.',
+    '065': 'ธนชาต',
+    '070': 'ไอซีบีซี'
+}
+
+_DIGIT = re.compile(r'\d')
+# เริ่มเฉพาะหลังตัวที่ไม่ใช่ช่องว่าง (ตำแหน่งกลางช่องว่างให้ผลเดียวกับต้นช่องว่างอยู่แล้ว)
+_NAME_XXX = re.compile(r'(?<!\s)\s*xxx.*')
+_NAME_X = re.compile(r'(?<!\s)\s*x-.*')
+_NON_ALNUM = re.compile(r'[^A-Za-z0-9]')
+
+
+def _compile(patterns: List[str], flags: int = 0) -> List[re.Pattern]:
+    return [re.compile(p, flags) for p in patterns]
+
+
+class KeywordMatcher:
+    """
+    หา keyword หลายคำในข้อความด้วยการสแกนครั้งเดียว
+
+    ใช้ regex แบบ lookahead ที่รวมทุก keyword (ยาวก่อนสั้น) ให้ได้ผลที่ทุกตำแหน่งของข้อความ
+    keyword ที่เป็น prefix ของคำที่ยาวกว่าจะถูกนับรวมด้วย จึงได้ผลเหมือนการเช็ค `in` ทีละคำ
+
+    Args:
+        keywords (Dict[str, List[str]]): label -> รายการ keyword (ตัวพิมพ์เล็ก)
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]]):
+        labels_by_keyword: Dict[str, set] = {}
+        for label, words in keywords.items():
+            for word in words:
+                labels_by_keyword.setdefault(word.lower(), set()).add(label)
+
+        # รวม label ของ keyword ที่เป็น prefix เข้าไปในคำที่ยาวกว่า
+        self._labels = {}
+        for word in labels_by_keyword:
+            labels = set()
+            for other, other_labels in labels_by_keyword.items():
+                if word.startswith(other):
+                    labels |= other_labels
+            self._labels[word] = frozenset(labels)
+
+        alternation = '|'.join(re.escape(w) for w in sorted(self._labels, key=len, reverse=True))
+        self._pattern = re.compile(f'(?=({alternation}))')
+
+    def find(self, text_lower: str) -> set:
+        """คืน label ทั้งหมดที่มี keyword อยู่ในข้อความ (ข้อความต้องเป็นตัวพิมพ์เล็กแล้ว)"""
+        found = set()
+        for word in set(self._pattern.findall(text_lower)):
+            found |= self._labels[word]
+        return found
+
+
+class SequenceMatch:
+    """ผลของ SequencePattern: group เรียงต่อกันตามลำดับ pattern (เริ่มที่ 1 เหมือน re.Match)"""
+
+    def __init__(self, matches: List[re.Match]):
+        self._groups = [group for match in matches for group in match.groups()]
+
+    def group(self, index: int) -> Optional[str]:
+        return self._groups[index - 1]
+
+
+class SequencePattern:
+    """
+    pattern หลายส่วนที่ต้องเจอตามลำดับ ให้ผลเหมือน a[\\s\\S]*?b
+
+    regex แบบนั้นจะสแกนถึงท้ายข้อความใหม่ทุกตำแหน่งที่ a match (O(n^2))
+    ส่วนนี้หา a ที่แรกแล้วหา b ต่อจากจุดนั้นครั้งเดียว
+
+    Args:
+        patterns (List[re.Pattern]): pattern ของแต่ละส่วนตามลำดับ
+    """
+
+    def __init__(self, patterns: List[re.Pattern]):
+        self.patterns = patterns
+
+    def search(self, text: str) -> Optional[SequenceMatch]:
+        matches = []
+        pos = 0
+        for pattern in self.patterns:
+            match = pattern.search(text, pos)
+            if not match:
+                return None
+            matches.append(match)
+            pos = match.end()
+        return SequenceMatch(matches)
+
+
+def cap_text(text: str, max_chars: int = SLIP_PARSE_MAX_CHARS, max_line: int = SLIP_PARSE_MAX_LINE) -> str:
+    """ตัดข้อความให้ไม่เกิน max_chars และแต่ละบรรทัดไม่เกิน max_line ตัวอักษร (0 = ไม่จำกัด)"""
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars]
+    if max_line and len(text) > max_line:
+        lines = text.split('\n')
+        if any(len(line) > max_line for line in lines):
+            text = '\n'.join(line[:max_line] for line in lines)
+    return text
+
+
+def _extract_ktb(match: re.Match, parsed_data: Dict[str, Any]):
+    parsed_data["sender"] = (match.group(1) or '').strip()
+    parsed_data["amount"] = match.group(3)
+
+
+def _extract_kbank(match: re.Match, parsed_data: Dict[str, Any]):
+    parsed_data["sender"] = f"นาย {match.group(1) or ''}".strip()  # เพิ่ม "นาย" ในผู้โอน
+    parsed_data["recipient"] = f"นาง {match.group(2) or ''}".strip()
+
+
+class BankTemplate:
+    """
+    template ของสลิปธนาคารที่มีรูปแบบตายตัว
+
+    Args:
+        name (str): ชื่อ template
+        triggers (List[str]): keyword ที่ต้องมีในข้อความ template ถึงจะถูกลอง
+        pattern (re.Pattern): pattern ของทั้งสลิป (หรือ SequencePattern)
+        extract (Callable): ฟังก์ชันใส่ค่าจาก match ลงใน parsed_data
+    """
+
+    def __init__(self, name: str, triggers: List[str], pattern: re.Pattern,
+                 extract: Callable[[re.Match, Dict[str, Any]], None]):
+        self.name = name
+        self.triggers = triggers
+        self.pattern = pattern
+        self.extract = extract
+
+
+# ลำดับของ template คือลำดับการลอง - ถ้า template ไหน match จะไม่แยกผู้โอน/ผู้รับ/อ้างอิง/บัญชีต่อ
+BANK_TEMPLATES = [
+    BankTemplate('ktb', ['กรุงไทย', 'krungthai'], re.compile(KTB_PATTERN, re.IGNORECASE | re.MULTILINE), _extract_ktb),
+    BankTemplate('kbank', ['ธ.กสิกรไทย'], SequencePattern(_compile(KBANK_PATTERNS)), _extract_kbank),
+]
+
+
+class SlipParser:
+    """
+    แยกข้อมูลสลิปเงินด้วย pattern ที่ compile ไว้ครั้งเดียว
+
+    - หา keyword ของทุกธนาคารและ template ในการสแกนครั้งเดียว
+    - ลอง template เฉพาะธนาคารเมื่อเจอ keyword ของ template นั้นเท่านั้น
+    - ข้ามบรรทัดที่ไม่มีตัวเลขตอนหาจำนวนเงิน
+    """
+
+    def __init__(self, bank_keywords: Dict[str, List[str]] = BANK_KEYWORDS,
+                 templates: List[BankTemplate] = BANK_TEMPLATES,
+                 max_chars: int = SLIP_PARSE_MAX_CHARS, max_line: int = SLIP_PARSE_MAX_LINE,
+                 budget_ms: float = SLIP_PARSE_BUDGET_MS):
+        self.amount_patterns = _compile(AMOUNT_PATTERNS, re.IGNORECASE)
+        self.date_patterns = _compile(DATE_PATTERNS)
+        self.time_patterns = _compile(TIME_PATTERNS)
+        self.sender_patterns = _compile(SENDER_PATTERNS, re.IGNORECASE | re.MULTILINE)
+        self.recipient_patterns = _compile(RECIPIENT_PATTERNS, re.IGNORECASE | re.MULTILINE)
+        self.ref_patterns = _compile(REF_PATTERNS, re.IGNORECASE)
+        self.account_patterns = _compile(ACCOUNT_PATTERNS, re.IGNORECASE)
+
+        self.bank_rank = {bank: rank for rank, bank in enumerate(bank_keywords)}
+        self.templates = templates
+        keywords = {('bank', bank): words for bank, words in bank_keywords.items()}
+        keywords.update({('template', t.name): t.triggers for t in templates})
+        self.matcher = KeywordMatcher(keywords)
+
+        self.max_chars = max_chars
+        self.max_line = max_line
+        self.budget = budget_ms / 1000
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        """
+        แยกข้อมูลสลิปเงินจากข้อความ
+
+        ถ้าใช้เวลาเกิน budget จะหยุดที่ขั้นตอนถัดไปและคืนข้อมูลเท่าที่แยกได้ พร้อม partial = True
+
+        Args:
+            text (str): ข้อความที่อ่านได้จากรูป
+
+        Returns:
+            Dict: ข้อมูลที่แยกได้
+        """
+        parsed_data = {
+            "amount": None,
+            "date": None,
+            "time": None,
+            "bank": None,
+            "reference": None,
+            "account_number": None,
+            "recipient": None,
+            "sender": None,
+            "raw_text": text
+        }
+
+        capped = cap_text(text, self.max_chars, self.max_line)
+        if capped is not text:
+            logger.info(f"ข้อความสลิปยาว {len(text)} ตัวอักษร ตัดเหลือ {len(capped)} ก่อนแยกข้อมูล")
+        text = capped
+        deadline = time.perf_counter() + self.budget if self.budget > 0 else None
+
+        def expired(step: str) -> bool:
+            if deadline is None or time.perf_counter() < deadline:
+                return False
+            logger.warning(f"แยกข้อมูลสลิปเกิน {self.budget * 1000:.0f} ms หยุดก่อนขั้นตอน {step}")
+            parsed_data["partial"] = True
+            return True
+
+        parsed_data["amount"] = self._find_amount(text, deadline)
+        if expired("date"):
+            return parsed_data
+        parsed_data["date"] = self._search_first(self.date_patterns, text)
+        parsed_data["time"] = self._search_first(self.time_patterns, text)
+
+        found = self.matcher.find(text.lower())
+        banks = [label[1] for label in found if label[0] == 'bank']
+        if banks:
+            parsed_data["bank"] = min(banks, key=self.bank_rank.__getitem__)
+
+        for template in self.templates:
+            if ('template', template.name) not in found:
+                continue
+            if expired(f"template {template.name}"):
+                return parsed_data
+            match = template.pattern.search(text)
+            if match:
+                template.extract(match, parsed_data)
+                return parsed_data
+
+        if expired("sender"):
+            return parsed_data
+        parsed_data["sender"] = self._find_name(self.sender_patterns, text, (_NAME_XXX, _NAME_X))
+        if expired("recipient"):
+            return parsed_data
+        parsed_data["recipient"] = self._find_name(self.recipient_patterns, text, (_NAME_X, _NAME_XXX))
+        if expired("reference"):
+            return parsed_data
+        parsed_data["reference"] = self._search_first(self.ref_patterns, text)
+        parsed_data["account_number"] = self._search_first(self.account_patterns, text)
+        return parsed_data
+
+    def parse_fields(self, fields: Dict[str, str], bank: Optional[str] = None) -> Dict[str, Any]:
+        """
+        แยกข้อมูลจากข้อความที่อ่านแยกตามช่องของ template (ดู region_ocr.py)
+
+        Args:
+            fields (Dict): ชื่อช่อง -> ข้อความในช่องนั้น (datetime, amount, reference, sender, recipient)
+            bank (str): ธนาคารของ template
+
+        Returns:
+            Dict: ข้อมูลที่แยกได้ ในรูปแบบเดียวกับ parse()
+        """
+        datetime_text = fields.get("datetime", "")
+        reference = _NON_ALNUM.sub('', fields.get("reference", ""))
+        sender = fields.get("sender", "").strip()
+        recipient = fields.get("recipient", "").strip()
+        for cleaner in (_NAME_XXX, _NAME_X):
+            sender = cleaner.sub('', sender).strip()
+        for cleaner in (_NAME_X, _NAME_XXX):
+            recipient = cleaner.sub('', recipient).strip()
+
+        return {
+            "amount": self._find_amount(fields.get("amount", "")),
+            "date": self._search_first(self.date_patterns, fields.get("date", datetime_text)),
+            "time": self._search_first(self.time_patterns, fields.get("time", datetime_text)),
+            "bank": bank,
+            "reference": reference or None,
+            "account_number": self._search_first(self.account_patterns, fields.get("account", "")),
+            "recipient": recipient if len(recipient) > 1 else None,
+            "sender": sender if len(sender) > 1 else None,
+            "raw_text": "\n".join(text for text in fields.values() if text)
+        }
+
+    def _find_amount(self, text: str, deadline: Optional[float] = None) -> Optional[str]:
+        """หาจำนวนเงินจากทุกบรรทัด - ใช้ค่าแรกที่เป็นตัวเลขมากกว่า 0 (หยุดเมื่อถึง deadline ของ perf_counter)"""
+        for line in text.split('\n'):
+            if not _DIGIT.search(line):
+                continue
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+            line = line.strip()
+            for pattern in self.amount_patterns:
+                match = pattern.search(line)
+                if match:
+                    amount_candidate = match.group(1).replace(',', '')
+                    try:
+                        if float(amount_candidate) > 0:
+                            return amount_candidate
+                    except ValueError:
+                        continue
+        return None
+
+    @staticmethod
+    def _search_first(patterns: List[re.Pattern], text: str) -> Optional[str]:
+        for pattern in patterns:
+            match = pattern.search(text)
+            if match:
+                return match.group(1)
+        return None
+
+    @staticmethod
+    def _find_name(patterns: List[re.Pattern], text: str, cleaners: tuple) -> Optional[str]:
+        for pattern in patterns:
+            match = pattern.search(text)
+            if match:
+                name = match.group(1).strip()
+                # ทำความสะอาดชื่อ (ลำดับการตัดมีผลกับ "xxx-")
+                for cleaner in cleaners:
+                    name = cleaner.sub('', name).strip()
+                if name and len(name) > 1:
+                    return name
+        return None
+
+
+def _parse_tlv(payload: str) -> Dict[str, str]:
+    """แยก payload แบบ EMVCo TLV (tag 2 หลัก, ความยาว 2 หลัก, ค่า) คืน dict ว่างถ้ารูปแบบไม่ถูกต้อง"""
+    fields = {}
+    pos = 0
+    while pos < len(payload):
+        tag, length = payload[pos:pos + 2], payload[pos + 2:pos + 4]
+        if len(tag) < 2 or not length.isdigit() or pos + 4 + int(length) > len(payload):
+            return {}
+        fields[tag] = payload[pos + 4:pos + 4 + int(length)]
+        pos += 4 + int(length)
+    return fields
+
+
+def _crc16(data: str) -> str:
+    """CRC-16/CCITT-FALSE ที่ใช้ใน tag 63 ของ PromptPay QR"""
+    crc = 0xFFFF
+    for byte in data.encode('utf-8'):
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return f'{crc:04X}'
+
+
+def parse_qr_payload(payload: str) -> Dict[str, Any]:
+    """
+    แยกข้อมูลจาก QR บนสลิป
+
+    รองรับ
+    - QR ตรวจสอบสลิป (mini-QR): tag 00 = {01: รหัสธนาคารผู้โอน, 02: เลขอ้างอิงรายการ}, tag 51 = TH
+    - PromptPay / Thai QR Payment: tag 54 = จำนวนเงิน, tag 62.05 หรือ 30.02 = เลขอ้างอิง
+
+    Args:
+        payload (str): ข้อความที่อ่านได้จาก QR
+
+    Returns:
+        Dict: type (slip/promptpay/None), reference, bank, amount และ payload เดิม
+    """
+    result = {"type": None, "reference": None, "bank": None, "amount": None, "payload": payload}
+    fields = _parse_tlv(payload or '')
+
+    if fields.get('51') == 'TH' and '00' in fields:
+        inner = _parse_tlv(fields['00'])
+        if inner.get('02'):
+            result["type"] = "slip"
+            result["reference"] = inner['02']
+            result["bank"] = BANK_CODES.get(inner.get('01'))
+
+    elif fields.get('00') == '01' and '63' in fields:
+        # ตรวจ CRC ของทั้ง payload (รวม "6304") ก่อนเชื่อข้อมูล
+        if _crc16(payload[:-4]) != fields['63'].upper():
+            return result
+        result["type"] = "promptpay"
+        result["amount"] = fields.get('54')
+        additional = _parse_tlv(fields.get('62', ''))
+        bill_payment = _parse_tlv(fields.get('30', ''))
+        result["reference"] = additional.get('05') or bill_payment.get('02')
+
+    return result
+
+
+slip_parser = SlipParser()
@@ -0,0 +1,389 @@
+# app/slip_store.py - ที่เก็บรูปสลิปตาม hash ของเนื้อหา มีกำหนดอายุ/ขนาดรวม
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+from .ocr_cache import image_key
+
+logger = logging.getLogger(__name__)
+
+# โฟลเดอร์ของที่เก็บรูป (ว่าง = ปิด)
+SLIP_STORE_DIR = os.getenv('SLIP_STORE_DIR', 'static/slips')
+# รูปแบบไฟล์ที่เก็บ: original = เก็บไฟล์ที่ได้จาก LINE ตามเดิม (ค่าเริ่มต้น ใช้เป็นหลักฐานได้)
+# webp หรือ jpg = encode ใหม่แบบ lossy ให้ไฟล์เล็กลง (ตัวเลขเล็กๆ ในสลิปอาจอ่านยากขึ้น)
+SLIP_STORE_FORMAT = os.getenv('SLIP_STORE_FORMAT', 'original').lower()
+# คุณภาพ (1-100) และย่อรูปที่ด้านยาวเกินนี้ (0 = ไม่ย่อ) ใช้เฉพาะตอน encode ใหม่
+SLIP_STORE_QUALITY = int(os.getenv('SLIP_STORE_QUALITY', 80))
+SLIP_STORE_MAX_SIDE = int(os.getenv('SLIP_STORE_MAX_SIDE', 0))
+# ขนาดรวมสูงสุด (MB) และอายุสูงสุด (วัน) ของรูปที่เก็บ (0 = ไม่จำกัด)
+SLIP_STORE_MAX_MB = float(os.getenv('SLIP_STORE_MAX_MB', 2048))
+SLIP_STORE_MAX_AGE_DAYS = float(os.getenv('SLIP_STORE_MAX_AGE_DAYS', 90))
+# ลบรูปที่เกินกำหนดทุกกี่วินาที
+SLIP_STORE_EVICT_INTERVAL = float(os.getenv('SLIP_STORE_EVICT_INTERVAL', 600))
+# จำนวนรูปที่รอเขียนได้สูงสุด เกินนี้จะไม่เก็บรูปนั้น (ไม่ให้ memory โตเมื่อดิสก์ช้า)
+SLIP_STORE_MAX_PENDING = int(os.getenv('SLIP_STORE_MAX_PENDING', 256))
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS blobs ("
+    "key TEXT PRIMARY KEY, path TEXT, size INTEGER, created REAL)",
+    "CREATE INDEX IF NOT EXISTS idx_blobs_created ON blobs (created)",
+    "CREATE TABLE IF NOT EXISTS messages ("
+    "message_id TEXT PRIMARY KEY, key TEXT, user_id TEXT, created REAL)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_key ON messages (key)",
+]
+
+# จำนวนรูปที่ลบต่อ transaction ตอน eviction
+_EVICT_BATCH = 500
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def image_ext(image_data: bytes) -> str:
+    """นามสกุลไฟล์ตามเนื้อหาของรูป (ดูจาก signature ต้นไฟล์)"""
+    head = bytes(image_data[:12])
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    return 'bin'
+
+
+def encode_image(image_data: bytes, fmt: str = SLIP_STORE_FORMAT, quality: int = SLIP_STORE_QUALITY,
+                 max_side: int = SLIP_STORE_MAX_SIDE) -> tuple:
+    """
+    เตรียมรูปก่อนเก็บ: original เก็บตามเดิม, webp/jpg ย่อถ้าใหญ่เกิน max_side แล้ว encode ใหม่
+
+    Returns:
+        tuple: (bytes, นามสกุลไฟล์) ถ้า decode/encode ไม่ได้หรือไฟล์ใหม่ใหญ่กว่าเดิมจะคืนรูปเดิม
+    """
+    original = bytes(image_data), image_ext(image_data)
+    if fmt not in ('webp', 'jpg'):
+        return original
+
+    import cv2
+    import numpy as np
+
+    image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return original
+
+    height, width = image.shape[:2]
+    if max_side and max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    if fmt == 'webp':
+        ok, encoded = cv2.imencode('.webp', image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    else:
+        ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok or len(encoded) >= len(image_data):
+        return original
+    return encoded.tobytes(), fmt
+
+
+class SlipStore:
+    """
+    ที่เก็บรูปสลิปแบบ content-addressed
+
+    - รูปเก็บครั้งเดียวต่อเนื้อหา ที่ {root}/ab/cd/<sha256>.<ext> (key เดียวกับ OCR cache และ slip ledger)
+      โฟลเดอร์ย่อยสองชั้นทำให้แต่ละโฟลเดอร์มีไฟล์ไม่มาก
+    - index ใน SQLite: message id -> key -> ไฟล์ ค้นได้โดยไม่ต้อง list โฟลเดอร์
+    - save() แค่ใส่คิว thread เบื้องหลังเขียนไฟล์ (และ encode ใหม่ถ้าตั้งไว้) ไม่อยู่บนเส้นทางตอบกลับ
+    - thread เดียวกันลบรูปที่เก่าเกิน max_age หรือเมื่อขนาดรวมเกิน max_bytes (เก่าสุดก่อน)
+      อายุของรูปนับจากครั้งล่าสุดที่ได้รับรูปนั้น (รูปที่ส่งซ้ำจะไม่ถูกลบเพราะครั้งแรกเก่า)
+      ขนาดรวมเก็บไว้ใน memory จึงไม่ต้องไล่อ่านไฟล์บนดิสก์
+
+    Args:
+        root (str): โฟลเดอร์ของที่เก็บรูป
+        max_mb (float): ขนาดรวมสูงสุด (MB, 0 = ไม่จำกัด)
+        max_age_days (float): อายุสูงสุดของรูป (วัน, 0 = ไม่จำกัด)
+        evict_interval (float): ตรวจ retention ทุกกี่วินาที
+        max_pending (int): จำนวนรูปที่รอเขียนได้สูงสุด
+    """
+
+    def __init__(self, root: str = SLIP_STORE_DIR, max_mb: float = SLIP_STORE_MAX_MB,
+                 max_age_days: float = SLIP_STORE_MAX_AGE_DAYS, evict_interval: float = SLIP_STORE_EVICT_INTERVAL,
+                 max_pending: int = SLIP_STORE_MAX_PENDING):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age_days * 24 * 60 * 60
+        self.evict_interval = evict_interval
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max(1, max_pending))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writer: Optional[threading.Thread] = None
+        self._total_bytes = 0
+        self._blobs = 0
+        self._stats = {"saved": 0, "deduplicated": 0, "evicted": 0, "dropped": 0, "errors": 0,
+                       "bytes_in": 0, "bytes_stored": 0}
+
+        if not root:
+            return
+        try:
+            os.makedirs(root, exist_ok=True)
+            conn = _connect(self._index_path)
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._blobs, self._total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            conn.close()
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"ไม่สามารถเปิดที่เก็บรูปสลิป: {str(e)}")
+            self.root = ''
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.root, 'index.db')
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = _connect(self._index_path)
+        return conn
+
+    def blob_path(self, key: str, ext: str) -> str:
+        """path ของไฟล์รูปตาม key (แบ่งโฟลเดอร์ตาม 4 ตัวอักษรแรกของ hash)"""
+        return os.path.join(self.root, key[:2], key[2:4], f"{key}.{ext}")
+
+    def save(self, image_data: bytes, user_id: Optional[str], message_id: str) -> Optional[str]:
+        """
+        เก็บรูปเบื้องหลัง (ไม่รอเขียนลงดิสก์)
+
+        Returns:
+            Optional[str]: key ของรูป หรือ None ถ้าปิดไว้/คิวเต็ม
+        """
+        if not self.enabled:
+            return None
+        key = image_key(image_data)
+        try:
+            self._queue.put_nowait((key, image_data, user_id, message_id, time.time()))
+        except queue.Full:
+            self._stats["dropped"] += 1
+            logger.warning(f"ที่เก็บรูปสลิปมีงานค้างเต็ม ไม่เก็บรูปของ message {message_id}")
+            return None
+        self._start_writer()
+        return key
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='slip-store', daemon=True)
+                self._writer.start()
+
+    def lookup(self, message_id: str) -> Optional[str]:
+        """path ของรูปจาก message id (ค้นผ่าน primary key) หรือ None ถ้าไม่มี/ถูกลบแล้ว"""
+        if not self.enabled:
+            return None
+        row = self._reader().execute(
+            "SELECT b.path FROM messages m JOIN blobs b ON b.key = m.key WHERE m.message_id = ?", (message_id,)
+        ).fetchone()
+        return os.path.join(self.root, row[0]) if row else None
+
+    def get(self, message_id: str) -> Optional[bytes]:
+        """เนื้อหารูปที่เก็บไว้ของ message id (ตาม SLIP_STORE_FORMAT ตอนที่เก็บ)"""
+        path = self.lookup(message_id)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def save_now(self, image_data: bytes, user_id: Optional[str], message_id: str) -> str:
+        """
+        เก็บรูปทันทีใน thread ที่เรียก (สำหรับ save_slip_image / script)
+
+        เป็นงานที่บล็อก (เขียนไฟล์และ SQLite) จาก async code ให้เรียกผ่าน asyncio.to_thread
+        รันพร้อมกับ writer ของ save() ได้
+
+        Returns:
+            str: path ของไฟล์รูป
+        """
+        if not self.enabled:
+            raise OSError("ที่เก็บรูปสลิปถูกปิดไว้ (SLIP_STORE_DIR ว่าง)")
+        conn = self._reader()
+        with conn:
+            return self._write(conn, image_key(image_data), image_data, user_id, message_id, time.time())
+
+    def _write(self, conn: sqlite3.Connection, key: str, image_data: bytes, user_id: Optional[str],
+               message_id: str, created: float) -> str:
+        row = conn.execute("SELECT path FROM blobs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            data, ext = encode_image(image_data)
+            path = self.blob_path(key, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # เขียนไฟล์ชั่วคราวก่อนแล้ว rename ไม่ให้มีไฟล์ที่เขียนไม่จบ
+            # ชื่อไฟล์ชั่วคราวแยกตาม thread เพราะ save_now กับ writer อาจเขียนรูปเดียวกันพร้อมกัน
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            relative = os.path.relpath(path, self.root)
+            if conn.execute("INSERT OR IGNORE INTO blobs (key, path, size, created) VALUES (?, ?, ?, ?)",
+                            (key, relative, len(data), created)).rowcount:
+                with self._lock:
+                    self._blobs += 1
+                    self._total_bytes += len(data)
+                self._stats["bytes_in"] += len(image_data)
+                self._stats["bytes_stored"] += len(data)
+            else:
+                # thread อื่นเพิ่งเก็บรูปเดียวกัน (เนื้อหาเดียวกันจึงได้ไฟล์เดียวกัน)
+                row = conn.execute("SELECT path FROM blobs WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            relative = row[0]
+            # รูปเดิมถูกส่งมาอีกครั้ง: นับอายุจากครั้งล่าสุด ไม่ให้ retention ลบรูปที่เพิ่งได้รับ
+            conn.execute("UPDATE blobs SET created = MAX(created, ?) WHERE key = ?", (created, key))
+            self._stats["deduplicated"] += 1
+        conn.execute("INSERT OR REPLACE INTO messages (message_id, key, user_id, created) VALUES (?, ?, ?, ?)",
+                     (message_id, key, user_id, created))
+        self._stats["saved"] += 1
+        return os.path.join(self.root, relative)
+
+    def _write_loop(self):
+        conn = _connect(self._index_path)
+        self.evict(conn)
+        next_evict = time.monotonic() + self.evict_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(next_evict - time.monotonic(), 0.01))
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                try:
+                    with conn:
+                        self._write(conn, *item)
+                except (OSError, sqlite3.Error) as e:
+                    self._stats["errors"] += 1
+                    logger.error(f"Slip store write error: {str(e)}")
+            if time.monotonic() >= next_evict or self._over_size():
+                self.evict(conn)
+                next_evict = time.monotonic() + self.evict_interval
+        conn.close()
+
+    def _over_size(self) -> bool:
+        return bool(self.max_bytes) and self._total_bytes > self.max_bytes
+
+    def evict(self, conn: Optional[sqlite3.Connection] = None) -> int:
+        """
+        ลบรูปที่เก่าเกิน max_age แล้วลบรูปเก่าสุดจนขนาดรวมไม่เกิน max_bytes
+
+        Returns:
+            int: จำนวนรูปที่ลบ
+        """
+        if not self.enabled:
+            return 0
+        conn = conn or self._reader()
+        removed = 0
+        try:
+            if self.max_age:
+                cutoff = time.time() - self.max_age
+                while True:
+                    rows = conn.execute("SELECT key, path, size FROM blobs WHERE created < ? LIMIT ?",
+                                        (cutoff, _EVICT_BATCH)).fetchall()
+                    if not rows:
+                        break
+                    removed += self._remove(conn, rows)
+            while self._over_size():
+                # ลบให้ต่ำกว่าขีดจำกัด 10% ไม่ต้อง evict ทุกครั้งที่เขียน
+                excess = self._total_bytes - int(self.max_bytes * 0.9)
+                rows, freed = [], 0
+                for row in conn.execute("SELECT key, path, size FROM blobs ORDER BY created LIMIT ?", (_EVICT_BATCH,)):
+                    rows.append(row)
+                    freed += row[2]
+                    if freed >= excess:
+                        break
+                if not rows:
+                    break
+                removed += self._remove(conn, rows)
+        except sqlite3.Error as e:
+            logger.error(f"Slip store eviction error: {str(e)}")
+        if removed:
+            logger.info(f"ลบรูปสลิปที่เกินกำหนด {removed} รูป")
+        return removed
+
+    def _remove(self, conn: sqlite3.Connection, rows) -> int:
+        for _, path, _ in rows:
+            try:
+                os.remove(os.path.join(self.root, path))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"ไม่สามารถลบรูป {path}: {str(e)}")
+        removed, freed = 0, 0
+        with conn:
+            for key, _, size in rows:
+                conn.execute("DELETE FROM messages WHERE key = ?", (key,))
+                # นับเฉพาะแถวที่ลบได้จริง (evict() อาจถูกเรียกพร้อมกันจากหลาย thread)
+                if conn.execute("DELETE FROM blobs WHERE key = ?", (key,)).rowcount:
+                    removed += 1
+                    freed += size
+        with self._lock:
+            self._blobs -= removed
+            self._total_bytes -= freed
+        self._stats["evicted"] += removed
+        return removed
+
+    def close(self):
+        """เขียนรูปที่ค้างในคิวให้หมดแล้วหยุด writer"""
+        with self._lock:
+            writer = self._writer
+            self._writer = None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, blobs=self._blobs, total_bytes=self._total_bytes,
+                        pending=self._queue.qsize(), enabled=self.enabled)
+
+
+# ที่เก็บรูปที่ใช้ร่วมกันทั้ง process - สร้างเมื่อเรียก get_slip_store() ครั้งแรก
+# เพื่อไม่ให้สร้างโฟลเดอร์และ index ตอน import module (ปิดเก็บรูปไว้ก็ไม่แตะดิสก์)
+_slip_store: Optional[SlipStore] = None
+_slip_store_lock = threading.Lock()
+
+
+def get_slip_store() -> Optional[SlipStore]:
+    """คืนที่เก็บรูปที่ใช้ร่วมกันทั้ง process หรือ None ถ้าไม่ได้ตั้ง SLIP_STORE_DIR (thread-safe)"""
+    global _slip_store
+    if not SLIP_STORE_DIR:
+        return None
+    if _slip_store is None:
+        with _slip_store_lock:
+            if _slip_store is None:
+                _slip_store = SlipStore(SLIP_STORE_DIR)
+    return _slip_store if _slip_store.enabled else None
+
+
+def close_slip_store():
+    """เขียนรูปที่ค้างแล้วหยุด writer (ถ้าเคยสร้างที่เก็บรูป)"""
+    if _slip_store is not None:
+        _slip_store.close()
+
+
+def slip_store_stats() -> Dict[str, Any]:
+    """สถิติของที่เก็บรูปโดยไม่สร้างที่เก็บรูปขึ้นมาใหม่"""
+    if _slip_store is None:
+        return {"enabled": False}
+    return _slip_store.stats()
@@ -0,0 +1,63 @@
+# app/webhook_events.py - แปลง webhook body เป็น event แบบเบา (ไม่ผ่าน model ของ line-bot-sdk)
+"""
+handler ใช้แค่ชนิดข้อความ, id, ข้อความ, reply token, เวลา และผู้ส่ง
+จึงแปลง JSON เป็น object แบบ __slots__ ที่มีเฉพาะ field เหล่านี้
+
+attribute ใช้ชื่อเดียวกับ model ของ line-bot-sdk (reply_token, source.user_id, message.id, ...)
+handler เดิมจึงใช้ได้กับ event ทั้งสองแบบ
+"""
+import json
+from typing import List, Optional
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+class EventSource:
+    __slots__ = ('type', 'user_id', 'group_id', 'room_id')
+
+    def __init__(self, data: dict):
+        self.type = data.get('type')
+        self.user_id = data.get('userId')
+        self.group_id = data.get('groupId')
+        self.room_id = data.get('roomId')
+
+
+class EventMessage:
+    __slots__ = ('type', 'id', 'text')
+
+    def __init__(self, data: dict):
+        self.type = data.get('type')
+        self.id = data.get('id')
+        self.text = data.get('text')
+
+
+class WebhookEvent:
+    """event หนึ่งตัวจาก webhook (message เป็น None ถ้าไม่ใช่ message event)"""
+    __slots__ = ('type', 'mode', 'timestamp', 'reply_token', 'webhook_event_id', 'is_redelivery',
+                 'source', 'message')
+
+    def __init__(self, data: dict):
+        self.type = data.get('type')
+        self.mode = data.get('mode')
+        self.timestamp = data.get('timestamp', 0)
+        self.reply_token = data.get('replyToken')
+        self.webhook_event_id = data.get('webhookEventId')
+        self.is_redelivery = (data.get('deliveryContext') or {}).get('isRedelivery', False)
+        self.source = EventSource(data.get('source') or {})
+        message = data.get('message')
+        self.message: Optional[EventMessage] = EventMessage(message) if message else None
+
+
+def parse_events(body: bytes) -> List[WebhookEvent]:
+    """
+    แปลง webhook body (bytes ที่ตรวจ signature แล้ว) เป็นรายการ event
+
+    Raises:
+        ValueError: body ไม่ใช่ JSON ที่ถูกต้อง
+    """
+    payload = _loads(body)
+    return [WebhookEvent(event) for event in payload.get('events', ())]
@@ -0,0 +1,3 @@
+"""
+Benchmark และเครื่องมือวัดประสิทธิภาพของ pipeline อ่านสลิป
+"""
@@ -0,0 +1,269 @@
+"""
+Benchmark ของแต่ละขั้นตอนใน pipeline อ่านสลิป
+
+วัดเวลา (p50/p90/p99/max), throughput, peak RSS และความแม่นยำของข้อมูลที่แยกได้
+เทียบกับค่าที่ label ไว้ใน fixtures/labels.json
+fixture ที่มีแค่ "text" (ไม่มี "image") ใช้วัดเฉพาะตัวแยกข้อมูล จึงรันเฉพาะตอน --no-ocr
+
+วิธีใช้:
+    python -m bench.bench_pipeline                          # รันทุกขั้นตอน
+    python -m bench.bench_pipeline --no-ocr                 # ข้าม EasyOCR ใช้ข้อความใน label แทน
+    python -m bench.bench_pipeline --no-templates           # OCR ทั้งรูปเสมอ (ไม่ใช้ template mode)
+    python -m bench.bench_pipeline --compare-templates      # เทียบความแม่นยำ template mode กับ OCR ทั้งรูป
+    python -m bench.bench_pipeline --save-baseline base.json
+    python -m bench.bench_pipeline --baseline base.json     # exit 1 ถ้าช้าลง/แม่นยำลดลง
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Any, Optional
+
+from app.ocr_utils import (
+    decode_image, preprocess_image, extract_text_from_image, parse_payment_slip,
+    format_slip_summary, read_slip_qr, merge_qr_data, qr_only_slip
+)
+from app.region_ocr import region_ocr
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'labels.json')
+
+STAGES = ["decode", "preprocess", "qr", "region_ocr", "ocr", "parse", "format", "total"]
+
+
+def load_fixtures(path: str) -> List[Dict[str, Any]]:
+    """โหลดรายการ fixture พร้อมอ่านไฟล์รูปเข้า memory"""
+    with open(path, encoding='utf-8') as f:
+        fixtures = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(path))
+    for fixture in fixtures:
+        if fixture.get("image"):
+            with open(os.path.join(base, fixture["image"]), 'rb') as f:
+                fixture["image_data"] = f.read()
+    return fixtures
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """percentile แบบ nearest-rank"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """หน่วยความจำสูงสุดของ process (MB) ใช้ได้บน Linux/macOS"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux รายงานเป็น KB, macOS เป็น bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_once(fixture: Dict[str, Any], use_ocr: bool, use_templates: bool,
+             timings: Dict[str, List[float]]) -> Dict[str, Any]:
+    """รันทุกขั้นตอนกับ fixture หนึ่งรายการ คืนข้อมูลสลิปที่แยกได้"""
+    def timed(stage, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings[stage].append((time.perf_counter() - start) * 1000)
+        return result
+
+    pipeline_start = time.perf_counter()
+    qr_data = None
+    image_data = fixture.get("image_data")
+
+    if image_data is not None:
+        image = timed("decode", decode_image, image_data)
+        timed("preprocess", preprocess_image, image)
+        qr_data = timed("qr", read_slip_qr, image_data)
+
+    region_result = None
+    if use_ocr and use_templates and image_data is not None and region_ocr.templates:
+        region_result = timed("region_ocr", region_ocr.read, image_data, qr_data and qr_data.get("bank"))
+
+    if region_result:
+        text = region_result["text"]
+    elif use_ocr and image_data is not None:
+        text = timed("ocr", extract_text_from_image, image_data)
+    else:
+        text = fixture.get("text", "")
+
+    if region_result:
+        parsed = merge_qr_data(region_result["parsed"], qr_data)
+    elif text:
+        parsed = merge_qr_data(timed("parse", parse_payment_slip, text), qr_data)
+    else:
+        parsed = qr_only_slip(qr_data) if qr_data else {"raw_text": ""}
+    timed("format", format_slip_summary, parsed)
+
+    timings["total"].append((time.perf_counter() - pipeline_start) * 1000)
+    return parsed
+
+
+def run_benchmark(fixtures: List[Dict[str, Any]], repeat: int, warmup: int, use_ocr: bool,
+                  use_templates: bool = True) -> Dict[str, Any]:
+    """รัน benchmark แล้วสรุปเวลา throughput หน่วยความจำ และความแม่นยำ"""
+    for _ in range(warmup):
+        for fixture in fixtures:
+            run_once(fixture, use_ocr, use_templates, defaultdict(list))
+
+    timings: Dict[str, List[float]] = defaultdict(list)
+    field_hits: Dict[str, int] = defaultdict(int)
+    field_total: Dict[str, int] = defaultdict(int)
+    mismatches = {}
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for fixture in fixtures:
+            parsed = run_once(fixture, use_ocr, use_templates, timings)
+            for field, expected in fixture.get("expected", {}).items():
+                field_total[field] += 1
+                if parsed.get(field) == expected:
+                    field_hits[field] += 1
+                else:
+                    mismatches[(fixture["name"], field)] = {"fixture": fixture["name"], "field": field,
+                                                           "expected": expected, "got": parsed.get(field)}
+    elapsed = time.perf_counter() - start
+
+    slips = repeat * len(fixtures)
+    return {
+        "config": {"fixtures": len(fixtures), "repeat": repeat, "ocr": use_ocr, "templates": use_templates},
+        "stages": {
+            stage: {
+                "count": len(timings[stage]),
+                "p50_ms": round(percentile(timings[stage], 50), 3),
+                "p90_ms": round(percentile(timings[stage], 90), 3),
+                "p99_ms": round(percentile(timings[stage], 99), 3),
+                "max_ms": round(max(timings[stage]), 3)
+            }
+            for stage in STAGES if timings[stage]
+        },
+        "throughput_per_sec": round(slips / elapsed, 3) if elapsed else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "accuracy": {
+            field: round(field_hits[field] / field_total[field], 4) for field in sorted(field_total)
+        },
+        "mismatches": list(mismatches.values())
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """เทียบกับ baseline คืนรายการ regression (ว่าง = ผ่าน)"""
+    regressions = []
+    for stage, stats in baseline.get("stages", {}).items():
+        current = result["stages"].get(stage)
+        if current is None:
+            continue
+        for key in ("p50_ms", "p90_ms"):
+            # ไม่นับความต่างระดับ sub-ms ที่เป็น noise ของเครื่อง
+            limit = stats[key] * (1 + tolerance) + 0.05
+            if current[key] > limit:
+                regressions.append(f"{stage}.{key}: {current[key]} > {stats[key]} (+{tolerance:.0%})")
+
+    for field, accuracy in baseline.get("accuracy", {}).items():
+        current = result["accuracy"].get(field)
+        if current is not None and current < accuracy:
+            regressions.append(f"accuracy.{field}: {current} < {accuracy}")
+    return regressions
+
+
+def compare_templates(fixtures: List[Dict[str, Any]], repeat: int, warmup: int) -> int:
+    """
+    รัน fixture ที่มีรูปทั้งแบบ template mode และ OCR ทั้งรูป แล้วแสดงความแม่นยำคู่กัน
+
+    template mode ต้องเปิดด้วย OCR_TEMPLATES=1 คืน 1 ถ้ามีช่องที่ template mode แม่นยำน้อยกว่า
+    """
+    if not region_ocr.templates:
+        print("ไม่มี template ที่โหลดไว้ (ตั้ง OCR_TEMPLATES=1)")
+        return 1
+
+    full = run_benchmark(fixtures, repeat, warmup, use_ocr=True, use_templates=False)
+    template = run_benchmark(fixtures, repeat, warmup, use_ocr=True, use_templates=True)
+
+    worse = []
+    print(f"{'field':<12}{'full OCR':>10}{'template':>10}")
+    for field in sorted(set(full["accuracy"]) | set(template["accuracy"])):
+        full_acc = full["accuracy"].get(field, 0.0)
+        template_acc = template["accuracy"].get(field, 0.0)
+        print(f"{field:<12}{full_acc:>10.0%}{template_acc:>10.0%}")
+        if template_acc < full_acc:
+            worse.append(field)
+    for label, result in (("full OCR", full), ("template", template)):
+        total = result["stages"].get("total", {})
+        print(f"{label}: total p50 {total.get('p50_ms', 0):.2f} ms, p90 {total.get('p90_ms', 0):.2f} ms")
+
+    if worse:
+        print(f"\n❌ template mode แม่นยำน้อยกว่า OCR ทั้งรูป: {', '.join(worse)}")
+        return 1
+    print("\n✅ template mode แม่นยำไม่ต่ำกว่า OCR ทั้งรูป")
+    return 0
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"{'stage':<12}{'count':>7}{'p50 ms':>11}{'p90 ms':>11}{'p99 ms':>11}{'max ms':>11}")
+    for stage, stats in result["stages"].items():
+        print(f"{stage:<12}{stats['count']:>7}{stats['p50_ms']:>11.2f}{stats['p90_ms']:>11.2f}"
+              f"{stats['p99_ms']:>11.2f}{stats['max_ms']:>11.2f}")
+    print(f"\nthroughput: {result['throughput_per_sec']} slips/s   peak RSS: {result['peak_rss_mb']} MB")
+    print("accuracy:  " + ", ".join(f"{field}={acc:.0%}" for field, acc in result["accuracy"].items()))
+    for mismatch in result["mismatches"]:
+        print(f"  ✗ {mismatch['fixture']}.{mismatch['field']}: expected {mismatch['expected']!r}, got {mismatch['got']!r}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ขั้นตอนต่างๆ ของ pipeline อ่านสลิป")
+    parser.add_argument("--fixtures", default=FIXTURES, help="ไฟล์ labels.json ของ fixture")
+    parser.add_argument("--repeat", type=int, default=5, help="จำนวนรอบที่วัด")
+    parser.add_argument("--warmup", type=int, default=1, help="จำนวนรอบ warm-up (ไม่นับเวลา)")
+    parser.add_argument("--no-ocr", action="store_true", help="ไม่รัน EasyOCR ใช้ข้อความใน fixture แทน")
+    parser.add_argument("--no-templates", action="store_true", help="ไม่ใช้ template mode (OCR ทั้งรูป)")
+    parser.add_argument("--compare-templates", action="store_true",
+                        help="เทียบความแม่นยำ template mode กับ OCR ทั้งรูป (exit 1 ถ้าแย่กว่า)")
+    parser.add_argument("--json", help="บันทึกผลเป็นไฟล์ JSON")
+    parser.add_argument("--save-baseline", help="บันทึกผลเป็น baseline")
+    parser.add_argument("--baseline", help="เทียบกับ baseline แล้ว exit 1 ถ้ามี regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="ยอมให้ช้ากว่า baseline ได้กี่เท่า (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    fixtures = load_fixtures(args.fixtures)
+    if not args.no_ocr:
+        # fixture ที่ไม่มีรูปไม่มีอะไรให้ OCR ถ้านับรวมจะได้ความแม่นยำของ label แทน OCR
+        text_only = [fixture for fixture in fixtures if "image_data" not in fixture]
+        fixtures = [fixture for fixture in fixtures if "image_data" in fixture]
+        if text_only:
+            print(f"ข้าม fixture ที่ไม่มีรูป {len(text_only)} รายการ (ใช้ --no-ocr เพื่อวัดตัวแยกข้อมูล)")
+    if args.compare_templates:
+        return compare_templates(fixtures, args.repeat, args.warmup)
+
+    result = run_benchmark(fixtures, args.repeat, args.warmup, use_ocr=not args.no_ocr,
+                           use_templates=not args.no_templates)
+    print_report(result)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline["config"].get("ocr") != result["config"]["ocr"]:
+            print("\n⚠️  baseline ใช้โหมด OCR ต่างจากรอบนี้")
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ พบ regression:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print("\n✅ ไม่พบ regression เทียบกับ baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
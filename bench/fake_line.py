@@ -0,0 +1,121 @@
+"""
+LINE Messaging API จำลองในเครื่อง สำหรับ load test (bench.load_test) และทดสอบ bot โดยไม่ใช้ LINE จริง
+
+- GET  /v2/bot/message/{id}/content  คืนรูปจากชุด fixture (เลือกตาม message id)
+- POST /v2/bot/message/reply          บันทึกคำตอบพร้อมเวลาที่ได้รับ
+- POST /v2/bot/message/push           บันทึกข้อความ push พร้อมเวลาที่ได้รับ
+- GET  /_stats                        จำนวน request ที่ได้รับ
+
+ชี้ bot มาที่ server นี้ด้วย LINE_API_BASE_URL และ LINE_DATA_API_BASE_URL
+
+วิธีใช้:
+    python -m bench.fake_line --port 9000
+    python -m bench.fake_line --port 9000 --images static/slips --latency-ms 50
+"""
+import sys
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Callable
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+from bench.bench_pipeline import FIXTURES, load_fixtures
+
+
+def load_corpus(fixtures: str = FIXTURES, images: Optional[str] = None) -> List[bytes]:
+    """รูปที่ใช้ตอบ content request: รูปในโฟลเดอร์/tar/zip ถ้าระบุ ไม่อย่างนั้นรูปใน fixture"""
+    if images:
+        from app.reprocess import iter_images
+        corpus = [data for _, data in iter_images(images)]
+    else:
+        corpus = [f["image_data"] for f in load_fixtures(fixtures) if f.get("image_data") is not None]
+    if not corpus:
+        raise ValueError("ไม่มีรูปสำหรับ server จำลอง")
+    return corpus
+
+
+class FakeLine:
+    """
+    สถานะของ server จำลอง: รูปที่ใช้ตอบและคำตอบที่ได้รับ
+
+    Args:
+        corpus (List[bytes]): รูปที่ใช้ตอบ content request
+        latency_ms (float): หน่วงทุก request เท่านี้ (จำลองเวลาเครือข่ายไป LINE)
+        on_reply: callback(kind, key, text, received_at) เมื่อได้รับ reply (key = reply token)
+            หรือ push (key = ผู้รับ)
+    """
+
+    def __init__(self, corpus: List[bytes], latency_ms: float = 0,
+                 on_reply: Optional[Callable[[str, str, str, float], None]] = None):
+        self.corpus = corpus
+        self.latency = latency_ms / 1000
+        self.on_reply = on_reply
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.app = self._build_app()
+
+    def image_for(self, message_id: str) -> bytes:
+        """รูปของ message id (เลขท้าย id เลือกรูปใน corpus แบบวนรอบ)"""
+        digits = ''.join(ch for ch in message_id if ch.isdigit())
+        return self.corpus[int(digits or 0) % len(self.corpus)]
+
+    def _record(self, kind: str, key: str, payload: Dict[str, Any]):
+        received = time.perf_counter()
+        self.counts[kind] += 1
+        if self.on_reply is not None:
+            messages = payload.get('messages') or [{}]
+            self.on_reply(kind, key, messages[0].get('text', ''), received)
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        async def delay():
+            if self.latency:
+                await asyncio.sleep(self.latency)
+
+        @app.get('/v2/bot/message/{message_id}/content')
+        async def content(message_id: str):
+            await delay()
+            self.counts['content'] += 1
+            return Response(self.image_for(message_id), media_type='image/jpeg')
+
+        @app.post('/v2/bot/message/reply')
+        async def reply(request: Request):
+            await delay()
+            payload = await request.json()
+            self._record('reply', payload.get('replyToken', ''), payload)
+            return JSONResponse({})
+
+        @app.post('/v2/bot/message/push')
+        async def push(request: Request):
+            await delay()
+            payload = await request.json()
+            self._record('push', payload.get('to', ''), payload)
+            return JSONResponse({})
+
+        @app.get('/_stats')
+        async def stats():
+            return dict(self.counts)
+
+        return app
+
+
+def main(argv=None) -> int:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="LINE Messaging API จำลองสำหรับทดสอบในเครื่อง")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--fixtures", default=FIXTURES, help="ไฟล์ labels.json ของ fixture")
+    parser.add_argument("--images", help="โฟลเดอร์/ไฟล์ tar/zip ของรูปที่ใช้แทน fixture")
+    parser.add_argument("--latency-ms", type=float, default=0, help="หน่วงทุก request (ms)")
+    args = parser.parse_args(argv)
+
+    fake = FakeLine(load_corpus(args.fixtures, args.images), args.latency_ms)
+    uvicorn.run(fake.app, host="127.0.0.1", port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
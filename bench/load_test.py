@@ -0,0 +1,357 @@
+"""
+Load test ของ /webhook แบบ end-to-end โดยใช้ LINE API จำลอง (bench.fake_line)
+
+เปิด server จำลองของ LINE แล้วรัน bot (uvicorn main:app) เป็น process ลูกที่ชี้ไปยัง server จำลอง
+ส่ง webhook ที่ลง signature ถูกต้องด้วยอัตราคงที่ (open loop) แล้ววัด
+throughput, เวลาที่ webhook ตอบ 200 (ack), เวลาจนได้คำตอบ (reply/push), error และ timeout
+
+วิธีใช้:
+    python -m bench.load_test --rate 2 --duration 60                      # bot 1 ชุดตามค่า env ปัจจุบัน
+    python -m bench.load_test --workers 1,2,4 --rate 4 --duration 60      # เทียบ WEBHOOK_WORKERS
+    python -m bench.load_test --workers 1,2 --worker-var OCR_PROCESSES --env OCR_CACHE_SIZE=1024
+    python -m bench.load_test --events 5 --users 20 --json load.json       # webhook ละ 5 event
+    python -m bench.load_test --target http://127.0.0.1:8000 --secret ...  # ยิง bot ที่รันอยู่แล้ว
+
+ค่าเริ่มต้นของ bot ที่รันให้: ปิด OCR cache (รูป fixture ซ้ำกันจะได้ผลจาก cache) และปิด slip ledger
+(สลิปซ้ำจะถูกเตือน) เปลี่ยนได้ด้วย --env
+"""
+import os
+import sys
+import json
+import hmac
+import time
+import base64
+import hashlib
+import asyncio
+import logging
+import argparse
+import subprocess
+from collections import defaultdict, deque
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+from bench.bench_pipeline import FIXTURES, percentile
+from bench.fake_line import FakeLine, load_corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SECRET = 'loadtest-secret'
+
+# env ของ bot ที่รันให้ (ก่อน --env)
+BOT_ENV = {
+    'LINE_CHANNEL_ACCESS_TOKEN': 'loadtest-token',
+    'LINE_HTTP2': '0',
+    'OCR_CACHE_SIZE': '0',
+    'SLIP_LEDGER_PATH': '',
+    'SAVE_SLIP_IMAGES': '0',
+}
+
+
+def sign(body: bytes, secret: str) -> str:
+    """X-Line-Signature ของ body (HMAC-SHA256 แล้ว base64)"""
+    return base64.b64encode(hmac.new(secret.encode('utf-8'), body, hashlib.sha256).digest()).decode('utf-8')
+
+
+def make_event(message_id: str, reply_token: str, user_id: str, kind: str = 'image') -> Dict[str, Any]:
+    """message event ในรูปแบบเดียวกับที่ LINE ส่งมา"""
+    message = {'type': kind, 'id': message_id}
+    if kind == 'text':
+        message['text'] = 'hello'
+    else:
+        message['contentProvider'] = {'type': 'line'}
+    return {
+        'type': 'message',
+        'mode': 'active',
+        'timestamp': int(time.time() * 1000),
+        'source': {'type': 'user', 'userId': user_id},
+        'webhookEventId': f'ev{message_id}',
+        'deliveryContext': {'isRedelivery': False},
+        'replyToken': reply_token,
+        'message': message,
+    }
+
+
+class Tracker:
+    """
+    จับคู่ event ที่ส่งกับคำตอบที่ server จำลองได้รับ
+
+    reply จับคู่ด้วย reply token ส่วน push (reply token หมดอายุ) จับคู่กับ event เก่าสุดที่ยังไม่ได้คำตอบ
+    ของผู้ใช้คนนั้น (bot ตอบ event ของผู้ใช้คนเดียวกันตามลำดับ)
+    """
+
+    def __init__(self):
+        self.outstanding: Dict[str, tuple] = {}          # reply token -> (เวลาส่ง, user id)
+        self.by_user: Dict[str, deque] = defaultdict(deque)
+        self.reply_ms: List[float] = []
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.done = asyncio.Event()
+
+    def sent(self, reply_token: str, user_id: str, sent_at: float):
+        self.outstanding[reply_token] = (sent_at, user_id)
+        self.by_user[user_id].append(reply_token)
+        self.done.clear()
+
+    def failed(self, reply_token: str):
+        """webhook ไม่สำเร็จ จะไม่มีคำตอบของ event นี้"""
+        entry = self.outstanding.pop(reply_token, None)
+        if entry is not None:
+            self.by_user[entry[1]].remove(reply_token)
+        self._check_done()
+
+    def on_reply(self, kind: str, key: str, text: str, received_at: float):
+        if kind == 'push':
+            queue = self.by_user.get(key)
+            key = queue[0] if queue else None
+        entry = self.outstanding.pop(key, None) if key else None
+        if entry is None:
+            self.counts["unmatched"] += 1
+            return
+        self.by_user[entry[1]].remove(key)
+        self.counts[kind] += 1
+        if text.startswith('⏳'):
+            # ระบบไม่ว่าง / ส่งถี่เกินไป (admission control)
+            self.counts["busy"] += 1
+        self.reply_ms.append((received_at - entry[0]) * 1000)
+        self._check_done()
+
+    def _check_done(self):
+        if not self.outstanding:
+            self.done.set()
+
+
+async def send_webhooks(target: str, secret: str, tracker: Tracker, rate: float, duration: float,
+                        events: int, users: int, text_ratio: float, ack_timeout: float) -> Dict[str, Any]:
+    """
+    ส่ง webhook ด้วยอัตรา rate ครั้งต่อวินาทีเป็นเวลา duration วินาที (ไม่รอ webhook ก่อนหน้า)
+
+    Returns:
+        Dict: เวลา ack, จำนวน status แต่ละแบบ และเวลาที่ใช้ส่งจริง
+    """
+    ack_ms: List[float] = []
+    statuses: Dict[str, int] = defaultdict(int)
+    total = max(1, int(rate * duration))
+    text_every = round(1 / text_ratio) if text_ratio > 0 else 0
+    counter = iter(range(10 ** 12))
+
+    async def send_one(client: httpx.AsyncClient):
+        batch = []
+        for _ in range(events):
+            n = next(counter)
+            kind = 'text' if text_every and n % text_every == text_every - 1 else 'image'
+            batch.append(make_event(f'{n}', f'lt-{n}', f'Uload{n % users:04d}', kind))
+        body = json.dumps({'destination': 'Uloadtest', 'events': batch}).encode('utf-8')
+        headers = {'X-Line-Signature': sign(body, secret), 'Content-Type': 'application/json'}
+
+        start = time.perf_counter()
+        for event in batch:
+            tracker.sent(event['replyToken'], event['source']['userId'], start)
+        try:
+            response = await client.post(f'{target}/webhook', content=body, headers=headers, timeout=ack_timeout)
+            status = str(response.status_code)
+        except httpx.TimeoutException:
+            status = 'timeout'
+        except httpx.TransportError:
+            status = 'connection_error'
+        ack_ms.append((time.perf_counter() - start) * 1000)
+        statuses[status] += 1
+        if status != '200':
+            for event in batch:
+                tracker.failed(event['replyToken'])
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    async with httpx.AsyncClient(limits=limits) as client:
+        tasks = []
+        start = time.perf_counter()
+        for request_no in range(total):
+            delay = start + request_no / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send_one(client)))
+        await asyncio.gather(*tasks)
+        send_seconds = time.perf_counter() - start
+
+    return {"ack_ms": ack_ms, "statuses": dict(statuses), "send_seconds": send_seconds, "requests": total}
+
+
+def summarize(label: str, sent: Dict[str, Any], tracker: Tracker, events: int, elapsed: float) -> Dict[str, Any]:
+    """สรุปผลของรอบหนึ่ง"""
+    def latency(samples: List[float]) -> Dict[str, float]:
+        return {
+            "p50_ms": round(percentile(samples, 50), 1),
+            "p90_ms": round(percentile(samples, 90), 1),
+            "p99_ms": round(percentile(samples, 99), 1),
+            "max_ms": round(max(samples), 1) if samples else 0.0,
+        }
+
+    requests = sent["requests"]
+    total_events = requests * events
+    failed = requests - sent["statuses"].get('200', 0)
+    answered = tracker.counts["reply"] + tracker.counts["push"]
+    return {
+        "label": label,
+        "requests": requests,
+        "events": total_events,
+        "request_rate": round(requests / sent["send_seconds"], 2) if sent["send_seconds"] else 0.0,
+        "replies_per_sec": round(answered / elapsed, 2) if elapsed else 0.0,
+        "ack": latency(sent["ack_ms"]),
+        "reply": latency(tracker.reply_ms),
+        "statuses": sent["statuses"],
+        "error_rate": round(failed / requests, 4),
+        "timeout_rate": round(len(tracker.outstanding) / total_events, 4),
+        "busy_rate": round(tracker.counts["busy"] / total_events, 4),
+        "replies": tracker.counts["reply"],
+        "pushes": tracker.counts["push"],
+        "unmatched": tracker.counts["unmatched"],
+    }
+
+
+def start_bot(port: int, line_url: str, secret: str, env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    """รัน bot (uvicorn main:app) ที่ชี้ LINE API ไปยัง server จำลอง"""
+    bot_env = dict(os.environ, **BOT_ENV, LINE_CHANNEL_SECRET=secret,
+                   LINE_API_BASE_URL=line_url, LINE_DATA_API_BASE_URL=line_url)
+    bot_env.update(env)
+    log = open(log_path, 'ab')
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--log-level', 'warning'],
+        cwd=ROOT, env=bot_env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+async def wait_ready(url: str, process: Optional[subprocess.Popen], timeout: float):
+    """รอจน /ready ตอบ 200 (โหลด model และ warm-up เสร็จ)"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"bot หยุดทำงาน (exit {process.returncode})")
+            try:
+                if (await client.get(f'{url}/ready', timeout=2)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"bot ไม่พร้อมภายใน {timeout:.0f} วินาที")
+
+
+def stop_bot(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    import uvicorn
+
+    fake = FakeLine(load_corpus(args.fixtures, args.images), args.line_latency_ms)
+    server = uvicorn.Server(uvicorn.Config(fake.app, host='127.0.0.1', port=args.line_port, log_level='warning'))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if server_task.done():
+            raise RuntimeError(f"เปิด server จำลองที่ port {args.line_port} ไม่ได้")
+        await asyncio.sleep(0.05)
+    line_url = f'http://127.0.0.1:{args.line_port}'
+
+    env = dict(item.split('=', 1) for item in args.env)
+    rounds = [None] if args.target else [w.strip() for w in args.workers.split(',') if w.strip()] or [None]
+    results = []
+    try:
+        for workers in rounds:
+            label = args.target or (f"{args.worker_var}={workers}" if workers else "default")
+            process = None
+            target = args.target
+            if not target:
+                round_env = dict(env, **({args.worker_var: workers} if workers else {}))
+                process = start_bot(args.bot_port, line_url, args.secret, round_env, args.bot_log)
+                target = f'http://127.0.0.1:{args.bot_port}'
+            try:
+                await wait_ready(target, process, args.ready_timeout)
+                tracker = Tracker()
+                fake.on_reply = tracker.on_reply
+                print(f"▶ {label}: {args.rate} webhook/s × {args.duration:.0f}s, {args.events} event/webhook",
+                      file=sys.stderr)
+
+                start = time.perf_counter()
+                sent = await send_webhooks(target, args.secret, tracker, args.rate, args.duration, args.events,
+                                           args.users, args.text_ratio, args.ack_timeout)
+                try:
+                    await asyncio.wait_for(tracker.done.wait(), timeout=args.reply_timeout)
+                except asyncio.TimeoutError:
+                    pass
+                elapsed = time.perf_counter() - start
+                results.append(summarize(label, sent, tracker, args.events, elapsed))
+            finally:
+                fake.on_reply = None
+                if process is not None:
+                    stop_bot(process)
+    finally:
+        server.should_exit = True
+        await server_task
+    return results
+
+
+def print_report(results: List[Dict[str, Any]]):
+    print(f"\n{'run':<22}{'req/s':>7}{'reply/s':>9}{'ack p50':>9}{'ack p99':>9}"
+          f"{'reply p50':>11}{'reply p90':>11}{'reply p99':>11}{'error':>8}{'timeout':>9}{'busy':>7}")
+    for r in results:
+        print(f"{r['label']:<22}{r['request_rate']:>7.2f}{r['replies_per_sec']:>9.2f}"
+              f"{r['ack']['p50_ms']:>9.1f}{r['ack']['p99_ms']:>9.1f}"
+              f"{r['reply']['p50_ms']:>11.1f}{r['reply']['p90_ms']:>11.1f}{r['reply']['p99_ms']:>11.1f}"
+              f"{r['error_rate']:>8.1%}{r['timeout_rate']:>9.1%}{r['busy_rate']:>7.1%}")
+    print("\n(เวลาเป็น ms; error = webhook ที่ไม่ได้ 200, timeout = event ที่ไม่ได้คำตอบ, busy = ตอบว่าระบบไม่ว่าง)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test ของ /webhook ด้วย LINE API จำลอง")
+    parser.add_argument("--rate", type=float, default=2, help="webhook ต่อวินาที")
+    parser.add_argument("--duration", type=float, default=30, help="ระยะเวลาที่ส่ง (วินาที)")
+    parser.add_argument("--events", type=int, default=1, help="จำนวน event ต่อ webhook")
+    parser.add_argument("--users", type=int, default=50, help="จำนวนผู้ใช้ที่ส่ง (วนใช้)")
+    parser.add_argument("--text-ratio", type=float, default=0, help="สัดส่วน event ที่เป็นข้อความแทนรูป")
+    parser.add_argument("--workers", default="", help="ค่าของ --worker-var ที่จะเทียบ คั่นด้วย , (เช่น 1,2,4)")
+    parser.add_argument("--worker-var", default="WEBHOOK_WORKERS", help="env ที่เปลี่ยนตาม --workers")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="env เพิ่มเติมของ bot")
+    parser.add_argument("--target", help="URL ของ bot ที่รันอยู่แล้ว (ไม่รัน bot ให้)")
+    parser.add_argument("--secret", default=DEFAULT_SECRET, help="channel secret สำหรับลง signature")
+    parser.add_argument("--bot-port", type=int, default=8765)
+    parser.add_argument("--bot-log", default=os.devnull, help="ไฟล์ log ของ bot")
+    parser.add_argument("--line-port", type=int, default=8766, help="port ของ LINE API จำลอง")
+    parser.add_argument("--line-latency-ms", type=float, default=0, help="หน่วง request ไป LINE API จำลอง (ms)")
+    parser.add_argument("--fixtures", default=FIXTURES, help="ไฟล์ labels.json ของ fixture")
+    parser.add_argument("--images", help="โฟลเดอร์/ไฟล์ tar/zip ของรูปที่ใช้แทน fixture")
+    parser.add_argument("--ack-timeout", type=float, default=10, help="timeout ของ webhook request (วินาที)")
+    parser.add_argument("--reply-timeout", type=float, default=60,
+                        help="รอคำตอบหลังส่งครบนานสุด (วินาที) ที่เหลือนับเป็น timeout")
+    parser.add_argument("--ready-timeout", type=float, default=300, help="รอ bot พร้อมนานสุด (วินาที)")
+    parser.add_argument("--json", help="บันทึกผลเป็นไฟล์ JSON")
+    args = parser.parse_args(argv)
+
+    if any('=' not in item for item in args.env):
+        parser.error("--env ต้องอยู่ในรูป KEY=VALUE")
+    if args.target and args.workers:
+        parser.error("--workers ใช้กับ bot ที่ load test รันให้เท่านั้น (ไม่ใช่ --target)")
+    if args.rate <= 0 or args.events < 1 or args.users < 1:
+        parser.error("--rate, --events และ --users ต้องมากกว่า 0")
+    args.target = args.target.rstrip('/') if args.target else None
+    # log ของแต่ละ request จะท่วม stderr
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    try:
+        results = asyncio.run(run(args))
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k != 'secret'}, "runs": results},
+                      f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
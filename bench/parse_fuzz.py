@@ -0,0 +1,117 @@
+"""
+วัดเวลาที่แย่ที่สุดของ SlipParser.parse กับข้อความที่จงใจให้ regex backtrack
+
+ข้อความแต่ละแบบเล็งไปที่ pattern ที่เคยช้าแบบ O(n^2) ขึ้นไป (ตัวเลขยาวๆ, ช่องว่างหลังชื่อ,
+บรรทัดว่างหลัง "จาก", template กสิกรไทยซ้ำๆ ฯลฯ) และสุ่มข้อความจากชิ้นส่วนของ pattern เพิ่มอีกชุด
+
+ถ้าเวลาโตเป็นเส้นตรง ms ต่อ 1,000 ตัวอักษรของแต่ละแบบจะใกล้เคียงกันทุกขนาด
+
+วิธีใช้:
+    python -m bench.parse_fuzz                      # ใช้ค่าจำกัดขนาด/เวลาเหมือนตอนรันจริง
+    python -m bench.parse_fuzz --uncapped           # ปิดการจำกัด วัดเฉพาะ pattern
+    python -m bench.parse_fuzz --sizes 1000,10000,100000 --random 500 --max-ms 50
+"""
+import sys
+import time
+import random
+import logging
+import argparse
+from typing import Dict, List, Callable, Any
+
+from app.slip_parser import SlipParser, SLIP_PARSE_BUDGET_MS
+
+# ชิ้นส่วนที่ใช้สุ่มข้อความ: คำที่ pattern ใช้เป็นจุดเริ่ม, ช่องว่างแบบต่างๆ และตัวเลข
+TOKENS = [
+    "นาย ", "นาง ", "นางสาว ", "จาก", "ไปยัง", "บจก.", "ผู้โอน", "ผู้รับ", "to", "from", "ref", "อ้างอิง",
+    "กรุงไทย", "ธ.กสิกรไทย", "จำนวนเงิน", "รหัสร้านค้า", "xxx", "x-", "xxx-x-x12-3", "บาท", "THB", "฿",
+    " ", "   ", "\t", "\n", "\n\n", ":", "1", "12", "1,0", ".5", "19 พ.ค.", "2567", "18:32", "a", "สมชาย",
+]
+
+GENERATORS: Dict[str, Callable[[int], str]] = {
+    "digit_run": lambda n: "1" * n + "x",
+    "digit_run_baht": lambda n: "1" * n + "x บาท",
+    "digit_comma_run": lambda n: "1," * (n // 2) + ".x THB",
+    "name_trailing_space": lambda n: "นาย a" + " " * n + "b",
+    "name_many_prefix": lambda n: ("นาย " + "a " * 50) * max(1, n // 104),
+    "name_space_runs": lambda n: ("นาย a" + " " * 30) * max(1, n // 35),
+    "title_space_runs": lambda n: ("นาย" + " \n\t" * 10 + "a") * max(1, n // 34),
+    "title_blank_tail": lambda n: "นาย" + " \n" * (n // 2),
+    "from_blank_lines": lambda n: "จาก" + "\n" * n + "x",
+    "from_spaces": lambda n: ("จาก \n " + " " * 20) * max(1, n // 26),
+    "recipient_company": lambda n: "ไปยัง\nบจก." + " " * n + "x",
+    "ktb_spaces": lambda n: "กรุงไทย นาย" + " " * n + "a",
+    "ktb_blank_lines": lambda n: "กรุงไทย\nนาย a" + "\n" * n + "x",
+    "ktb_partial_repeat": lambda n: "กรุงไทย\n" * 2 + "นาย a\nกรุงไทย\nxxx-x-x1-2\n" * max(1, n // 30),
+    "kbank_sender_only": lambda n: "ธ.กสิกรไทย\n" + "นาย ก\nธ.กสิกรไทย\n" * max(1, n // 20),
+    "colon_space_run": lambda n: "to" + ": \n" * (n // 3),
+    "whitespace_mix": lambda n: " \n\t" * (n // 3),
+}
+
+
+def random_text(rnd: random.Random, size: int) -> str:
+    parts, length = [], 0
+    while length < size:
+        token = rnd.choice(TOKENS) * (rnd.randint(1, 40) if rnd.random() < 0.1 else 1)
+        parts.append(token)
+        length += len(token)
+    return "".join(parts)
+
+
+def time_parse(parser: SlipParser, text: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    result = parser.parse(text)
+    ms = (time.perf_counter() - start) * 1000
+    return {"chars": len(text), "ms": ms, "partial": bool(result.get("partial"))}
+
+
+def run(parser: SlipParser, sizes: List[int], random_count: int, seed: int) -> List[Dict[str, Any]]:
+    rows = []
+    for name, generate in GENERATORS.items():
+        for size in sizes:
+            rows.append(dict(time_parse(parser, generate(size)), case=name))
+
+    rnd = random.Random(seed)
+    worst = None
+    for _ in range(random_count):
+        row = dict(time_parse(parser, random_text(rnd, rnd.choice(sizes))), case="random")
+        if worst is None or row["ms"] > worst["ms"]:
+            worst = row
+    if worst is not None:
+        rows.append(worst)
+    return rows
+
+
+def print_report(rows: List[Dict[str, Any]]):
+    print(f"{'case':<22}{'chars':>9}{'ms':>10}{'ms/1k':>9}  partial")
+    for row in rows:
+        per_k = row["ms"] / max(1, row["chars"]) * 1000
+        print(f"{row['case']:<22}{row['chars']:>9}{row['ms']:>10.2f}{per_k:>9.3f}  {'yes' if row['partial'] else ''}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="วัดเวลาที่แย่ที่สุดของการแยกข้อมูลสลิปกับข้อความที่จงใจให้ช้า")
+    parser.add_argument("--sizes", default="1000,4000,16000", help="ความยาวข้อความ (คั่นด้วย ,)")
+    parser.add_argument("--random", type=int, default=200, help="จำนวนข้อความสุ่ม (รายงานเฉพาะที่ช้าที่สุด)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--uncapped", action="store_true",
+                        help="ไม่จำกัดขนาดข้อความและเวลา (วัดว่า pattern เป็นเส้นตรงจริง)")
+    parser.add_argument("--max-ms", type=float, default=max(2 * SLIP_PARSE_BUDGET_MS, 50),
+                        help="exit 1 ถ้ามีข้อความที่ใช้เวลาเกินนี้")
+    args = parser.parse_args(argv)
+
+    logging.getLogger('app.slip_parser').setLevel(logging.ERROR)   # ไม่ต้องแสดง log ตัดข้อความ/เกินเวลา
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    slip_parser = SlipParser(max_chars=0, max_line=0, budget_ms=0) if args.uncapped else SlipParser()
+    rows = run(slip_parser, sizes, args.random, args.seed)
+    print_report(rows)
+
+    worst = max(rows, key=lambda row: row["ms"])
+    print(f"\nช้าที่สุด: {worst['case']} ({worst['chars']} ตัวอักษร) {worst['ms']:.2f} ms")
+    if worst["ms"] > args.max_ms:
+        print(f"เกิน {args.max_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+เทียบ EasyOCR แบบ float32 กับแบบ int8 (OCR_QUANTIZE) บนชุด fixture
+
+วัดเวลา OCR, ขนาด recognizer และความแม่นยำของข้อมูลที่ได้จาก parse_payment_slip
+แล้ว exit 1 ถ้าแบบ quantized แม่นยำน้อยกว่า float32 ใน field ที่กำหนด
+
+วิธีใช้:
+    python -m bench.quantize_check
+    python -m bench.quantize_check --fields amount,reference,time --repeat 3 --json quantize.json
+"""
+import io
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+from typing import Dict, Any, List
+
+from app.ocr_utils import create_reader, extract_text_from_image, parse_payment_slip, _is_quantized
+from bench.bench_pipeline import FIXTURES, load_fixtures, percentile, peak_rss_mb
+
+MODES = {"float32": False, "int8": True}
+
+
+def model_size_mb(model) -> float:
+    """ขนาดของ state_dict เมื่อบันทึกเป็นไฟล์ (MB)"""
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return round(buffer.tell() / (1024 * 1024), 2)
+
+
+def run_mode(fixtures: List[Dict[str, Any]], quantize: bool, repeat: int) -> Dict[str, Any]:
+    """OCR ทุก fixture ด้วย reader ของโหมดนี้ คืนเวลา ขนาด model และข้อมูลที่แยกได้"""
+    start = time.perf_counter()
+    reader = create_reader(quantize=quantize)
+    load_seconds = time.perf_counter() - start
+
+    # รอบแรกไม่นับเวลา (โหลด kernel / จอง memory)
+    extract_text_from_image(fixtures[0]["image_data"], reader=reader)
+
+    timings = []
+    parsed = {}
+    for _ in range(repeat):
+        for fixture in fixtures:
+            start = time.perf_counter()
+            text = extract_text_from_image(fixture["image_data"], reader=reader)
+            timings.append((time.perf_counter() - start) * 1000)
+            parsed[fixture["name"]] = parse_payment_slip(text)
+
+    return {
+        "quantized": _is_quantized(reader.recognizer),
+        "load_seconds": round(load_seconds, 3),
+        "recognizer_mb": model_size_mb(reader.recognizer),
+        "ocr_p50_ms": round(percentile(timings, 50), 1),
+        "ocr_p90_ms": round(percentile(timings, 90), 1),
+        "parsed": parsed
+    }
+
+
+def accuracy(fixtures: List[Dict[str, Any]], parsed: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+    hits: Dict[str, int] = defaultdict(int)
+    total: Dict[str, int] = defaultdict(int)
+    for fixture in fixtures:
+        for field, expected in fixture.get("expected", {}).items():
+            total[field] += 1
+            hits[field] += parsed[fixture["name"]].get(field) == expected
+    return {field: round(hits[field] / total[field], 4) for field in sorted(total)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="เทียบ EasyOCR แบบ float32 กับ int8")
+    parser.add_argument("--fixtures", default=FIXTURES, help="ไฟล์ labels.json ของ fixture")
+    parser.add_argument("--repeat", type=int, default=1, help="จำนวนรอบที่วัด")
+    parser.add_argument("--fields", default="amount,reference",
+                        help="field ที่ int8 ต้องแม่นยำไม่น้อยกว่า float32 (คั่นด้วย ,)")
+    parser.add_argument("--json", help="บันทึกผลเป็นไฟล์ JSON")
+    args = parser.parse_args(argv)
+
+    fixtures = [f for f in load_fixtures(args.fixtures) if f.get("image_data") is not None]
+    if not fixtures:
+        print("ไม่มี fixture ที่มีรูปภาพ")
+        return 1
+
+    results = {}
+    for mode, quantize in MODES.items():
+        result = run_mode(fixtures, quantize, args.repeat)
+        result["accuracy"] = accuracy(fixtures, result["parsed"])
+        results[mode] = result
+
+    # field ที่สองโหมดให้ผลต่างกัน
+    differences = []
+    for fixture in fixtures:
+        name = fixture["name"]
+        for field in ("amount", "date", "time", "bank", "reference", "sender", "recipient"):
+            values = {mode: results[mode]["parsed"][name].get(field) for mode in MODES}
+            if len(set(values.values())) > 1:
+                differences.append({"fixture": name, "field": field, **values})
+
+    print(f"{'mode':<10}{'quantized':>11}{'load s':>9}{'model MB':>10}{'p50 ms':>10}{'p90 ms':>10}")
+    for mode, result in results.items():
+        print(f"{mode:<10}{str(result['quantized']):>11}{result['load_seconds']:>9.2f}{result['recognizer_mb']:>10.2f}"
+              f"{result['ocr_p50_ms']:>10.1f}{result['ocr_p90_ms']:>10.1f}")
+    for mode, result in results.items():
+        print(f"accuracy {mode}: " + ", ".join(f"{field}={acc:.0%}" for field, acc in result["accuracy"].items()))
+    for diff in differences:
+        print(f"  ≠ {diff['fixture']}.{diff['field']}: float32={diff['float32']!r} int8={diff['int8']!r}")
+    print(f"peak RSS: {peak_rss_mb()} MB")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"modes": results, "differences": differences}, f, ensure_ascii=False, indent=2)
+
+    fields = [f.strip() for f in args.fields.split(',') if f.strip()]
+    regressions = [
+        field for field in fields
+        if results["int8"]["accuracy"].get(field, 0) < results["float32"]["accuracy"].get(field, 0)
+    ]
+    if regressions:
+        print(f"\n❌ int8 แม่นยำน้อยกว่า float32: {', '.join(regressions)}")
+        return 1
+    print(f"\n✅ int8 แม่นยำเท่ากับ float32 ใน {', '.join(fields)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,14 @@
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from app.router import webhook_router
+from app.profiling import profiling_router
+from app.ocr_engine import ocr_engine
+from app.ocr_cache import ocr_cache
+from app.slip_ledger import slip_ledger_stats
+from app.slip_store import slip_store_stats
+from app.admission import admission
 import os
 
 # สร้าง FastAPI instance
@@ -12,6 +20,7 @@ app = FastAPI(
 
 # รวม router จาก app/router.py
 app.include_router(webhook_router)
+app.include_router(profiling_router)
 
 @app.get("/")
 async def root():
@@ -27,6 +36,26 @@ async def health_check():
     """Additional health check endpoint"""
     return {"status": "healthy", "service": "line-bot"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe - พร้อมรับงานเมื่อโหลด model และ warm-up เสร็จแล้ว"""
+    status = ocr_engine.status()
+    return JSONResponse(
+        status_code=200 if ocr_engine.ready else 503,
+        content={"status": "ready" if ocr_engine.ready else "not_ready", "ocr": status}
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """ตัวชี้วัดสำหรับ Prometheus (เวลาแต่ละขั้นตอน, ผลลัพธ์, cache, งานที่ค้าง)"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/stats")
+async def stats():
+    """สถิติการทำงาน เช่น hit/miss ของ OCR cache, OCR tier, slip ledger, ที่เก็บรูป และ admission control"""
+    return {"ocr_cache": ocr_cache.stats(), "ocr_tiers": ocr_engine.tier_stats(), "slip_ledger": slip_ledger_stats(),
+            "slip_store": slip_store_stats(), "admission": admission.stats()}
+
 # รันเซิร์ฟเวอร์
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
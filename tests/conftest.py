@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+# app.router ต้องมี token ของ LINE ตอน import และไม่ต้องโหลด model ระหว่างทดสอบ
+os.environ.setdefault('LINE_CHANNEL_ACCESS_TOKEN', 'test-token')
+os.environ.setdefault('LINE_CHANNEL_SECRET', 'test-secret')
+os.environ.setdefault('OCR_WARMUP_ON_STARTUP', '0')
+os.environ.setdefault('SLIP_LEDGER_PATH', '')
+
+
+@pytest.fixture
+def qr_image():
+    """สร้างไฟล์ PNG ของ QR ที่มีข้อความที่กำหนด"""
+    import cv2
+
+    def make(payload: str) -> bytes:
+        code = cv2.QRCodeEncoder.create().encode(payload)
+        code = cv2.resize(code, None, fx=8, fy=8, interpolation=cv2.INTER_NEAREST)
+        code = cv2.copyMakeBorder(code, 40, 40, 40, 40, cv2.BORDER_CONSTANT, value=255)
+        ok, buffer = cv2.imencode('.png', cv2.cvtColor(code, cv2.COLOR_GRAY2BGR))
+        assert ok
+        return buffer.tobytes()
+    return make
@@ -0,0 +1,196 @@
+import asyncio
+
+import pytest
+
+from app import admission as admission_module
+from app.admission import AdmissionController, Rejected, TokenBucket, PRIORITY_NEW, PRIORITY_REPEAT
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """แทน time.monotonic ของ admission ด้วยนาฬิกาที่เลื่อนเองได้"""
+    class Clock:
+        now = 1000.0
+
+        def advance(self, seconds):
+            self.now += seconds
+
+    clock = Clock()
+    monkeypatch.setattr(admission_module.time, "monotonic", lambda: clock.now)
+    return clock
+
+
+def reason(controller, user_id):
+    with pytest.raises(Rejected) as e:
+        controller.admit(user_id)
+    return e.value.reason
+
+
+def test_token_bucket_burst_then_refill(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    clock.advance(0.5)
+    assert bucket.take()
+    assert not bucket.take()
+    clock.advance(60)
+    assert bucket.full()
+    assert bucket.tokens == 3
+
+
+def test_token_bucket_refund(clock):
+    bucket = TokenBucket(rate=1, burst=1)
+    assert bucket.take()
+    bucket.refund()
+    assert bucket.take()
+    bucket.refund()
+    bucket.refund()
+    assert bucket.tokens == 1
+
+
+def test_user_rate_off_by_default():
+    controller = AdmissionController(concurrency=100, max_queue=0)
+    for _ in range(50):
+        controller.admit("U1")
+    assert controller.stats()["admitted"] == 50
+
+
+def test_user_rate_limits_each_user(clock):
+    controller = AdmissionController(concurrency=100, max_queue=0, user_rate=60, user_burst=2)
+    controller.admit("U1")
+    controller.admit("U1")
+    assert reason(controller, "U1") == "user_rate"
+    controller.admit("U2")
+    clock.advance(1)
+    controller.admit("U1")
+
+
+def test_global_reject_refunds_user_token(clock):
+    controller = AdmissionController(concurrency=100, max_queue=0, user_rate=6, user_burst=1,
+                                     global_rate=1, global_burst=1)
+    controller.admit("U1")
+    clock.advance(1)
+    controller.admit("U2")
+    # global เต็ม U3 ถูกปฏิเสธโดยไม่เสีย token ของตัวเอง
+    assert reason(controller, "U3") == "global_rate"
+    clock.advance(1)
+    controller.admit("U3")
+    stats = controller.stats()
+    assert (stats["admitted"], stats["global_rate"], stats["user_rate"]) == (3, 1, 0)
+
+
+def test_queue_full_sheds_until_done():
+    controller = AdmissionController(concurrency=2, max_queue=1)
+    for _ in range(3):
+        controller.admit(None)
+    assert reason(controller, None) == "queue_full"
+    controller.done()
+    controller.admit(None)
+    assert controller.stats()["queue_full"] == 1
+
+
+def test_slots_run_new_images_before_repeats():
+    controller = AdmissionController(concurrency=1, max_queue=10)
+    order = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def job(name, priority, hold=False):
+            async with controller.slot(priority):
+                order.append(name)
+                if hold:
+                    await release.wait()
+
+        first = asyncio.create_task(job("first", PRIORITY_NEW, hold=True))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(job(name, priority)) for name, priority in
+                   [("repeat-1", PRIORITY_REPEAT), ("new-1", PRIORITY_NEW),
+                    ("repeat-2", PRIORITY_REPEAT), ("new-2", PRIORITY_NEW)]]
+        await asyncio.sleep(0)
+        assert controller.stats()["active"] == 1
+        release.set()
+        await asyncio.gather(first, *waiting)
+
+    asyncio.run(main())
+    assert order == ["first", "new-1", "new-2", "repeat-1", "repeat-2"]
+    assert controller.stats()["active"] == 0
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    controller = AdmissionController(concurrency=1, max_queue=10)
+    order = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def job(name, hold=False):
+            async with controller.slot():
+                order.append(name)
+                if hold:
+                    await release.wait()
+
+        first = asyncio.create_task(job("first", hold=True))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(job("cancelled"))
+        last = asyncio.create_task(job("last"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        release.set()
+        await asyncio.gather(first, cancelled, last, return_exceptions=True)
+
+    asyncio.run(main())
+    assert order == ["first", "last"]
+    assert controller.stats()["active"] == 0
+
+
+def test_priority_of_repeated_image():
+    controller = AdmissionController()
+
+    async def main():
+        async with controller.slot(key="img-1"):
+            return controller.priority("img-1"), controller.priority("img-2")
+
+    assert asyncio.run(main()) == (PRIORITY_REPEAT, PRIORITY_NEW)
+    assert controller.priority("img-1") == PRIORITY_NEW
+    assert controller.priority("img-2", seen=True) == PRIORITY_REPEAT
+
+
+def test_deferred_image_result_is_pushed(monkeypatch):
+    import time
+
+    from app import router
+    from app.webhook_events import WebhookEvent
+
+    class FakeLineClient:
+        """reply token ใช้ได้ครั้งเดียวเหมือน LINE"""
+        def __init__(self):
+            self.replies, self.pushes = [], []
+
+        async def reply_text(self, reply_token, text, fallback_to=None):
+            assert reply_token not in [token for token, _ in self.replies], "reply token ถูกใช้ซ้ำ"
+            self.replies.append((reply_token, text))
+
+        async def push_text(self, to, text):
+            self.pushes.append((to, text))
+
+        async def get_message_content(self, message_id):
+            return b"image"
+
+    client = FakeLineClient()
+    monkeypatch.setattr(router, "line_client", client)
+    monkeypatch.setattr(router, "admission", AdmissionController(concurrency=1, max_queue=0))
+    monkeypatch.setattr(router, "ADMISSION_DEFER_SECONDS", 0.001)
+    monkeypatch.setattr(router, "process_slip_image", lambda image, *args: "ผลการอ่านสลิป")
+
+    event = WebhookEvent({
+        "type": "message", "timestamp": time.time() * 1000, "replyToken": "token-1",
+        "source": {"type": "user", "userId": "U1"}, "message": {"type": "image", "id": "m1"},
+    })
+
+    async def main():
+        await router._shed_image(event, "queue_full")
+        await asyncio.gather(*router._background_tasks)
+
+    asyncio.run(main())
+    assert client.replies == [("token-1", router.DEFERRED_REPLY)]
+    assert client.pushes == [("U1", "ผลการอ่านสลิป")]
@@ -0,0 +1,66 @@
+import asyncio
+
+from app import router
+from app.webhook_events import WebhookEvent
+
+
+def text_event(user_id: str, text: str) -> WebhookEvent:
+    return WebhookEvent({
+        "type": "message", "timestamp": 0, "replyToken": f"token-{text}",
+        "source": {"type": "user", "userId": user_id},
+        "message": {"type": "text", "id": text, "text": text},
+    })
+
+
+def test_same_user_answered_in_order_across_webhooks(monkeypatch):
+    answered = []
+    # event แรกช้าที่สุด ถ้าไม่เรียงตามผู้ใช้ event หลังๆ จะตอบก่อน
+    delays = {"a1": 0.05, "a2": 0.0, "a3": 0.01, "b1": 0.0}
+
+    async def handler(event):
+        await asyncio.sleep(delays[event.message.text])
+        answered.append(event.message.text)
+
+    monkeypatch.setitem(router.FAST_MESSAGE_HANDLERS, "text", handler)
+
+    async def main():
+        first = asyncio.create_task(router._handle_events([text_event("A", "a1"), text_event("B", "b1")]))
+        await asyncio.sleep(0)
+        # webhook ถัดไปของผู้ใช้เดิมมาถึงระหว่างที่ a1 ยังไม่เสร็จ
+        await router._handle_events([text_event("A", "a2"), text_event("A", "a3")])
+        await first
+
+    asyncio.run(main())
+    assert [text for text in answered if text.startswith("a")] == ["a1", "a2", "a3"]
+    # ผู้ใช้อื่นไม่ต้องรอ
+    assert answered.index("b1") < answered.index("a1")
+    assert router._source_locks == {}
+
+
+def test_idle_locks_are_removed_after_errors(monkeypatch):
+    async def handler(event):
+        await asyncio.sleep(0)
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(router.FAST_MESSAGE_HANDLERS, "text", handler)
+    asyncio.run(router._handle_events([text_event(f"U{i}", str(i)) for i in range(100)]))
+    assert router._source_locks == {}
+
+
+def test_idle_lock_removed_when_cancelled(monkeypatch):
+    async def main():
+        running = asyncio.Event()
+
+        async def handler(event):
+            running.set()
+            await asyncio.sleep(10)
+
+        monkeypatch.setitem(router.FAST_MESSAGE_HANDLERS, "text", handler)
+        task = asyncio.create_task(router._handle_events([text_event("A", "a1"), text_event("A", "a2")]))
+        await running.wait()
+        assert list(router._source_locks) == ["A"]
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert router._source_locks == {}
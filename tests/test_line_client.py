@@ -0,0 +1,157 @@
+"""AsyncLineClient: การลองใหม่, backoff และการส่ง push แทน reply ที่ไม่สำเร็จ"""
+import asyncio
+
+import httpx
+import pytest
+from linebot.exceptions import LineBotApiError
+
+from app import line_client as line_client_module
+from app.line_client import AsyncLineClient
+
+
+class Recorder:
+    """transport จำลอง: ตอบตามลำดับใน responses แยกตาม path และเก็บ request ที่ได้รับ"""
+
+    def __init__(self, responses):
+        self.responses = {path: list(items) for path, items in responses.items()}
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        item = self.responses[request.url.path].pop(0)
+        if isinstance(item, Exception):
+            raise item
+        status, body = item
+        return httpx.Response(status, json=body)
+
+    def paths(self):
+        return [request.url.path for request in self.requests]
+
+
+REPLY = '/v2/bot/message/reply'
+PUSH = '/v2/bot/message/push'
+
+
+def make_client(recorder, **kwargs):
+    kwargs.setdefault('backoff', 0)
+    return AsyncLineClient('token', transport=httpx.MockTransport(recorder), **kwargs)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_reply_5xx_is_not_retried_and_falls_back_to_push():
+    recorder = Recorder({REPLY: [(500, {'message': 'error'})], PUSH: [(200, {})]})
+    client = make_client(recorder)
+
+    run(client.reply_text('token-1', 'hello', fallback_to='U1'))
+
+    assert recorder.paths() == [REPLY, PUSH]
+    push = recorder.requests[1]
+    assert push.headers['X-Line-Retry-Key']
+    assert b'"to":"U1"' in push.content.replace(b' ', b'')
+
+
+def test_reply_read_timeout_falls_back_to_push():
+    recorder = Recorder({REPLY: [httpx.ReadTimeout('timeout')], PUSH: [(200, {})]})
+    client = make_client(recorder)
+
+    run(client.reply_text('token-1', 'hello', fallback_to='U1'))
+
+    assert recorder.paths() == [REPLY, PUSH]
+
+
+def test_reply_connect_error_is_retried():
+    recorder = Recorder({REPLY: [httpx.ConnectError('refused'), (200, {})]})
+    client = make_client(recorder)
+
+    run(client.reply_text('token-1', 'hello', fallback_to='U1'))
+
+    assert recorder.paths() == [REPLY, REPLY]
+
+
+def test_reply_without_fallback_raises():
+    recorder = Recorder({REPLY: [(503, {'message': 'unavailable'})]})
+    client = make_client(recorder)
+
+    with pytest.raises(LineBotApiError) as error:
+        run(client.reply_text('token-1', 'hello'))
+    assert error.value.status_code == 503
+    assert recorder.paths() == [REPLY]
+
+
+def test_reply_invalid_token_is_not_pushed():
+    recorder = Recorder({REPLY: [(400, {'message': 'Invalid reply token'})]})
+    client = make_client(recorder)
+
+    with pytest.raises(LineBotApiError):
+        run(client.reply_text('token-1', 'hello', fallback_to='U1'))
+    assert recorder.paths() == [REPLY]
+
+
+def test_push_retries_with_same_retry_key():
+    recorder = Recorder({PUSH: [(503, {}), (429, {}), (200, {})]})
+    client = make_client(recorder)
+
+    run(client.push_text('U1', 'hello'))
+
+    keys = {request.headers['X-Line-Retry-Key'] for request in recorder.requests}
+    assert recorder.paths() == [PUSH] * 3
+    assert len(keys) == 1
+
+
+def test_push_gives_up_after_retries():
+    recorder = Recorder({PUSH: [(500, {})] * 3})
+    client = make_client(recorder, retries=2)
+
+    with pytest.raises(LineBotApiError):
+        run(client.push_text('U1', 'hello'))
+    assert len(recorder.requests) == 3
+
+
+def test_backoff_doubles_each_attempt(monkeypatch):
+    delays = []
+
+    async def fake_sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(line_client_module.asyncio, 'sleep', fake_sleep)
+    monkeypatch.setattr(line_client_module.random, 'random', lambda: 0.5)
+    recorder = Recorder({PUSH: [(503, {})] * 3 + [(200, {})]})
+    client = make_client(recorder, backoff=0.1)
+
+    run(client.push_text('U1', 'hello'))
+
+    assert delays == pytest.approx([0.1, 0.2, 0.4])
+
+
+def test_content_download_retries_5xx():
+    def handler(request):
+        handler.calls += 1
+        if handler.calls == 1:
+            return httpx.Response(502)
+        return httpx.Response(200, content=b'image-bytes')
+    handler.calls = 0
+    client = AsyncLineClient('token', backoff=0, transport=httpx.MockTransport(handler))
+
+    assert run(client.get_message_content('1')) == b'image-bytes'
+    assert handler.calls == 2
+
+
+def test_against_fake_line_server():
+    from bench.fake_line import FakeLine
+
+    replies = []
+    fake = FakeLine([b'slip-image'], on_reply=lambda kind, key, text, at: replies.append((kind, key, text)))
+    client = AsyncLineClient('token', api_base_url='http://line', data_api_base_url='http://line',
+                             transport=httpx.ASGITransport(app=fake.app))
+
+    async def scenario():
+        content = await client.get_message_content('42')
+        await client.reply_text('reply-token', 'ok')
+        await client.push_text('U1', 'later')
+        return content
+
+    assert run(scenario()) == b'slip-image'
+    assert replies == [('reply', 'reply-token', 'ok'), ('push', 'U1', 'later')]
@@ -0,0 +1,95 @@
+import pytest
+
+from app import ocr_cache as cache_module
+from app.ocr_cache import OCRCache, image_key
+
+PARSED = {"amount": "185.00", "reference": "015139183249BOR00645"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """แทน time.time ของ ocr_cache ด้วยนาฬิกาที่เลื่อนเองได้"""
+    class Clock:
+        now = 1_700_000_000.0
+
+        def advance(self, seconds):
+            self.now += seconds
+
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "time", lambda: clock.now)
+    return clock
+
+
+def test_image_key_is_content_hash():
+    assert image_key(b"a") == image_key(bytearray(b"a"))
+    assert image_key(b"a") != image_key(b"b")
+    assert len(image_key(b"a")) == 64
+
+
+def test_evicts_least_recently_used(clock):
+    cache = OCRCache(max_entries=2, ttl=60, disk_dir="")
+    cache.set("a", "A", None)
+    cache.set("b", "B", None)
+    assert cache.get("a")["text"] == "A"      # a ถูกใช้ล่าสุด b จึงเก่าสุด
+    cache.set("c", "C", None)
+
+    assert cache.get("b") is None
+    assert (cache.get("a")["text"], cache.get("c")["text"]) == ("A", "C")
+    stats = cache.stats()
+    assert (stats["size"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = OCRCache(max_entries=10, ttl=60, disk_dir="")
+    cache.set("a", "A", PARSED)
+    clock.advance(60)
+    assert cache.get("a") == {"text": "A", "parsed": PARSED}
+    clock.advance(1)
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_disabled_cache_stores_nothing():
+    cache = OCRCache(max_entries=0, disk_dir="")
+    cache.set("a", "A", None)
+    assert cache.get("a") is None
+    assert "a" not in cache
+
+
+def test_disk_entry_promoted_to_memory(clock, tmp_path):
+    OCRCache(max_entries=10, ttl=60, disk_dir=str(tmp_path)).set("a", "A", PARSED)
+    clock.advance(30)
+
+    # process ใหม่: memory ว่าง อ่านจากดิสก์แล้วเก็บเข้า memory
+    cache = OCRCache(max_entries=10, ttl=60, disk_dir=str(tmp_path))
+    assert "a" not in cache
+    assert cache.get("a") == {"text": "A", "parsed": PARSED}
+    assert "a" in cache
+    assert cache.get("a")["text"] == "A"
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["hits"], stats["disk"]) == (1, 1, True)
+
+    # อายุนับจากตอนที่เขียนลงดิสก์ ไม่ใช่ตอนที่ย้ายเข้า memory
+    clock.advance(31)
+    assert cache.get("a") is None
+
+
+def test_expired_disk_entries_removed_on_open(clock, tmp_path):
+    OCRCache(max_entries=10, ttl=60, disk_dir=str(tmp_path)).set("a", "A", None)
+    clock.advance(61)
+    cache = OCRCache(max_entries=10, ttl=60, disk_dir=str(tmp_path))
+    assert cache._db.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0] == 0
+    assert cache.get("a") is None
+
+
+def test_contains_checks_memory_without_counting(tmp_path):
+    cache = OCRCache(max_entries=1, ttl=60, disk_dir=str(tmp_path))
+    cache.set("a", "A", None)
+    cache.set("b", "B", None)
+
+    assert "b" in cache
+    # a ถูกดันออกจาก memory แต่ยังอยู่บนดิสก์: __contains__ ไม่ค้นบนดิสก์
+    assert "a" not in cache
+    assert "c" not in cache
+    stats = cache.stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"]) == (0, 0, 0)
@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+import pytest
+
+from app import ocr_tiers, router
+from app.ocr_engine import OCREngine
+from app.ocr_tiers import OCRCascade, OCRTier
+
+SLIP_TEXT = "โอนเงินสำเร็จ\n19 พ.ค. 2567 18:32 น.\nรหัสอ้างอิง: 015139183249BOR00645\nจำนวน: 185.00 บาท"
+IMAGE = np.zeros((10, 10, 3), np.uint8)
+
+
+def fake_tier(name, text=None, error=None):
+    class FakeTier(OCRTier):
+        calls = 0
+
+        def read(self, image):
+            type(self).calls += 1
+            if error:
+                raise error
+            return text
+
+    FakeTier.name = name
+    return FakeTier
+
+
+@pytest.fixture
+def tiers(monkeypatch):
+    def install(*tier_types):
+        monkeypatch.setattr(ocr_tiers, "TIER_TYPES", {tier.name: tier for tier in tier_types})
+        return OCRCascade([tier.name for tier in tier_types], ["amount", "time", "reference"])
+    return install
+
+
+def test_tier_must_implement_read():
+    with pytest.raises(TypeError):
+        OCRTier()
+
+
+def test_easyocr_only_by_default():
+    assert ocr_tiers.OCR_TIERS == ["easyocr"]
+
+
+def test_cheap_tier_result_returned_with_parsed_data(tiers):
+    fast, slow = fake_tier("fast", SLIP_TEXT), fake_tier("slow", "never")
+    text, parsed, attempts = tiers(fast, slow).read(IMAGE)
+    assert text == SLIP_TEXT
+    assert (parsed["amount"], parsed["time"], parsed["reference"]) == ("185.00", "18:32", "015139183249BOR00645")
+    assert [(name, accepted) for name, _, accepted in attempts] == [("fast", True)]
+    assert slow.calls == 0
+
+
+def test_falls_through_to_last_tier(tiers):
+    broken = fake_tier("broken", error=RuntimeError("no tesseract"))
+    partial = fake_tier("partial", "185.00 บาท")
+    last = fake_tier("last", "ab")
+    text, parsed, attempts = tiers(broken, partial, last).read(IMAGE)
+    # ข้อความสั้นเกินกว่าจะเป็นสลิป ไม่ต้องแยกข้อมูล
+    assert (text, parsed) == ("ab", None)
+    assert [(name, accepted) for name, _, accepted in attempts] == [
+        ("broken", False), ("partial", False), ("last", False)]
+
+
+def test_router_uses_parsed_data_from_cascade(monkeypatch, tiers):
+    monkeypatch.setattr(ocr_tiers, "ocr_cascade", tiers(fake_tier("only", SLIP_TEXT)))
+    monkeypatch.setattr(router, "ocr_engine", OCREngine(processes=0, batch_window_ms=0))
+    monkeypatch.setattr(router.ocr_cache, "get", lambda key: None)
+    monkeypatch.setattr(router.ocr_cache, "set", lambda key, text, parsed: None)
+    monkeypatch.setattr(router, "read_slip_qr", lambda image: None)
+
+    def parse_again(text):
+        raise AssertionError("router ไม่ควร parse ข้อความซ้ำ")
+
+    monkeypatch.setattr(router, "parse_payment_slip", parse_again)
+    reply = router.process_slip_image(cv2.imencode(".png", IMAGE)[1].tobytes())
+    assert "185.00" in reply
+    assert ocr_tiers.tier_stats.snapshot()["only"]["hits"] >= 1
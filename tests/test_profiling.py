@@ -0,0 +1,107 @@
+import asyncio
+import marshal
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import profiling, router
+from app.profiling import profiler, profiling_router
+from app.webhook_events import WebhookEvent
+
+TOKEN = "admin-secret"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ADMIN_TOKEN", TOKEN)
+    app = FastAPI()
+    app.include_router(profiling_router)
+    saved = dict(vars(profiler))
+    yield TestClient(app)
+    profiler.clear()
+    vars(profiler).update(saved)
+
+
+def auth(token: str = TOKEN) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_not_found_without_token(client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ADMIN_TOKEN", "")
+    assert client.get("/admin/profiling", headers=auth()).status_code == 404
+    assert client.put("/admin/profiling", json={"enabled": True}, headers=auth()).status_code == 404
+    assert not profiler.enabled
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"Authorization": "Bearer wrong"},
+    {"Authorization": f"Basic {TOKEN}"},
+    {"Authorization": TOKEN},
+])
+def test_rejects_bad_credentials(client, headers):
+    assert client.get("/admin/profiling", headers=headers).status_code == 401
+    assert client.put("/admin/profiling", json={"enabled": True}, headers=headers).status_code == 401
+    assert not profiler.enabled
+
+
+def test_invalid_config_rejected(client):
+    assert client.put("/admin/profiling", json={"mode": "perf"}, headers=auth()).status_code == 400
+    assert client.put("/admin/profiling", json={"sample_percent": 101}, headers=auth()).status_code == 400
+
+
+def handle_image(monkeypatch, user_id: str, message_id: str):
+    """ส่งรูปหนึ่งรูปผ่าน handle_image_message โดยไม่ต้องมี LINE และ OCR จริง"""
+    class FakeLineClient:
+        async def get_message_content(self, message_id):
+            return b"image"
+
+        async def reply_text(self, reply_token, text, fallback_to=None):
+            pass
+
+    def process_slip_image(image_data, *args):
+        with router.metrics.STAGE["parse"].time():
+            time.sleep(0.05)
+        return "ok"
+
+    monkeypatch.setattr(router, "line_client", FakeLineClient())
+    monkeypatch.setattr(router, "process_slip_image", process_slip_image)
+    event = WebhookEvent({
+        "type": "message", "timestamp": time.time() * 1000, "replyToken": "token",
+        "source": {"type": "user", "userId": user_id}, "message": {"type": "image", "id": message_id},
+    })
+    asyncio.run(router.handle_image_message(event))
+
+
+@pytest.mark.parametrize("mode, extension", [("cprofile", "pstats"), ("sample", "folded")])
+def test_capture_round_trip(client, monkeypatch, mode, extension):
+    config = client.put("/admin/profiling", json={"enabled": True, "user_ids": ["U1"], "mode": mode},
+                        headers=auth()).json()
+    assert (config["enabled"], config["user_ids"], config["mode"]) == (True, ["U1"], mode)
+
+    handle_image(monkeypatch, "U2", "m0")   # ผู้ใช้ที่ไม่ได้เลือก
+    handle_image(monkeypatch, "U1", "m1")
+
+    captures = client.get("/admin/profiling", headers=auth()).json()["captures"]
+    assert [capture["message_id"] for capture in captures] == ["m1"]
+    capture_id = captures[0]["id"]
+
+    detail = client.get(f"/admin/profiling/{capture_id}", headers=auth()).json()
+    assert detail["timings_ms"]["parse"] >= 50
+    assert "download" in detail["timings_ms"] and "total" in detail["timings_ms"]
+    assert any("process_slip_image" in row["function"] for row in detail["top"])
+
+    download = client.get(f"/admin/profiling/{capture_id}/download", headers=auth())
+    assert download.status_code == 200
+    assert f'slip-{capture_id}.{extension}' in download.headers["content-disposition"]
+    if mode == "cprofile":
+        stats = marshal.loads(download.content)
+        assert any(name == "process_slip_image" for _, _, name in stats)
+    else:
+        assert "process_slip_image" in download.text
+
+    assert client.get("/admin/profiling/missing", headers=auth()).status_code == 404
+    client.delete("/admin/profiling", headers=auth())
+    assert client.get(f"/admin/profiling/{capture_id}", headers=auth()).status_code == 404
@@ -0,0 +1,87 @@
+"""QR บนรูปสลิป: OCR ทุกรูปแล้วรวมข้อมูลจาก QR ตรวจสอบสลิป ไม่ถือ QR PromptPay เป็นหลักฐานการโอน"""
+import pytest
+
+from app import router
+from app.slip_parser import _crc16, parse_qr_payload
+
+
+def tlv(tag: str, value: str) -> str:
+    return f"{tag}{len(value):02d}{value}"
+
+
+def promptpay_request(amount: str = "100.00", reference: str = "INV0001") -> str:
+    """QR PromptPay ที่ร้านให้ลูกค้าสแกนจ่าย (มีจำนวนเงินและเลขอ้างอิง)"""
+    body = (tlv("00", "01") + tlv("01", "12") + tlv("29", tlv("00", "A000000677010111") + tlv("01", "0812345678"))
+            + tlv("53", "764") + tlv("54", amount) + tlv("58", "TH") + tlv("62", tlv("05", reference)) + "6304")
+    return body + _crc16(body)
+
+
+def slip_verification(bank_code: str = "004", reference: str = "015139183249BOR00645") -> str:
+    """QR ตรวจสอบสลิปที่ธนาคารพิมพ์บนสลิปหลังโอนสำเร็จ"""
+    return tlv("00", tlv("00", "000001") + tlv("01", bank_code) + tlv("02", reference)) + tlv("51", "TH")
+
+
+SLIP_TEXT = "โอนเงินสำเร็จ\nนาย สมชาย ใจดี\n19 พ.ค. 2567 18:32 น.\nจำนวน: 185.00 บาท"
+
+
+@pytest.fixture
+def ocr_text():
+    """ข้อความที่ OCR ปลอมอ่านได้ (ค่าเริ่มต้น: อ่านไม่ได้อะไรเลย)"""
+    return [""]
+
+
+@pytest.fixture
+def ocr_calls(monkeypatch, ocr_text):
+    """แทน OCR ด้วยตัวที่คืน ocr_text และนับจำนวนครั้งที่ถูกเรียก"""
+    calls = []
+    monkeypatch.setattr(router.ocr_engine, 'read_regions', lambda image, bank=None: None)
+    monkeypatch.setattr(router.ocr_engine, 'read_slip', lambda image: calls.append(image) or (ocr_text[0], None))
+    monkeypatch.setattr(router.ocr_cache, 'get', lambda key: None)
+    monkeypatch.setattr(router.ocr_cache, 'set', lambda key, text, parsed: None)
+    return calls
+
+
+def outcome_count(outcome: str) -> float:
+    return router.metrics.OUTCOME[outcome]._value.get()
+
+
+def test_payloads_parse_as_expected():
+    assert parse_qr_payload(promptpay_request())["type"] == "promptpay"
+    assert parse_qr_payload(slip_verification())["type"] == "slip"
+
+
+def test_promptpay_request_is_not_answered_as_paid_slip(qr_image, ocr_calls):
+    before = outcome_count("qr_only")
+
+    reply = router.process_slip_image(qr_image(promptpay_request()), user_id="U1", message_id="1")
+
+    assert len(ocr_calls) == 1                    # ไม่ข้าม OCR
+    assert outcome_count("qr_only") == before     # ไม่นับเป็นสลิปที่อ่านจาก QR
+    assert "INV0001" not in reply and "100.00" not in reply
+    assert "ไม่สามารถอ่านข้อความได้" in reply
+
+
+def test_slip_verification_qr_merged_into_ocr_by_default(qr_image, ocr_calls, ocr_text):
+    ocr_text[0] = SLIP_TEXT
+    before = outcome_count("qr_only")
+
+    reply = router.process_slip_image(qr_image(slip_verification()), user_id="U1", message_id="2")
+
+    assert len(ocr_calls) == 1
+    assert outcome_count("qr_only") == before
+    # ข้อมูลจาก OCR และเลขอ้างอิงจาก QR อยู่ในคำตอบเดียวกัน
+    assert "185.00" in reply and "18:32" in reply and "สมชาย" in reply
+    assert "015139183249BOR00645" in reply
+
+
+def test_slip_verification_qr_skips_ocr_when_enabled(monkeypatch, qr_image, ocr_calls):
+    monkeypatch.setattr(router, 'QR_SKIP_OCR_FIELDS', ['reference'])
+    before = outcome_count("qr_only")
+
+    reply = router.process_slip_image(qr_image(slip_verification()), user_id="U1", message_id="3")
+
+    assert ocr_calls == []
+    assert outcome_count("qr_only") == before + 1
+    assert "015139183249BOR00645" in reply
+    # ไม่ได้ OCR จึงไม่มีข้อความเต็ม
+    assert "ข้อความเต็ม" not in reply
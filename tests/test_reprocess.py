@@ -0,0 +1,122 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from app import ocr_tiers, reprocess
+from app.ocr_cache import OCRCache, image_key
+from app.ocr_tiers import OCRCascade, OCRTier
+
+SLIP_TEXT = "โอนเงินสำเร็จ\n19 พ.ค. 2567 18:32 น.\nรหัสอ้างอิง: 015139183249BOR00645\nจำนวน: 185.00 บาท"
+
+
+def png(value: int) -> bytes:
+    return cv2.imencode(".png", np.full((10, 10, 3), value, np.uint8))[1].tobytes()
+
+
+@pytest.fixture
+def slips(tmp_path):
+    """โฟลเดอร์รูปสลิป 3 รูป (มีโฟลเดอร์ย่อย และไฟล์ที่ไม่ใช่รูป)"""
+    root = tmp_path / "slips"
+    (root / "ab").mkdir(parents=True)
+    (root / "a.png").write_bytes(png(0))
+    (root / "ab" / "b.png").write_bytes(png(1))
+    (root / "ab" / "c.png").write_bytes(png(2))
+    (root / "index.db").write_bytes(b"not an image")
+    return root
+
+
+@pytest.fixture
+def ocr_reads(monkeypatch):
+    """แทน OCR ด้วย tier ที่คืน SLIP_TEXT และห้าม reprocess แยกข้อความซ้ำ"""
+    reads = []
+
+    class FakeTier(OCRTier):
+        name = "fake"
+
+        def read(self, image):
+            reads.append(image)
+            return SLIP_TEXT
+
+    monkeypatch.setattr(ocr_tiers, "TIER_TYPES", {"fake": FakeTier})
+    monkeypatch.setattr(ocr_tiers, "ocr_cascade", OCRCascade(["fake"], ["amount", "time", "reference"]))
+    return reads
+
+
+def read_output(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_dir_input_uses_parsed_data_from_cascade(monkeypatch, slips, tmp_path, ocr_reads):
+    def parse_again(text):
+        raise AssertionError("reprocess ไม่ควร parse ข้อความที่ OCR cascade แยกแล้ว")
+
+    monkeypatch.setattr(reprocess, "parse_payment_slip", parse_again)
+    output = tmp_path / "out.jsonl"
+    assert reprocess.main([str(slips), "-o", str(output), "-w", "0"]) == 0
+
+    records = read_output(output)
+    assert [record["source"] for record in records] == ["a.png", "ab/b.png", "ab/c.png"]
+    assert records[0]["key"] == image_key(png(0))
+    assert all(record["parsed"]["reference"] == "015139183249BOR00645" for record in records)
+    assert all(record["error"] is None for record in records)
+    assert len(ocr_reads) == 3
+
+
+def test_text_only_reparses_jsonl(tmp_path):
+    source = tmp_path / "old.jsonl"
+    source.write_text(
+        json.dumps({"source": "a.png", "key": "k1", "text": SLIP_TEXT, "parsed": None, "error": None},
+                   ensure_ascii=False) + "\n"
+        + json.dumps({"source": "b.png", "key": "k2", "text": None, "parsed": None, "error": "timeout"}) + "\n",
+        encoding="utf-8")
+    output = tmp_path / "out.jsonl"
+
+    assert reprocess.main([str(source), "-o", str(output), "--text-only"]) == 0
+
+    first, second = read_output(output)
+    assert (first["source"], first["parsed"]["amount"]) == ("a.png", "185.00")
+    assert (second["parsed"], second["error"]) == (None, "timeout")
+
+
+def test_text_only_reads_disk_cache(monkeypatch, slips, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    OCRCache(disk_dir=cache_dir).set(image_key(png(0)), SLIP_TEXT, None)
+    monkeypatch.setattr(reprocess, "OCR_CACHE_DIR", cache_dir)
+    output = tmp_path / "out.jsonl"
+
+    assert reprocess.main([str(slips), "-o", str(output), "--text-only"]) == 0
+
+    records = {record["source"]: record for record in read_output(output)}
+    assert records["a.png"]["parsed"]["time"] == "18:32"
+    assert records["ab/b.png"]["error"] == "ไม่มีข้อความใน OCR cache"
+
+
+def test_resume_skips_done_and_drops_partial_last_line(slips, tmp_path, ocr_reads):
+    output = tmp_path / "out.jsonl"
+    done = json.dumps({"source": "a.png", "key": "k", "text": "เดิม", "parsed": None, "error": None},
+                      ensure_ascii=False).encode("utf-8")
+    partial = json.dumps({"source": "ab/b.png", "text": SLIP_TEXT}, ensure_ascii=False).encode("utf-8")
+    # รอบก่อนถูกหยุดระหว่างเขียน: บรรทัดสุดท้ายถูกตัดกลางตัวอักษรไทย
+    output.write_bytes(done + b"\n" + partial[:40])
+
+    assert reprocess.main([str(slips), "-o", str(output), "-w", "0", "--resume"]) == 0
+
+    records = read_output(output)
+    assert [record["source"] for record in records] == ["a.png", "ab/b.png", "ab/c.png"]
+    assert records[0]["text"] == "เดิม"
+    assert len(ocr_reads) == 2
+
+
+def test_truncate_partial_line(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_bytes(b'{"a": 1}\n{"b": 2}\n')
+    assert reprocess.truncate_partial_line(str(path)) == 0
+    path.write_bytes(b'{"a": 1}\n{"b": ')
+    assert reprocess.truncate_partial_line(str(path)) == 6
+    assert path.read_bytes() == b'{"a": 1}\n'
+    path.write_bytes(b'{"a": ')
+    assert reprocess.truncate_partial_line(str(path)) == 6
+    assert path.read_bytes() == b""
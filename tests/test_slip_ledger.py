@@ -0,0 +1,144 @@
+import sqlite3
+
+import pytest
+
+from app import slip_ledger as ledger_module
+from app.slip_ledger import SlipLedger, get_slip_ledger
+
+SLIP = {"reference": "015139183249BOR00645", "amount": "185.00", "date": "19 พ.ค. 2567",
+        "time": "18:32", "bank": "กสิกรไทย", "sender": "นาง ศิริพร จ", "recipient": "นาย วรากร จันทวงศ์"}
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = SlipLedger(str(tmp_path / "ledger.db"), flush_ms=10)
+    yield ledger
+    ledger.close()
+
+
+def matches(duplicates):
+    return [row["match"] for row in duplicates]
+
+
+def test_same_image_is_duplicate(ledger):
+    ledger.record({"amount": "10.00"}, "U1", "m1", "img-1")
+    duplicates = ledger.find_duplicates({"amount": "99.00"}, "img-1", "m2")
+    assert matches(duplicates) == ["image"]
+    assert duplicates[0]["message_id"] == "m1"
+
+
+def test_same_reference_is_duplicate(ledger):
+    ledger.record(SLIP, "U1", "m1", "img-1")
+    duplicates = ledger.find_duplicates({"reference": SLIP["reference"]}, "img-2", "m2")
+    assert matches(duplicates) == ["reference"]
+
+
+def test_same_amount_and_datetime_is_duplicate(ledger):
+    ledger.record(dict(SLIP, reference=None), "U1", "m1", "img-1")
+    duplicates = ledger.find_duplicates(dict(SLIP, reference="OTHER"), "img-2", "m2")
+    assert matches(duplicates) == ["amount_datetime"]
+
+
+def test_amount_datetime_needs_every_field(ledger):
+    ledger.record(dict(SLIP, reference=None), "U1", "m1", "img-1")
+    assert ledger.find_duplicates(dict(SLIP, reference=None, bank=None), "img-2", "m2") == []
+    assert ledger.find_duplicates(dict(SLIP, reference=None, time="18:33"), "img-2", "m2") == []
+
+
+def test_redelivered_message_is_not_duplicate(ledger):
+    ledger.record(SLIP, "U1", "m1", "img-1")
+    assert ledger.find_duplicates(SLIP, "img-1", "m1") == []
+
+
+def test_duplicates_found_before_and_after_write(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    ledger = SlipLedger(path, flush_ms=10_000)
+    ledger.record(SLIP, "U1", "m1", "img-1")
+    # ยังอยู่ในคิว (writer รอรวมรายการ 10 วินาที)
+    assert matches(ledger.find_duplicates(SLIP, None, "m2")) == ["reference"]
+    ledger.close()
+
+    reopened = SlipLedger(path)
+    assert ledger.stats()["pending"] == 0
+    assert matches(reopened.find_duplicates(SLIP, None, "m2")) == ["reference"]
+    reopened.close()
+
+
+def test_writer_batches_rows(tmp_path, monkeypatch):
+    batches = []
+    connect = ledger_module._connect
+
+    class RecordingConnection:
+        def __init__(self, conn):
+            self.conn = conn
+
+        def __getattr__(self, name):
+            return getattr(self.conn, name)
+
+        def __enter__(self):
+            return self.conn.__enter__()
+
+        def __exit__(self, *exc):
+            return self.conn.__exit__(*exc)
+
+        def executemany(self, sql, rows):
+            rows = list(rows)
+            batches.append(len(rows))
+            return self.conn.executemany(sql, rows)
+
+    monkeypatch.setattr(ledger_module, "_connect", lambda path: RecordingConnection(connect(path)))
+    path = str(tmp_path / "ledger.db")
+    ledger = SlipLedger(path, batch_size=3, flush_ms=300)
+    for i in range(7):
+        ledger.record(dict(SLIP, reference=f"REF{i}"), "U1", f"m{i}", f"img-{i}")
+    ledger.close()
+
+    assert batches == [3, 3, 1]
+    assert ledger.stats() == {"written": 7, "duplicates": 0, "errors": 0, "pending": 0, "enabled": True}
+    with sqlite3.connect(path) as conn:
+        references = [row[0] for row in conn.execute("SELECT reference FROM slips ORDER BY id")]
+    assert references == [f"REF{i}" for i in range(7)]
+
+
+def test_ledger_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger_module, "_slip_ledger", None)
+    monkeypatch.setattr(ledger_module, "SLIP_LEDGER_PATH", "")
+    assert get_slip_ledger() is None
+    assert ledger_module.slip_ledger_stats() == {"enabled": False}
+
+    path = tmp_path / "data" / "ledger.db"
+    monkeypatch.setattr(ledger_module, "SLIP_LEDGER_PATH", str(path))
+    assert not path.exists()
+    ledger = get_slip_ledger()
+    assert path.exists()
+    assert get_slip_ledger() is ledger
+    ledger.close()
+
+
+def test_same_slip_sent_at_once_is_caught(ledger):
+    import threading
+    import time
+
+    # ค้นฐานข้อมูลช้า ให้สอง request ตรวจซ้อนกันก่อนที่ request ใดจะบันทึก
+    reader = ledger._reader
+
+    def slow_reader():
+        time.sleep(0.05)
+        return reader()
+
+    ledger._reader = slow_reader
+    start = threading.Barrier(2)
+    results = {}
+
+    def submit(message_id):
+        start.wait()
+        results[message_id] = ledger.check_and_record(SLIP, "U" + message_id, message_id, "img-" + message_id)
+
+    threads = [threading.Thread(target=submit, args=(message_id,)) for message_id in ("1", "2")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(len(duplicates) for duplicates in results.values()) == [0, 1]
+    assert ledger.stats()["duplicates"] == 1
@@ -0,0 +1,38 @@
+import pytest
+
+from app.slip_parser import SlipParser
+
+parser = SlipParser(budget_ms=0)
+
+
+# ผลของ parser เดิม (ก่อนเขียน pattern ใหม่ให้เป็นเส้นตรง) ที่ต้องคงไว้
+@pytest.mark.parametrize("text, sender", [
+    # คำนำหน้าตามด้วยช่องว่างจนจบข้อความ: ได้แค่คำนำหน้า
+    ("นาย  \n", "นาย"),
+    ("นาย \t", "นาย"),
+    ("นาย   ", "นาย"),
+    ("นาง\n \n", "นาง"),
+    ("ไปยัง\n  \nนาย  \n", "นาย"),
+    ("จำนวนเงิน 100 บาท\nนางสาว \t\n\n", "นางสาว"),
+    # ช่องว่างตัวเดียวหรือมีแต่ขึ้นบรรทัดใหม่: ไม่ถือเป็นชื่อ
+    ("นาย \n", None),
+    ("นาย\n\n", None),
+    # มีชื่อตามมา: ใช้ชื่อ
+    ("นาย  \nสมชาย", "นาย  \nสมชาย"),
+    ("นาง  \nนาย สมชาย", "นาย สมชาย"),
+    ("นาย สมชาย ใจดี xxx-x-x1234-x\n", "นาย สมชาย ใจดี"),
+    ("จาก\nนาย  \n", "นาย"),
+])
+def test_sender_title_followed_by_whitespace(text, sender):
+    assert parser.parse(text)["sender"] == sender
+
+
+@pytest.mark.parametrize("text", ["นาย  \n", "นาง \t", "จาก\nนาย  \n"])
+def test_blank_recipient_is_not_a_name(text):
+    assert parser.parse(text)["recipient"] is None
+
+
+def test_long_whitespace_after_title():
+    # เวลาของข้อความแบบนี้วัดด้วย python -m bench.parse_fuzz (title_blank_tail)
+    parsed = SlipParser(max_chars=0, max_line=0, budget_ms=0).parse("นาย" + " \n" * 50_000)
+    assert parsed["sender"] == "นาย"
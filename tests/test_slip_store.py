@@ -0,0 +1,163 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from app import slip_store as store_module
+from app.slip_store import SlipStore, encode_image, get_slip_store, image_ext
+
+
+def encode(ext: str, size=(400, 300), params=()) -> bytes:
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    ok, data = cv2.imencode(ext, image, list(params))
+    assert ok
+    return data.tobytes()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SlipStore(str(tmp_path / "slips"), max_mb=0, max_age_days=1)
+    yield store
+    store.close()
+
+
+def test_image_ext_from_content():
+    assert image_ext(encode(".jpg")) == "jpg"
+    assert image_ext(encode(".png")) == "png"
+    assert image_ext(encode(".webp")) == "webp"
+    assert image_ext(b"GIF89a....") == "gif"
+    assert image_ext(b"not an image") == "bin"
+
+
+def test_original_bytes_kept_by_default():
+    for ext, label in ((".jpg", "jpg"), (".png", "png")):
+        data = encode(ext)
+        assert encode_image(data, fmt="original") == (data, label)
+
+
+def test_lossy_reencode_is_opt_in():
+    data = encode(".png", size=(2000, 1000))
+    encoded, ext = encode_image(data, fmt="webp", quality=80, max_side=1000)
+    assert ext == "webp"
+    assert len(encoded) < len(data)
+    assert cv2.imdecode(np.frombuffer(encoded, np.uint8), cv2.IMREAD_COLOR).shape[:2] == (500, 1000)
+
+
+def test_passthrough_keeps_real_extension():
+    # re-encode ได้ไฟล์ใหญ่กว่าเดิม (หรือ decode ไม่ได้) ต้องเก็บรูปเดิมด้วยนามสกุลจริง
+    small = encode(".jpg", params=(cv2.IMWRITE_JPEG_QUALITY, 5))
+    assert encode_image(small, fmt="webp", quality=100) == (small, "jpg")
+    assert encode_image(b"\x89PNG\r\n\x1a\nbroken", fmt="jpg") == (b"\x89PNG\r\n\x1a\nbroken", "png")
+
+
+def test_save_now_stores_original_bytes(store):
+    data = encode(".png")
+    path = store.save_now(data, "U1", "m1")
+    assert path.endswith(".png")
+    assert store.get("m1") == data
+    # รูปเดิมจาก message อื่นไม่ถูกเก็บซ้ำ
+    assert store.save_now(data, "U2", "m2") == path
+    assert store.stats()["blobs"] == 1
+
+
+def test_evict_counts_only_deleted_rows(store):
+    store.save_now(encode(".png"), "U1", "m1")
+    store.save_now(encode(".jpg"), "U1", "m2")
+    conn = store._reader()
+    with conn:
+        conn.execute("UPDATE blobs SET created = 0")
+    rows = conn.execute("SELECT key, path, size FROM blobs").fetchall()
+
+    assert store.evict() == 2
+    assert store.stats()["blobs"] == 0
+    assert store.get("m1") is None
+    # แถวที่ถูกลบไปแล้ว (เช่นจาก thread อื่น) ไม่นับซ้ำ
+    assert store._remove(conn, rows) == 0
+    assert store.stats()["evicted"] == 2
+
+
+def test_store_created_lazily(tmp_path, monkeypatch):
+    root = tmp_path / "slips"
+    monkeypatch.setattr(store_module, "_slip_store", None)
+    monkeypatch.setattr(store_module, "SLIP_STORE_DIR", str(root))
+    assert store_module.slip_store_stats() == {"enabled": False}
+    assert not root.exists()
+
+    store = get_slip_store()
+    assert os.path.exists(root / "index.db")
+    assert get_slip_store() is store
+    store.close()
+
+    monkeypatch.setattr(store_module, "_slip_store", None)
+    monkeypatch.setattr(store_module, "SLIP_STORE_DIR", "")
+    assert get_slip_store() is None
+
+
+def test_resent_image_is_not_evicted_by_age(store):
+    data = encode(".png")
+    store.save_now(data, "U1", "m1")
+    conn = store._reader()
+    with conn:
+        conn.execute("UPDATE blobs SET created = 0")
+
+    # ส่งรูปเดิมมาอีกครั้ง: อายุนับใหม่จากตอนนี้
+    store.save_now(data, "U2", "m2")
+    assert store.evict() == 0
+    assert store.get("m2") == data
+
+
+def test_save_now_and_writer_store_same_image_at_once(store):
+    import threading
+
+    data = encode(".png")
+    start = threading.Barrier(7)
+    paths, errors = [], []
+
+    def save_now(i):
+        start.wait()
+        try:
+            paths.append(store.save_now(data, "U1", f"now-{i}"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save_now, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    store.save(data, "U1", "queued-1")
+    store.save(data, "U1", "queued-2")
+    for thread in threads:
+        thread.join()
+    store.close()
+
+    assert errors == []
+    assert len(set(paths)) == 1
+    stats = store.stats()
+    assert (stats["blobs"], stats["saved"], stats["errors"], stats["total_bytes"]) == (1, 8, 0, len(data))
+    assert all(store.get(message_id) == data for message_id in ("now-0", "queued-1", "queued-2"))
+    assert [name for name in os.listdir(os.path.dirname(paths[0])) if name.endswith(".tmp")] == []
+
+
+def test_download_image_saves_off_the_event_loop(monkeypatch):
+    import asyncio
+    import threading
+
+    from app import line_utils
+
+    class FakeClient:
+        async def get_message_content(self, message_id):
+            return b"image"
+
+    threads = []
+
+    def save_slip_image(image_data, user_id, message_id):
+        threads.append(threading.current_thread())
+        return "saved"
+
+    monkeypatch.setattr(line_utils, "save_slip_image", save_slip_image)
+    bot = line_utils.LineBot.__new__(line_utils.LineBot)
+    bot.line_client = FakeClient()
+    assert asyncio.run(bot.download_image("m1", "U1")) == "saved"
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,107 @@
+import json
+import base64
+import hashlib
+import hmac
+
+import pytest
+from linebot import WebhookParser
+
+from app import webhook_events
+from app.webhook_events import parse_events
+
+# parser เดิมของ line-bot-sdk (v2 models) เตือน deprecated ทุก model
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning")
+
+SECRET = "test-secret"
+
+# body ตามตัวอย่างใน Messaging API reference (ข้อความ, รูป, sticker ในกลุ่ม, follow และ event ที่ส่งซ้ำ)
+BODY = json.dumps({
+    "destination": "U0123456789abcdef0123456789abcdef",
+    "events": [
+        {
+            "type": "message", "mode": "active", "timestamp": 1700000000000,
+            "webhookEventId": "01HF0000000000000000000001",
+            "deliveryContext": {"isRedelivery": False},
+            "replyToken": "nHuyWiB7yP5Zw52FIkcQobQuGDXCTA",
+            "source": {"type": "user", "userId": "U4af4980629ffffffffffffffffffffff"},
+            "message": {"id": "444573844083572737", "type": "text", "quoteToken": "q3Plxr4AgKd",
+                        "text": "ช่วยเหลือ"},
+        },
+        {
+            "type": "message", "mode": "active", "timestamp": 1700000000100,
+            "webhookEventId": "01HF0000000000000000000002",
+            "deliveryContext": {"isRedelivery": True},
+            "replyToken": "fbf94e269485410da6b7e3a5e33283e8",
+            "source": {"type": "user", "userId": "U4af4980629ffffffffffffffffffffff"},
+            "message": {"id": "354718705033693859", "type": "image", "quoteToken": "q3Plxr4AgKd",
+                        "contentProvider": {"type": "line"},
+                        "imageSet": {"id": "E005D41A7288F41B6553", "index": 1, "total": 2}},
+        },
+        {
+            "type": "message", "mode": "active", "timestamp": 1700000000200,
+            "webhookEventId": "01HF0000000000000000000003",
+            "deliveryContext": {"isRedelivery": False},
+            "replyToken": "0f3779fba3b349968c5d07db31eab56f",
+            "source": {"type": "group", "groupId": "Ca56f94637cc4347f90a25382909b24b9",
+                       "userId": "U4af4980629ffffffffffffffffffffff"},
+            "message": {"id": "325708", "type": "sticker", "quoteToken": "q3Plxr4AgKd",
+                        "packageId": "1", "stickerId": "1", "stickerResourceType": "STATIC",
+                        "keywords": ["Hello"]},
+        },
+        {
+            "type": "message", "mode": "active", "timestamp": 1700000000300,
+            "webhookEventId": "01HF0000000000000000000004",
+            "deliveryContext": {"isRedelivery": False},
+            "replyToken": "b60d432864f44d079f6d8efe86cf404b",
+            "source": {"type": "room", "roomId": "Ra8dbf4673c4c812cd491258042226c99",
+                       "userId": "U4af4980629ffffffffffffffffffffff"},
+            "message": {"id": "325709", "type": "text", "text": "สวัสดี"},
+        },
+        {
+            "type": "follow", "mode": "active", "timestamp": 1700000000400,
+            "webhookEventId": "01HF0000000000000000000005",
+            "deliveryContext": {"isRedelivery": False},
+            "replyToken": "85cbe770fa8b4f45bbe077b1d4be4a36",
+            "source": {"type": "user", "userId": "U4af4980629ffffffffffffffffffffff"},
+        },
+    ],
+}, ensure_ascii=False).encode("utf-8")
+
+
+def sign(body: bytes) -> str:
+    return base64.b64encode(hmac.new(SECRET.encode("utf-8"), body, hashlib.sha256).digest()).decode("utf-8")
+
+
+def fields(event) -> dict:
+    """field ที่ handler ใช้ อ่านได้ทั้งจาก model ของ line-bot-sdk และ WebhookEvent"""
+    source = event.source
+    message = getattr(event, "message", None)
+    delivery = getattr(event, "delivery_context", None)
+    return {
+        "type": event.type,
+        "mode": event.mode,
+        "timestamp": event.timestamp,
+        "reply_token": getattr(event, "reply_token", None),
+        "webhook_event_id": event.webhook_event_id,
+        "is_redelivery": delivery.is_redelivery if delivery is not None else event.is_redelivery,
+        "source": (source.type, getattr(source, "user_id", None), getattr(source, "group_id", None),
+                   getattr(source, "room_id", None)),
+        "message": (message.type, message.id, getattr(message, "text", None)) if message is not None else None,
+    }
+
+
+@pytest.mark.parametrize("loads", ["orjson", "json"])
+def test_matches_sdk_parser(monkeypatch, loads):
+    if loads == "json":
+        monkeypatch.setattr(webhook_events, "_loads", json.loads)
+    else:
+        assert webhook_events._loads.__module__ == "orjson"
+
+    expected = [fields(event) for event in WebhookParser(SECRET).parse(BODY.decode("utf-8"), sign(BODY))]
+    assert [fields(event) for event in parse_events(BODY)] == expected
+    assert len(expected) == 5
+
+
+def test_invalid_body_raises_value_error():
+    with pytest.raises(ValueError):
+        parse_events(b"{not json")